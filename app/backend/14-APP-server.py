@@ -14,19 +14,44 @@ import sys
 import time
 import base64
 import threading
+import queue
+import random
+import select
+import signal
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import contextlib
+import gzip
+import io
+import itertools
+import mimetypes
+import ssl
 import hmac
 import hashlib
 import secrets
+import socket
+import sqlite3
 import unicodedata
 import re
 import uuid
+import zlib
+import tempfile
 from datetime import datetime, timedelta, timezone
+from datetime import date as date_type
+from email.parser import HeaderParser
 
 try:
     import jwt
 except ImportError:
     jwt = None  # Will handle gracefully if not installed
 
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip only
+
 try:
     import bcrypt as _bcrypt
     BCRYPT_AVAILABLE = True
@@ -35,6 +60,72 @@ except ImportError:
     BCRYPT_AVAILABLE = False
     print('[WARN] bcrypt not installed — password hashing will fail. Run: pip install bcrypt')
 
+# ===== JSON CODEC =====
+# orjson → msgspec → stdlib, picked once at import (JSON_CODEC forces one).
+# json_dumps returns UTF-8 bytes; datetimes/dates go out as ISO 8601 on every
+# backend, anything else unknown falls back to str() like default=str did.
+# json_loads accepts bytes or str and raises json.JSONDecodeError on bad input
+# whatever the backend, so existing except clauses keep working.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _json_default(obj):
+    if isinstance(obj, (datetime, date_type)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, default=_json_default).encode()
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+JSON_CODEC = os.environ.get('JSON_CODEC', '') or ('orjson' if orjson else 'msgspec' if msgspec else 'stdlib')
+
+if JSON_CODEC == 'orjson' and orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def json_dumps(obj):
+        try:
+            return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS)
+        except TypeError:
+            return _stdlib_dumps(obj)  # e.g. ints beyond 64 bits
+
+    json_loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+
+elif JSON_CODEC == 'msgspec' and msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=_json_default)
+    _msgspec_decoder = msgspec.json.Decoder()
+
+    def json_dumps(obj):
+        try:
+            return _msgspec_encoder.encode(obj)
+        except (TypeError, OverflowError):
+            return _stdlib_dumps(obj)
+
+    def json_loads(data):
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), data if isinstance(data, str) else '', 0) from None
+
+else:
+    JSON_CODEC = 'stdlib'
+    json_dumps = _stdlib_dumps
+    json_loads = _stdlib_loads
+
+
 PORT = int(os.environ.get('PORT', 8888))
 
 # ===== CONFIG =====
@@ -172,55 +263,374 @@ def create_refresh_token(email, user_id):
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+# Decoded JWTs are cached by token hash for JWT_DECODE_CACHE_TTL seconds (never past
+# the token's own exp), so repeat calls with the same Bearer token skip signature
+# verification. Only valid tokens are cached; rejections are always re-checked.
+JWT_DECODE_CACHE_TTL = int(os.environ.get('JWT_DECODE_CACHE_TTL', '60'))
+JWT_DECODE_CACHE_MAX_ENTRIES = 4096
+
+
+class JwtDecodeCache:
+    """token_hash → (expires_at, payload) for tokens that already passed jwt.decode."""
+
+    def __init__(self, ttl=JWT_DECODE_CACHE_TTL, max_entries=JWT_DECODE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, token_hash):
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[0] <= time.time():
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, token_hash, payload):
+        if self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if isinstance(payload.get('exp'), (int, float)):
+            expires_at = min(expires_at, payload['exp'])
+        with self._lock:
+            if len(self._entries) >= self.max_entries and token_hash not in self._entries:
+                now = time.time()
+                self._entries = {h: e for h, e in self._entries.items() if e[0] > now}
+                while len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]  # oldest insert first
+            self._entries[token_hash] = (expires_at, payload)
+
+    def snapshot(self):
+        with self._lock:
+            return {'entries': len(self._entries), **self.stats}
+
+
+_jwt_cache = JwtDecodeCache()
+
+
 def verify_jwt_token(token):
-    """Verify and decode JWT token"""
-    if not jwt:
-        return None
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
-    except jwt.InvalidTokenError:
+    """Verify and decode JWT token (cached by token hash — see JwtDecodeCache)"""
+    if not jwt or not token:
         return None
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    payload = _jwt_cache.get(token_hash)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            return None
+        except jwt.InvalidTokenError:
+            return None
+        _jwt_cache.put(token_hash, payload)
+    return dict(payload)  # callers may annotate it; the cached copy stays pristine
+
+# Verified Supabase keys are cached by hash for API_KEY_CACHE_TTL (unknown keys for
+# API_KEY_NEGATIVE_TTL, so a bad key can't hammer api_keys); revoking through this
+# instance drops the entry at once, other instances within the TTL. last_used_at is
+# buffered and written for all keys in one PATCH every API_KEY_USAGE_FLUSH_SECONDS.
+API_KEY_CACHE_TTL = int(os.environ.get('API_KEY_CACHE_TTL', '60'))
+API_KEY_NEGATIVE_TTL = int(os.environ.get('API_KEY_NEGATIVE_TTL', '5'))
+API_KEY_CACHE_MAX_ENTRIES = 1024
+API_KEY_USAGE_FLUSH_SECONDS = int(os.environ.get('API_KEY_USAGE_FLUSH_SECONDS', '60'))
+
+
+class ApiKeyCache:
+    """key_hash → (expires_at, info or None) with revoke-by-id."""
+
+    def __init__(self, ttl=API_KEY_CACHE_TTL, negative_ttl=API_KEY_NEGATIVE_TTL, max_entries=API_KEY_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.stats = {'hits': 0, 'misses': 0, 'revoked': 0}
+
+    def get(self, key_hash):
+        """(found, info) — found is False when the hash must be looked up."""
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is None or entry[0] <= time.monotonic():
+                self.stats['misses'] += 1
+                return False, None
+            self.stats['hits'] += 1
+            return True, entry[1]
+
+    def put(self, key_hash, info):
+        ttl = self.ttl if info else self.negative_ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key_hash not in self._entries:
+                now = time.monotonic()
+                self._entries = {h: e for h, e in self._entries.items() if e[0] > now}
+                while len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]  # oldest insert first
+            self._entries[key_hash] = (time.monotonic() + ttl, info)
+
+    def revoke(self, key_id):
+        with self._lock:
+            stale = [h for h, (_, info) in self._entries.items() if info and str(info.get('id')) == str(key_id)]
+            for h in stale:
+                del self._entries[h]
+            self.stats['revoked'] += len(stale)
+
+    def snapshot(self):
+        with self._lock:
+            return {'entries': len(self._entries), **self.stats}
+
+
+class ApiKeyUsage:
+    """Buffers last_used_at per key id; flush() writes them all in one PATCH
+    (stamped with the latest use in the batch — accurate to the flush interval)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.stats = {'flushes': 0, 'written': 0, 'failed': 0}
+
+    def touch(self, key_id):
+        with self._lock:
+            self._pending[key_id] = datetime.now(timezone.utc)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        ids = ','.join(str(i) for i in pending)
+        result = supabase_request('PATCH', f'api_keys?id=in.({ids})',
+                                  {'last_used_at': max(pending.values()).isoformat()}, prefer='return=minimal')
+        if not supa_ok(result):
+            with self._lock:
+                for key_id, used_at in pending.items():  # retried next round unless a newer use is queued
+                    self._pending.setdefault(key_id, used_at)
+            self.stats['failed'] += 1
+            log_error('APIKeys', f'last_used_at flush failed for {len(pending)} keys: {result.get("error")}')
+            return 0
+        self.stats['flushes'] += 1
+        self.stats['written'] += len(pending)
+        return len(pending)
+
+    def snapshot(self):
+        with self._lock:
+            return {'pending': len(self._pending), **self.stats}
+
+
+_api_key_cache = ApiKeyCache()
+_api_key_usage = ApiKeyUsage()
+
+
+def _api_key_usage_loop():
+    """Background thread: flush buffered last_used_at writes"""
+    while True:
+        time.sleep(API_KEY_USAGE_FLUSH_SECONDS)
+        try:
+            _api_key_usage.flush()
+        except Exception as e:
+            log_error('APIKeys', 'Usage flush failed', e)
+
 
 def verify_api_key(key):
-    """Verify API key — checks static keys first, then Supabase api_keys table."""
+    """Verify API key — checks static keys first, then the cache, then Supabase api_keys table."""
     if not key:
         return None
     if key in STATIC_API_KEYS:
         return {'label': STATIC_API_KEYS[key], 'source': 'env'}
-    try:
-        result = supabase_request('GET',
-            f'api_keys?select=id,label,role,active'
-            f'&key_hash=eq.{hashlib.sha256(key.encode()).hexdigest()}'
-            f'&active=eq.true&limit=1')
-        if isinstance(result, list) and result:
-            supabase_request('PATCH',
-                f'api_keys?id=eq.{result[0]["id"]}',
-                {'last_used_at': datetime.now(timezone.utc).isoformat()})
-            return {'label': result[0].get('label', ''), 'source': 'supabase',
+    key_hash = hashlib.sha256(key.encode()).hexdigest()
+    found, info = _api_key_cache.get(key_hash)
+    if not found:
+        try:
+            result = supabase_request('GET',
+                f'api_keys?select=id,label,role,active'
+                f'&key_hash=eq.{key_hash}'
+                f'&active=eq.true&limit=1')
+        except Exception as e:
+            log_error('APIKeys', f'verify_api_key failed: {e}')
+            return None
+        if not isinstance(result, list):
+            return None  # lookup failed — don't cache a rejection
+        info = None
+        if result:
+            info = {'id': result[0]['id'], 'label': result[0].get('label', ''), 'source': 'supabase',
                     'role': result[0].get('role', 'integration')}
-    except Exception as e:
-        log_error('APIKeys', f'verify_api_key failed: {e}')
-    return None
+        _api_key_cache.put(key_hash, info)
+    if info:
+        _api_key_usage.touch(info['id'])
+    return info
+
+
+_UNRESOLVED = object()
+
+
+class AuthContext:
+    """Who is calling, resolved once per request from its headers.
+
+    ProxyHandler._dispatch builds one per request and every handler reads it via
+    self._auth_context(), so the route-level check, the handler's own check and
+    any created_by/owner lookups share one JWT decode, one API-key lookup and one
+    auth_users fetch. Each part is resolved on first access.
+    """
+
+    def __init__(self, headers):
+        self.headers = headers
+        auth_header = headers.get('Authorization', '')
+        self.token = auth_header[7:] if auth_header.startswith('Bearer ') else None
+        self._claims = self._api_key = self._auth = self._member = _UNRESOLVED
+
+    @property
+    def claims(self):
+        """Decoded Bearer JWT (refresh tokens included — handlers reject those) or None."""
+        if self._claims is _UNRESOLVED:
+            self._claims = verify_jwt_token(self.token) if self.token else None
+        return self._claims
+
+    @property
+    def api_key(self):
+        """verify_api_key() info for the X-API-Key header, or None."""
+        if self._api_key is _UNRESOLVED:
+            self._api_key = verify_api_key(self.headers.get('X-API-Key', ''))
+        return self._api_key
+
+    @property
+    def auth(self):
+        """check_auth_any() result: JWT access token first, then X-API-Key."""
+        if self._auth is _UNRESOLVED:
+            payload = self.claims
+            if payload and payload.get('type') != 'refresh':
+                self._auth = {'method': 'jwt', 'email': payload.get('email', ''), 'user_id': payload.get('user_id'),
+                              'role': payload.get('role', 'equipe'), 'payload': payload}
+            elif self.api_key:
+                self._auth = {'method': 'api_key', 'label': self.api_key['label'],
+                              'role': self.api_key.get('role', 'integration')}
+            else:
+                self._auth = None
+        return self._auth
+
+    @property
+    def member(self):
+        """The caller's auth_users row (id, email, full_name, role), or None for API keys/unknown users."""
+        if self._member is _UNRESOLVED:
+            self._member = None
+            auth = self.auth
+            if auth and auth['method'] == 'jwt' and auth['payload'].get('user_id') is not None:
+                user_id = urllib.parse.quote(str(auth['payload']['user_id']))
+                rows = supabase_request('GET', f'auth_users?id=eq.{user_id}&select=id,email,full_name,role')
+                if isinstance(rows, list) and rows:
+                    self._member = rows[0]
+        return self._member
 
 
 def check_auth_any(headers):
     """Check auth via JWT Bearer OR X-API-Key header."""
-    auth_header = headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        payload = verify_jwt_token(auth_header[7:])
-        if payload and payload.get('type') != 'refresh':
-            return {'method': 'jwt', 'email': payload.get('email', ''),
-                    'role': payload.get('role', 'equipe'), 'payload': payload}
-    api_key = headers.get('X-API-Key', '')
-    if api_key:
-        result = verify_api_key(api_key)
-        if result:
-            return {'method': 'api_key', 'label': result['label'],
-                    'role': result.get('role', 'integration')}
-    return None
+    return AuthContext(headers).auth
+
+
+# ===== PASSWORD HASHING POOL =====
+# bcrypt burns ~100–300 ms of CPU per check. Logins verify (and re-hash legacy
+# SHA-256 passwords) on a small dedicated pool with a bounded queue, and attempts
+# are throttled per account and per IP before any hashing, so a credential-
+# stuffing burst saturates the login route and nothing else. The pool is the
+# login route's concurrency bound: at most PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT
+# request workers wait on it, the next login gets 503 + Retry-After.
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', '2'))  # 0 = hash inline on the request thread
+PASSWORD_QUEUE_LIMIT = int(os.environ.get('PASSWORD_QUEUE_LIMIT', '2'))
+LOGIN_ACCOUNT_MAX_FAILURES = int(os.environ.get('LOGIN_ACCOUNT_MAX_FAILURES', '5'))
+LOGIN_ACCOUNT_WINDOW = int(os.environ.get('LOGIN_ACCOUNT_WINDOW', '900'))
+LOGIN_IP_MAX_ATTEMPTS = int(os.environ.get('LOGIN_IP_MAX_ATTEMPTS', '30'))
+LOGIN_IP_WINDOW = int(os.environ.get('LOGIN_IP_WINDOW', '300'))
+LOGIN_THROTTLE_MAX_KEYS = 10000
+
+
+class PasswordPoolBusy(RuntimeError):
+    pass
+
+
+class PasswordPool:
+    """Runs hash/verify on `workers` threads; at most `queue_limit` more may wait."""
+
+    def __init__(self, workers=PASSWORD_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT):
+        self.workers = workers
+        self._executor = None
+        if workers > 0:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+            self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.stats = {'completed': 0, 'rejected': 0}
+
+    def run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise PasswordPoolBusy('Password verification queue is full')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        result = future.result()
+        self.stats['completed'] += 1
+        return result
+
+    def verify(self, password, stored_hash):
+        return self.run(verify_password, password, stored_hash)
+
+    def hash(self, password):
+        return self.run(hash_password, password)
+
+    def snapshot(self):
+        return {'workers': self.workers, **self.stats}
+
+
+class LoginThrottle:
+    """Sliding windows: failed logins per account, attempts per client IP."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+        self.stats = {'throttled': 0}
+
+    def _recent(self, key, window, now):
+        events = self._events.get(key)
+        while events and events[0] <= now - window:
+            events.popleft()
+        return events
+
+    def check(self, email, ip):
+        """Seconds until this login may be tried (0 → go ahead; the attempt is counted for ip)."""
+        now = time.monotonic()
+        with self._lock:
+            for key, limit, window in ((f'account:{email}', LOGIN_ACCOUNT_MAX_FAILURES, LOGIN_ACCOUNT_WINDOW),
+                                       (f'ip:{ip}', LOGIN_IP_MAX_ATTEMPTS, LOGIN_IP_WINDOW)):
+                events = self._recent(key, window, now)
+                if events and len(events) >= limit:
+                    self.stats['throttled'] += 1
+                    return max(1, int(events[0] + window - now) + 1)
+            self._append(f'ip:{ip}', now)
+            return 0
+
+    def failed(self, email):
+        with self._lock:
+            self._append(f'account:{email}', time.monotonic())
+
+    def succeeded(self, email):
+        with self._lock:
+            self._events.pop(f'account:{email}', None)
+
+    def _append(self, key, now):
+        if key not in self._events and len(self._events) >= LOGIN_THROTTLE_MAX_KEYS:
+            horizon = now - max(LOGIN_ACCOUNT_WINDOW, LOGIN_IP_WINDOW)
+            self._events = {k: e for k, e in self._events.items() if e and e[-1] > horizon}
+        self._events.setdefault(key, collections.deque()).append(now)
+
+    def snapshot(self):
+        with self._lock:
+            return {'tracked_keys': len(self._events), **self.stats}
+
+
+_password_pool = PasswordPool()
+_login_throttle = LoginThrottle()
 
 
 # Auth users stored in Supabase table 'auth_users'
@@ -265,30 +675,295 @@ def generate_presigned_url(key, expires=3600):
     url = f'https://{host}{canonical_uri}?{canonical_querystring}&X-Amz-Signature={signature}'
     return url
 
+# ===== RESILIENCE (circuit breakers + retry budget) =====
+# One breaker per upstream: after BREAKER_FAILURE_THRESHOLD consecutive failures
+# (connection errors, timeouts, 5xx/429) calls fail fast for BREAKER_RESET_SECONDS,
+# then a single probe decides whether to close again. Retries back off with full
+# jitter and, after the first one, never sleep past the request's retry deadline,
+# so an upstream incident costs a handler one quick 503 instead of a worker thread
+# asleep for seconds.
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+RETRY_BACKOFF_CAP = float(os.environ.get('RETRY_BACKOFF_CAP', '4'))
+REQUEST_RETRY_DEADLINE = float(os.environ.get('REQUEST_RETRY_DEADLINE', '20'))  # seconds per HTTP request
+UPSTREAM_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f'{name} circuit open (retry in {retry_in:.0f}s)')
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """closed → open after `threshold` consecutive failures → half-open after
+    `reset_seconds` (one probe call) → closed on success / open again on failure."""
+
+    def __init__(self, name, threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.last_error = None
+        self.stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def before_call(self):
+        with self._lock:
+            if self.state == 'open':
+                retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+                if retry_in > 0:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, retry_in)
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open':
+                if self._probing:
+                    self.stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._probing = True
+            self.stats['calls'] += 1
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            self._probing = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.threshold):
+                if self.state == 'closed':
+                    log_info('Breaker', f'{self.name} aberto após {self.failures} falhas: {self.last_error}')
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.stats['opened'] += 1
+
+    def abandon(self):
+        """The call never reached the upstream (e.g. local pool timeout): free the probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def record_status(self, status):
+        if status in UPSTREAM_RETRY_STATUSES:
+            self.record_failure(f'HTTP {status}')
+        else:
+            self.record_success()
+
+    def snapshot(self):
+        with self._lock:
+            snap = {'state': self.state, 'consecutive_failures': self.failures,
+                    'last_error': self.last_error, **self.stats}
+            if self.state == 'open':
+                snap['retry_in'] = round(max(0.0, self.opened_at + self.reset_seconds - time.monotonic()), 1)
+            return snap
+
+
+BREAKERS = {name: CircuitBreaker(name)
+            for name in ('supabase', 'evolution', 'clickup', 'gemini', 'openai', 'groq', 'voyage')}
+
+_request_deadline = threading.local()  # .at = monotonic deadline, set per routed request
+
+
+def retry_delay(attempt, base):
+    """Full-jitter backoff for retry `attempt` (0-based), or None when sleeping it
+    would run past the current request's retry deadline — give up instead. The first
+    retry is always allowed: audio/copilot handlers can spend the whole deadline in
+    Whisper or Gemini and their Supabase writes still deserve a second attempt."""
+    delay = random.uniform(0, min(RETRY_BACKOFF_CAP, base * (2 ** attempt)))
+    deadline = getattr(_request_deadline, 'at', None)
+    if attempt > 0 and deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def upstream_urlopen(name, req, timeout):
+    """urllib.request.urlopen through the `name` breaker (HTTPError 5xx/429 and
+    network errors count as failures; other HTTP errors prove the upstream is up)."""
+    breaker = BREAKERS[name]
+    breaker.before_call()
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        breaker.record_status(e.code)
+        raise
+    except (OSError, http.client.HTTPException) as e:
+        breaker.record_failure(e)
+        raise
+    except BaseException:
+        breaker.abandon()  # never reached the upstream's verdict (e.g. a bad request object)
+        raise
+    breaker.record_success()
+    return resp
+
+
+def upstream_https(name, host, method, path, body=None, headers=None, timeout=60):
+    """One request over a fresh HTTPSConnection through the `name` breaker.
+    Returns (status, body bytes)."""
+    breaker = BREAKERS[name]
+    breaker.before_call()
+    try:
+        conn = http.client.HTTPSConnection(host, timeout=timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            data = resp.read()
+        finally:
+            conn.close()
+    except (OSError, http.client.HTTPException) as e:
+        breaker.record_failure(e)
+        raise
+    except BaseException:
+        breaker.abandon()
+        raise
+    breaker.record_status(resp.status)
+    return resp.status, data
+
+
 # ===== SUPABASE CONNECTION POOL =====
+# Each thread checks out its own keep-alive HTTPS connection, so PostgREST calls
+# from request workers, crons and storage pipelines run in parallel instead of
+# queueing on one lock. Idle connections are kept LIFO (warmest first), checked
+# for a peer close before reuse and evicted after SUPABASE_POOL_IDLE_SECONDS
+# (Supabase's edge drops idle keep-alives at ~60s).
 SUPABASE_HOST = 'knusqfbvhsqworzyhvip.supabase.co'
-_supa_lock = threading.Lock()
-_supa_conn = None
+SUPABASE_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', '8'))
+SUPABASE_POOL_WAIT_TIMEOUT = float(os.environ.get('SUPABASE_POOL_WAIT_TIMEOUT', '10'))
+SUPABASE_POOL_IDLE_SECONDS = float(os.environ.get('SUPABASE_POOL_IDLE_SECONDS', '45'))
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+class HTTPConnectionPool:
+    """Bounded pool of persistent http.client connections to one host."""
+
+    def __init__(self, host, size, port=None, timeout=15, wait_timeout=SUPABASE_POOL_WAIT_TIMEOUT,
+                 idle_seconds=SUPABASE_POOL_IDLE_SECONDS, connection_class=http.client.HTTPSConnection):
+        self.host = host
+        self.port = port
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.wait_timeout = wait_timeout
+        self.idle_seconds = idle_seconds
+        self.connection_class = connection_class
+        self._idle = []  # [(conn, released_at)], most recently used last
+        self._open = 0
+        self._waiters = collections.deque()
+        self._cond = threading.Condition()
+        self.stats = {'acquired': 0, 'created': 0, 'reused': 0, 'unhealthy': 0, 'idle_evicted': 0,
+                      'waited': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0, 'timeouts': 0}
+
+    def acquire(self):
+        t0 = time.monotonic()
+        deadline = t0 + self.wait_timeout
+        with self._cond:
+            if not self._waiters:
+                conn = self._take()
+                if conn is not None:
+                    return self._checkout(conn, t0, False)
+            # FIFO hand-off: a thread that just released can't barge past older waiters
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    if self._waiters[0] is ticket:
+                        conn = self._take()
+                        if conn is not None:
+                            return self._checkout(conn, t0, True)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(f'no free connection to {self.host} after {self.wait_timeout}s '
+                                          f'(pool size {self.size})')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+    def _take(self):
+        """Idle connection (warmest healthy one) or a new one if under size; None when exhausted."""
+        self._evict_idle(time.monotonic())
+        while self._idle:
+            conn, _ = self._idle.pop()
+            if self._healthy(conn):
+                self.stats['reused'] += 1
+                return conn
+            self.stats['unhealthy'] += 1
+            self._discard(conn)
+        if self._open < self.size:
+            self._open += 1
+            self.stats['created'] += 1
+            return self.connection_class(self.host, self.port, timeout=self.timeout)
+        return None
 
+    def release(self, conn, reusable=True):
+        """Return a connection; reusable=False when the response/connection state is unknown."""
+        with self._cond:
+            if reusable and conn.sock is not None:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+    def snapshot(self):
+        with self._cond:
+            snap = dict(self.stats, size=self.size, open=self._open, idle=len(self._idle))
+        snap['wait_ms_total'] = round(snap['wait_ms_total'], 1)
+        snap['wait_ms_max'] = round(snap['wait_ms_max'], 1)
+        return snap
+
+    def _checkout(self, conn, t0, waited):
+        self.stats['acquired'] += 1
+        if waited:
+            wait_ms = (time.monotonic() - t0) * 1000
+            self.stats['waited'] += 1
+            self.stats['wait_ms_total'] += wait_ms
+            self.stats['wait_ms_max'] = max(self.stats['wait_ms_max'], wait_ms)
+        return conn
+
+    def _evict_idle(self, now):
+        # _idle is ordered by release time, so stale entries are at the front
+        while self._idle and now - self._idle[0][1] > self.idle_seconds:
+            self.stats['idle_evicted'] += 1
+            self._discard(self._idle.pop(0)[0])
+
+    def _discard(self, conn):
+        self._open -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
 
-def _get_supa_conn():
-    """Retorna conexão HTTPS persistente com Supabase"""
-    global _supa_conn
-    if _supa_conn is not None:
-        return _supa_conn
-    _supa_conn = http.client.HTTPSConnection(SUPABASE_HOST, timeout=15)
-    return _supa_conn
+    @staticmethod
+    def _healthy(conn):
+        """An idle keep-alive socket must have nothing to read: readable means EOF or stray bytes."""
+        if conn.sock is None:
+            return True  # never connected / already closed cleanly; connects lazily on request
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
 
 
-def _reset_supa_conn():
-    """Fecha e reseta a conexão Supabase"""
-    global _supa_conn
-    try:
-        if _supa_conn:
-            _supa_conn.close()
-    except Exception:
-        pass
-    _supa_conn = None
+_supa_pool = HTTPConnectionPool(SUPABASE_HOST, SUPABASE_POOL_SIZE)
 
 
 def log_info(source, msg):
@@ -840,6 +1515,60 @@ class SupabaseResponse:
         return default
 
 
+class SList(list):
+    """Successful list payload — a real list plus .status_code/.json()/.text (decoded on demand)."""
+    __slots__ = ('status_code', '_raw')
+
+    def __init__(self, items=(), status_code=200, raw=b''):
+        super().__init__(items)
+        self.status_code = status_code
+        self._raw = raw
+
+    @property
+    def text(self):
+        return self._raw.decode() if self._raw else ''
+
+    def json(self):
+        return list(self)
+
+
+class SDict(dict):
+    """Successful object payload — a real dict plus .status_code/.json()/.text (decoded on demand)."""
+    __slots__ = ('status_code', '_raw')
+
+    def __init__(self, items=(), status_code=200, raw=b''):
+        super().__init__(items)
+        self.status_code = status_code
+        self._raw = raw
+
+    @property
+    def text(self):
+        return self._raw.decode() if self._raw else ''
+
+    def json(self):
+        return dict(self)
+
+
+class SDict204(dict):
+    """204 No Content."""
+    __slots__ = ()
+    status_code = 204
+    text = ''
+
+    def json(self):
+        return {}
+
+
+def _wrap_supabase_payload(resp_body, status):
+    """Parse a 200/201 body and inject .status_code/.json()/.text for backward compat."""
+    parsed = json_loads(resp_body) if resp_body else {}
+    if isinstance(parsed, list):
+        return SList(parsed, status, resp_body)
+    if isinstance(parsed, dict):
+        return SDict(parsed, status, resp_body)
+    return parsed
+
+
 def supa_ok(result):
     """Check if supabase_request succeeded. Works with both raw data and SupabaseResponse."""
     if isinstance(result, SupabaseResponse):
@@ -915,9 +1644,221 @@ def _dependency_reactor(completed_task_id, completed_titulo=''):
     return results
 
 
-def supabase_request(method, path, body=None, _retries=3, _backoff=1.0):
-    """Make a request to Supabase REST API with retry logic and connection pooling.
-    Returns SupabaseResponse (supports .status_code, .json(), .text AND dict/list access)."""
+# ===== SUPABASE READ CACHE =====
+# Opt-in read-through cache for reference data. Rules map a path prefix to a TTL
+# (a bare table name covers every GET on it; longest prefix wins). Any
+# POST/PATCH/PUT/DELETE this process sends to a table drops that table's entries,
+# and a per-table generation stops a GET that raced the write from re-caching the
+# old rows. Writes made elsewhere (the dashboard talks to Supabase directly) are
+# only bounded by the TTL, hence the short values.
+# Override/extend with SUPABASE_CACHE_TTLS="spalla_members=300,god_lists=0" (0 disables).
+SUPABASE_CACHE_TTLS = {
+    'spalla_members': 300,
+    'wa_topic_types': 600,
+    'god_lists': 300,
+    'mentorados?select=id,nome&': 60,
+}
+_raw_ttls = os.environ.get('SUPABASE_CACHE_TTLS', '')
+if _raw_ttls:
+    for entry in _raw_ttls.split(','):
+        if '=' in entry:
+            _prefix, _ttl = entry.rsplit('=', 1)
+            SUPABASE_CACHE_TTLS[_prefix.strip()] = int(_ttl.strip())
+SUPABASE_CACHE_MAX_ENTRIES = int(os.environ.get('SUPABASE_CACHE_MAX_ENTRIES', '512'))
+SUPABASE_CACHE_MAX_BYTES = int(os.environ.get('SUPABASE_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+
+def _supabase_table(path):
+    return path.split('?', 1)[0].split('/', 1)[0]
+
+
+class SupabaseReadCache:
+    """TTL + LRU cache of raw GET bodies, invalidated per table."""
+
+    def __init__(self, ttls, max_entries=SUPABASE_CACHE_MAX_ENTRIES, max_bytes=SUPABASE_CACHE_MAX_BYTES):
+        # (prefix, ttl, whole_table): a bare table name must match the table exactly,
+        # so 'spalla_members' doesn't also cover 'spalla_members_log'
+        self._rules = sorted(((prefix, ttl, prefix == _supabase_table(prefix)) for prefix, ttl in ttls.items() if ttl > 0),
+                             key=lambda item: len(item[0]), reverse=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()  # path → (expires, raw, status, table)
+        self._bytes = 0
+        self._generations = collections.defaultdict(int)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'expired': 0, 'invalidations': 0, 'evictions': 0}
+
+    def ttl_for(self, path):
+        table = _supabase_table(path)
+        for prefix, ttl, whole_table in self._rules:
+            if (prefix == table) if whole_table else path.startswith(prefix):
+                return ttl
+        return 0
+
+    def get(self, path):
+        """Fresh SList/SDict for a cached path, or None (also returns the table generation)."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(path)
+                    self.stats['hits'] += 1
+                    return _wrap_supabase_payload(entry[1], entry[2]), None
+                self._drop(path)
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None, self._generations[_supabase_table(path)]
+
+    def generation(self, path):
+        """Write counter of path's table — bumped by invalidate() after every write."""
+        with self._lock:
+            return self._generations.get(_supabase_table(path), 0)
+
+    def put(self, path, result, ttl, generation):
+        if not isinstance(result, (SList, SDict)) or len(result._raw) > self.max_bytes // 4:
+            return
+        table = _supabase_table(path)
+        with self._lock:
+            if self._generations[table] != generation:
+                return  # a write to this table landed while the GET was in flight
+            if path in self._entries:
+                self._drop(path)
+            self._entries[path] = (time.monotonic() + ttl, result._raw, result.status_code, table)
+            self._bytes += len(result._raw)
+            self.stats['stores'] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def invalidate(self, path):
+        table = _supabase_table(path)
+        with self._lock:
+            self._generations[table] += 1
+            stale = [p for p, entry in self._entries.items() if entry[3] == table]
+            for p in stale:
+                self._drop(p)
+            if stale:
+                self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes,
+                        hit_ratio=round(self.stats['hits'] / total, 3) if total else 0.0)
+
+    def _drop(self, path):
+        entry = self._entries.pop(path)
+        self._bytes -= len(entry[1])
+
+
+_supa_cache = SupabaseReadCache(SUPABASE_CACHE_TTLS)
+
+
+# ===== SINGLEFLIGHT =====
+# When several dashboards load together they fire the same view GETs at the same
+# moment. Concurrent identical GETs share one upstream call; followers get their
+# own parse of the leader's bytes, so a handler mutating its rows can't leak into
+# another request.
+SUPABASE_SINGLEFLIGHT = os.environ.get('SUPABASE_SINGLEFLIGHT', '1') != '0'
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Run fn once per key among concurrent callers; do() returns (result, shared)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.stats = {'leaders': 0, 'coalesced': 0, 'max_followers': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats['leaders'] += 1
+            else:
+                flight.followers += 1
+                self.stats['coalesced'] += 1
+                self.stats['max_followers'] = max(self.stats['max_followers'], flight.followers)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._flights))
+
+
+_supa_flight = SingleFlight()
+
+
+def _fork_supabase_result(result):
+    """A private copy of a shared supabase_request result (errors are never mutated)."""
+    if isinstance(result, (SList, SDict)):
+        return _wrap_supabase_payload(result._raw, result.status_code)
+    if isinstance(result, SDict204):
+        return SDict204()
+    return result
+
+
+def supabase_request(method, path, body=None, _retries=3, _backoff=1.0, prefer='return=representation'):
+    """Make a request to Supabase REST API with retry logic and connection pooling (_supa_pool).
+    Returns SupabaseResponse (supports .status_code, .json(), .text AND dict/list access).
+    prefer: PostgREST Prefer header (e.g. 'return=minimal' to skip echoing inserted rows).
+    Concurrent identical GETs are coalesced into one upstream call (SingleFlight), and
+    GETs matching SUPABASE_CACHE_TTLS are served from _supa_cache. The flight key
+    carries the table's write generation, so a GET issued after this process wrote
+    to the table never joins a flight that started before the write."""
+    if method != 'GET':
+        try:
+            return _supabase_request(method, path, body, _retries, _backoff, prefer)
+        finally:
+            _supa_cache.invalidate(path)
+
+    ttl = _supa_cache.ttl_for(path)
+    if ttl:
+        cached, generation = _supa_cache.get(path)
+        if cached is not None:
+            return cached
+    else:
+        generation = _supa_cache.generation(path)
+
+    def fetch():
+        result = _supabase_request(method, path, body, _retries, _backoff, prefer)
+        if ttl:
+            _supa_cache.put(path, result, ttl, generation)
+        return result
+
+    if not SUPABASE_SINGLEFLIGHT:
+        return fetch()
+    result, shared = _supa_flight.do((path, prefer, generation), fetch)
+    return _fork_supabase_result(result) if shared else result
+
+
+def _supabase_request(method, path, body, _retries, _backoff, prefer):
     key = SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY
     if not key:
         return SupabaseResponse({'error': 'Supabase key not configured'}, 500)
@@ -926,73 +1867,181 @@ def supabase_request(method, path, body=None, _retries=3, _backoff=1.0):
         'apikey': key,
         'Authorization': f'Bearer {key}',
         'Content-Type': 'application/json',
-        'Prefer': 'return=representation',
+        'Prefer': prefer,
     }
     data = json.dumps(body).encode() if body else None
     url = f'/rest/v1/{path}'
     last_error = None
+    breaker = BREAKERS['supabase']
 
     for attempt in range(_retries):
         try:
-            with _supa_lock:
-                conn = _get_supa_conn()
+            breaker.before_call()
+        except CircuitOpenError as e:
+            return last_error if last_error is not None else SupabaseResponse({'error': str(e)}, 503)
+        try:
+            conn = _supa_pool.acquire()
+            reusable = False
+            try:
                 conn.request(method, url, body=data, headers=headers)
                 resp = conn.getresponse()
                 resp_body = resp.read()
                 status = resp.status
+                reusable = not resp.will_close
+            finally:
+                _supa_pool.release(conn, reusable)
+            breaker.record_status(status)
 
             if status in (200, 201):
-                parsed = json.loads(resp_body) if resp_body else {}
-                # Inject .status_code and .json() on native types for backward compat
-                if isinstance(parsed, list):
-                    class SList(list):
-                        status_code = status
-                        text = resp_body.decode() if resp_body else ''
-                        def json(self): return list(self)
-                    return SList(parsed)
-                elif isinstance(parsed, dict):
-                    class SDict(dict):
-                        status_code = status
-                        text = resp_body.decode() if resp_body else ''
-                        def json(self): return dict(self)
-                    return SDict(parsed)
-                return parsed
+                return _wrap_supabase_payload(resp_body, status)
 
             elif status in (204,):
-                class SDict204(dict):
-                    status_code = 204
-                    text = ''
-                    def json(self): return {}
                 return SDict204()
 
-            elif status in (503, 429, 500, 502, 504):
+            elif status in UPSTREAM_RETRY_STATUSES:
                 last_error = SupabaseResponse({'error': f'Supabase {status}: {resp_body.decode()}'}, status)
-                if attempt < _retries - 1:
-                    wait = _backoff * (2 ** attempt)
-                    log_info('Supabase', f'Erro {status}, tentativa {attempt+1}/{_retries}, aguardando {wait}s...')
-                    time.sleep(wait)
-                    with _supa_lock:
-                        _reset_supa_conn()
-                    continue
+                log_info('Supabase', f'Erro {status}, tentativa {attempt+1}/{_retries}')
             else:
                 return SupabaseResponse({'error': f'Supabase {status}: {resp_body.decode()}'}, status)
 
-        except (http.client.RemoteDisconnected, ConnectionResetError,
-                BrokenPipeError, OSError, http.client.CannotSendRequest) as e:
+        except PoolTimeout as e:
+            breaker.abandon()
+            last_error = SupabaseResponse({'error': str(e)}, 503)  # local saturation, not an upstream fault
+            log_info('Supabase', f'Pool esgotado na tentativa {attempt+1}/{_retries}: {e}')
+        except (http.client.HTTPException, OSError) as e:
+            breaker.record_failure(e)
             last_error = SupabaseResponse({'error': str(e)}, 503)
             log_info('Supabase', f'Erro de conexão na tentativa {attempt+1}/{_retries}: {e}')
-            with _supa_lock:
-                _reset_supa_conn()
-            if attempt < _retries - 1:
-                wait = _backoff * (2 ** attempt)
-                time.sleep(wait)
-                continue
         except Exception as e:
+            breaker.abandon()
             log_error('Supabase', 'Erro inesperado', e)
             return SupabaseResponse({'error': str(e)}, 500)
 
+        if attempt < _retries - 1:
+            wait = retry_delay(attempt, _backoff)
+            if wait is None:
+                log_info('Supabase', f'Sem tempo para nova tentativa ({attempt+1}/{_retries}), desistindo')
+                return last_error
+            time.sleep(wait)
+
     log_error('Supabase', f'Todas as {_retries} tentativas falharam', None)
-    return last_error or SupabaseResponse({'error': 'Max retries exceeded'}, 500)
+    return last_error if last_error is not None else SupabaseResponse({'error': 'Max retries exceeded'}, 500)
+
+
+SUPABASE_BULK_BATCH_SIZE = int(os.environ.get('SUPABASE_BULK_BATCH_SIZE', '100'))
+_BULK_BISECT_STATUSES = (400, 409, 413, 422)  # row-dependent rejections worth isolating
+
+
+def supabase_bulk_insert(table, rows, batch_size=SUPABASE_BULK_BATCH_SIZE, returning='minimal'):
+    """Insert rows as JSON-array POSTs of batch_size.
+
+    PostgREST applies each array atomically, so a batch rejected for its content is
+    split in halves until the offending rows are isolated — the rest still land.
+    Returns {'inserted', 'failed', 'errors': [{'index', 'error'}], 'rows'}; 'rows'
+    holds the inserted records only when returning='representation'.
+    """
+    outcome = _supabase_bulk_write(table, rows, batch_size, f'return={returning}')
+    outcome['inserted'] = outcome.pop('written')
+    return outcome
+
+
+def supabase_bulk_upsert(table, rows, on_conflict, batch_size=SUPABASE_BULK_BATCH_SIZE, returning='minimal'):
+    """Insert-or-update rows keyed by on_conflict ('col' or 'col1,col2' — needs a matching
+    non-partial unique index). Existing rows get only the columns present in the row.
+
+    Rows repeating a conflict key collapse to the last one (Postgres refuses to touch a
+    row twice in one statement). Same result shape as supabase_bulk_insert, with
+    'upserted' instead of 'inserted'.
+    """
+    key_cols = on_conflict.split(',')
+    latest = {}
+    for idx, row in enumerate(rows):
+        latest[tuple(row.get(c) for c in key_cols)] = idx
+    keep = sorted(latest.values())
+    outcome = _supabase_bulk_write(f'{table}?on_conflict={on_conflict}', [rows[i] for i in keep], batch_size,
+                                   f'resolution=merge-duplicates,return={returning}')
+    for err in outcome['errors']:
+        err['index'] = keep[err['index']]
+    outcome['upserted'] = outcome.pop('written')
+    return outcome
+
+
+def _supabase_bulk_write(path, rows, batch_size, prefer):
+    outcome = {'written': 0, 'failed': 0, 'errors': [], 'rows': []}
+
+    def post(indices, batch):
+        result = supabase_request('POST', path, batch, prefer=prefer)
+        if supa_ok(result):
+            outcome['written'] += len(batch)
+            if isinstance(result, list):
+                outcome['rows'].extend(result)
+            return
+        if len(batch) > 1 and getattr(result, 'status_code', 500) in _BULK_BISECT_STATUSES:
+            mid = len(batch) // 2
+            post(indices[:mid], batch[:mid])
+            post(indices[mid:], batch[mid:])
+            return
+        error = str(result.get('error') or result.text)
+        outcome['failed'] += len(batch)
+        outcome['errors'].extend({'index': i, 'error': error} for i in indices)
+
+    # PostgREST requires every object in an array to carry the same keys; rows with an
+    # optional column go in their own arrays instead of sending NULL for the others.
+    groups = {}
+    for idx, row in enumerate(rows):
+        groups.setdefault(tuple(sorted(row)), []).append(idx)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            post(chunk, [rows[i] for i in chunk])
+    outcome['errors'].sort(key=lambda e: e['index'])
+    return outcome
+
+
+SUPABASE_PAGE_SIZE = int(os.environ.get('SUPABASE_PAGE_SIZE', '1000'))  # keep <= PostgREST max-rows (1000 on Supabase)
+
+
+class SupabaseError(RuntimeError):
+    """A supabase_iter page failed even after supabase_request's retries."""
+
+
+def supabase_iter(path, page_size=SUPABASE_PAGE_SIZE, key=None):
+    """Yield the rows of a GET lazily, one page in memory at a time.
+
+    key=None: limit/offset pages over the path's own order (make it total, e.g.
+    order=created_at.desc,id.desc, or pages can overlap). key='id' (unique, sortable,
+    selected): keyset pages via order=<key>.asc&<key>=gt.<last> — constant cost per
+    page and no skipped/repeated rows under concurrent inserts; the path must not
+    carry its own order. Raises SupabaseError on a failed page, so a truncated result
+    is never mistaken for a complete one (a plain GET silently stops at max-rows).
+    """
+    sep = '&' if '?' in path else '?'
+    offset = 0
+    last = None
+    while True:
+        if key is None:
+            page_path = f'{path}{sep}limit={page_size}&offset={offset}'
+        else:
+            page_path = f'{path}{sep}order={key}.asc&limit={page_size}'
+            if last is not None:
+                page_path += f'&{key}=gt.{urllib.parse.quote(str(last), safe="")}'
+        page = supabase_request('GET', page_path)
+        if not isinstance(page, list):
+            error = page.get('error') if isinstance(page, dict) else page
+            raise SupabaseError(f'{_supabase_table(path)}: page at row {offset} failed: {error}')
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += len(page)
+        if key is not None:
+            last = page[-1][key]
+
+
+def _biblioteca_version(doc):
+    """ETag marker for a sp_documentos row — (id, versao, atualizado_em) changes on every edit."""
+    if doc.get('atualizado_em'):
+        return f"{doc.get('id')}:{doc.get('versao')}:{doc['atualizado_em']}"
+    return True
 
 
 def get_mentees_with_email():
@@ -1005,6 +2054,160 @@ def insert_scheduled_call(data):
     return supabase_request('POST', 'calls_mentoria', data)
 
 
+# ===== DIRECT POSTGRES READS =====
+# SUPABASE_READ_BACKEND=postgres sends a whitelist of hot reads straight to
+# Postgres through a psycopg pool (SUPABASE_DB_URL, e.g. the Supavisor pooler)
+# instead of PostgREST. Postgres builds the JSON itself with json_agg — the same
+# thing PostgREST does — so rows come back byte-for-byte in PostgREST's shape,
+# decoded once, with no HTTPS hop. Any Postgres failure (or an open breaker)
+# falls back to the equivalent PostgREST call.
+try:
+    import psycopg
+    import psycopg_pool
+except ImportError:
+    psycopg = psycopg_pool = None
+
+SUPABASE_READ_BACKEND = os.environ.get('SUPABASE_READ_BACKEND', 'rest')  # rest | postgres
+SUPABASE_DB_URL = os.environ.get('SUPABASE_DB_URL', '')
+PG_POOL_SIZE = int(os.environ.get('PG_POOL_SIZE', '8'))
+PG_STATEMENT_TIMEOUT_MS = int(os.environ.get('PG_STATEMENT_TIMEOUT_MS', '15000'))
+
+# name → SQL (psycopg %(param)s placeholders). Only these run over Postgres.
+PG_READS = {
+    'wa_inbox': (
+        "SELECT * FROM vw_wa_mentee_inbox"
+        " WHERE (%(health)s::text IS NULL OR health_status = %(health)s)"
+        " AND (%(fase)s::text IS NULL OR fase_jornada = %(fase)s)"
+        " AND (%(search)s::text IS NULL OR nome ILIKE '%%' || %(search)s || '%%')"
+        " ORDER BY CASE %(sort)s WHEN 'unread_desc' THEN unread_count END DESC NULLS LAST,"
+        " CASE %(sort)s WHEN 'last_message_desc' THEN last_message_at END DESC NULLS LAST,"
+        " horas_sem_resposta_equipe DESC NULLS LAST"),
+    'negative_topics': (
+        "SELECT id, group_jid FROM wa_topics"
+        " WHERE sentiment IN ('negativo', 'critico') AND last_message_at >= %(cutoff)s::timestamptz"),
+    'portfolio_mentees': (
+        "SELECT id, nome, email, instagram, fase_jornada, cohort, ativo, consultor_responsavel,"
+        " whatsapp_7d, whatsapp_30d FROM mentorados"
+        " WHERE ativo AND consultor_responsavel = %(email)s ORDER BY nome"),
+    'portfolio_topics': (
+        "SELECT id, group_jid, mentorado_nome, status, type_slug, last_message_at FROM vw_wa_topic_board"
+        " WHERE mentorado_nome = ANY(%(nomes)s::text[])"
+        " ORDER BY last_message_at DESC NULLS LAST, id DESC"),
+    'busca_keyword': (
+        "SELECT * FROM fn_busca_keyword(p_query => %(p_query)s::text, p_limit => %(p_limit)s::int,"
+        " p_entidade_tipo => %(p_entidade_tipo)s::text, p_categoria => %(p_categoria)s::text,"
+        " p_mentorado_id => %(p_mentorado_id)s::bigint)"),
+    'busca_semantica': (
+        "SELECT * FROM fn_busca_semantica(p_query_embedding => %(p_query_embedding)s::vector,"
+        " p_limit => %(p_limit)s::int, p_entidade_tipo => %(p_entidade_tipo)s::text,"
+        " p_categoria => %(p_categoria)s::text, p_mentorado_id => %(p_mentorado_id)s::bigint,"
+        " p_threshold => %(p_threshold)s::float)"),
+    'busca_hibrida': (
+        "SELECT * FROM fn_busca_hibrida(p_query_embedding => %(p_query_embedding)s::vector,"
+        " p_query_text => %(p_query_text)s::text, p_limit => %(p_limit)s::int,"
+        " p_entidade_tipo => %(p_entidade_tipo)s::text, p_categoria => %(p_categoria)s::text,"
+        " p_mentorado_id => %(p_mentorado_id)s::bigint, p_semantic_weight => %(p_semantic_weight)s::float,"
+        " p_threshold => %(p_threshold)s::float)"),
+}
+
+
+def make_pg_pool(dsn, size=PG_POOL_SIZE, extra_options=''):
+    """psycopg pool for read-only autocommit sessions in UTC (timestamps serialize
+    like PostgREST's). prepare_threshold=None keeps it safe behind a transaction-mode
+    pooler, which can't hold server-side prepared statements."""
+    options = (f'-c timezone=UTC -c statement_timeout={PG_STATEMENT_TIMEOUT_MS}'
+               f' -c default_transaction_read_only=on {extra_options}').strip()
+    return psycopg_pool.ConnectionPool(
+        dsn, min_size=1, max_size=max(1, size), name='spalla-reads', open=True,
+        kwargs={'autocommit': True, 'prepare_threshold': None, 'options': options},
+    )
+
+
+_pg_pool = None
+if SUPABASE_READ_BACKEND == 'postgres':
+    if psycopg_pool is None or not SUPABASE_DB_URL:
+        print('[WARN] SUPABASE_READ_BACKEND=postgres needs psycopg[pool] and SUPABASE_DB_URL — using PostgREST')
+    else:
+        _pg_pool = make_pg_pool(SUPABASE_DB_URL)
+        BREAKERS['postgres'] = CircuitBreaker('postgres')
+
+
+def pg_read(name, params, fallback):
+    """Run whitelisted read `name` on Postgres when enabled, else return fallback()
+    — the equivalent supabase_request/supabase_iter call. Same shape either way: a
+    list of row dicts (an SList with .status_code/.json() on the Postgres path)."""
+    if _pg_pool is None:
+        return fallback()
+    breaker = BREAKERS['postgres']
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        return fallback()
+    try:
+        with _pg_pool.connection(timeout=SUPABASE_POOL_WAIT_TIMEOUT) as conn:
+            row = conn.execute(
+                "SELECT coalesce(json_agg(q), '[]')::text FROM (" + PG_READS[name] + ") q", params,
+            ).fetchone()
+    except psycopg.OperationalError as e:  # connection/pool/timeout trouble
+        breaker.record_failure(e)
+        log_error('PgReads', f'{name} failed, falling back to PostgREST', e)
+        return fallback()
+    except psycopg.Error as e:  # schema drift etc. — Postgres is up, the query isn't
+        breaker.record_success()
+        log_error('PgReads', f'{name} failed, falling back to PostgREST', e)
+        return fallback()
+    breaker.record_success()
+    return _wrap_supabase_payload(row[0].encode(), 200)
+
+
+def pg_reads_snapshot():
+    snap = {'backend': 'postgres' if _pg_pool is not None else 'rest'}
+    if _pg_pool is not None:
+        stats = _pg_pool.get_stats()
+        snap.update({k: stats.get(k, 0) for k in ('pool_size', 'pool_available', 'requests_waiting',
+                                                    'requests_num', 'requests_errors', 'connections_errors')})
+    return snap
+
+
+# ===== FAN-OUT =====
+# Handlers that need several independent upstream reads (context for an AI prompt,
+# dashboard widgets) run them side by side on one shared bounded pool, so latency
+# is the slowest call instead of the sum.
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', '16'))
+_fanout_pool = concurrent.futures.ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+
+
+def _fanout_call(fn):
+    try:
+        return fn()
+    except Exception as e:
+        log_error('Gather', f'{getattr(fn, "__qualname__", fn)} failed', e)
+        return e
+
+
+def _fanout_worker(fn, deadline):
+    _request_deadline.at = deadline  # retries inside the call still honour the caller's budget
+    try:
+        return _fanout_call(fn)
+    finally:
+        _request_deadline.at = None
+
+
+def gather(*calls):
+    """Run zero-arg callables concurrently and return their results in order.
+
+    Errors are isolated: a call that raises leaves its exception object in its slot
+    and the others still complete. The calling thread runs the first call itself;
+    nested gathers (from inside a fan-out worker) run inline so the pool can't
+    deadlock on itself.
+    """
+    if len(calls) <= 1 or threading.current_thread().name.startswith('fanout'):
+        return [_fanout_call(fn) for fn in calls]
+    deadline = getattr(_request_deadline, 'at', None)
+    futures = [_fanout_pool.submit(_fanout_worker, fn, deadline) for fn in calls[1:]]
+    return [_fanout_call(calls[0])] + [f.result() for f in futures]
+
+
 # ===== STORAGE PROCESSING PIPELINE =====
 
 def _openai_request(endpoint, method='POST', body=None, files=None, timeout=120):
@@ -1029,24 +2232,19 @@ def _openai_request(endpoint, method='POST', body=None, files=None, timeout=120)
         for p in parts:
             raw_body += p.encode() if isinstance(p, str) else p
 
-        conn = http.client.HTTPSConnection('api.openai.com', timeout=timeout)
-        conn.request(method, f'/v1/{endpoint}', body=raw_body, headers={
+        status, data = upstream_https('openai', 'api.openai.com', method, f'/v1/{endpoint}', body=raw_body, headers={
             'Authorization': f'Bearer {OPENAI_API_KEY}',
             'Content-Type': f'multipart/form-data; boundary={boundary}',
-        })
+        }, timeout=timeout)
     else:
-        conn = http.client.HTTPSConnection('api.openai.com', timeout=timeout)
-        conn.request(method, f'/v1/{endpoint}',
-                     body=json.dumps(body).encode() if body else None,
-                     headers={
-                         'Authorization': f'Bearer {OPENAI_API_KEY}',
-                         'Content-Type': 'application/json',
-                     })
-    resp = conn.getresponse()
-    data = resp.read()
-    conn.close()
-    if resp.status >= 400:
-        raise ValueError(f'OpenAI API error {resp.status}: {data.decode()[:500]}')
+        status, data = upstream_https('openai', 'api.openai.com', method, f'/v1/{endpoint}',
+                                      body=json.dumps(body).encode() if body else None,
+                                      headers={
+                                          'Authorization': f'Bearer {OPENAI_API_KEY}',
+                                          'Content-Type': 'application/json',
+                                      }, timeout=timeout)
+    if status >= 400:
+        raise ValueError(f'OpenAI API error {status}: {data.decode()[:500]}')
     # Whisper with response_format=text returns plain text, not JSON
     text = data.decode('utf-8').strip()
     if not text:
@@ -1061,18 +2259,14 @@ def _voyage_request(endpoint, body, timeout=60):
     """Make request to Voyage AI API."""
     if not VOYAGE_API_KEY:
         raise ValueError('VOYAGE_API_KEY not configured')
-    conn = http.client.HTTPSConnection('api.voyageai.com', timeout=timeout)
-    conn.request('POST', f'/v1/{endpoint}',
-                 body=json.dumps(body).encode(),
-                 headers={
-                     'Authorization': f'Bearer {VOYAGE_API_KEY}',
-                     'Content-Type': 'application/json',
-                 })
-    resp = conn.getresponse()
-    data = resp.read()
-    conn.close()
-    if resp.status >= 400:
-        raise ValueError(f'Voyage API error {resp.status}: {data.decode()[:500]}')
+    status, data = upstream_https('voyage', 'api.voyageai.com', 'POST', f'/v1/{endpoint}',
+                                  body=json.dumps(body).encode(),
+                                  headers={
+                                      'Authorization': f'Bearer {VOYAGE_API_KEY}',
+                                      'Content-Type': 'application/json',
+                                  }, timeout=timeout)
+    if status >= 400:
+        raise ValueError(f'Voyage API error {status}: {data.decode()[:500]}')
     return json.loads(data)
 
 
@@ -1140,7 +2334,8 @@ def rerank_results(query, results, top_n=10):
 
 
 def openai_whisper(audio_bytes, filename, mime_type):
-    """Transcribe audio via Whisper. Tries Groq first (free), falls back to OpenAI."""
+    """Transcribe audio via Whisper. Tries Groq first (free), falls back to OpenAI.
+    audio_bytes may also be a seekable binary file (e.g. an UploadPart.file); it is streamed."""
     # Try Groq first (free, fast, whisper-large-v3)
     if GROQ_API_KEY:
         try:
@@ -1166,29 +2361,33 @@ def openai_whisper(audio_bytes, filename, mime_type):
 def _whisper_request(host, api_key, model, audio_bytes, filename, mime_type):
     """Send audio to Whisper-compatible API (OpenAI or Groq). Returns transcribed text."""
     boundary = f'----FormBoundary{secrets.token_hex(8)}'
-    parts = []
-    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="model"\r\n\r\n{model}\r\n')
-    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="language"\r\n\r\npt\r\n')
-    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="response_format"\r\n\r\ntext\r\n')
-    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\nContent-Type: {mime_type}\r\n\r\n')
-    parts.append(audio_bytes)
-    parts.append(f'\r\n--{boundary}--\r\n')
-
-    raw_body = b''
-    for p in parts:
-        raw_body += p.encode() if isinstance(p, str) else p
-
-    conn = http.client.HTTPSConnection(host, timeout=300)
-    conn.request('POST', '/openai/v1/audio/transcriptions' if 'groq' in host else '/v1/audio/transcriptions',
-                 body=raw_body, headers={
-                     'Authorization': f'Bearer {api_key}',
-                     'Content-Type': f'multipart/form-data; boundary={boundary}',
-                 })
-    resp = conn.getresponse()
-    data = resp.read()
-    conn.close()
-    if resp.status >= 400:
-        raise ValueError(f'Whisper API error {resp.status} ({host}): {data.decode()[:300]}')
+    head = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="model"\r\n\r\n{model}\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="language"\r\n\r\npt\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="response_format"\r\n\r\ntext\r\n'
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\nContent-Type: {mime_type}\r\n\r\n'
+    ).encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    if isinstance(audio_bytes, (bytes, bytearray)):
+        size = len(audio_bytes)
+        raw_body = b''.join((head, audio_bytes, tail))
+    else:
+        audio_bytes.seek(0, os.SEEK_END)
+        size = audio_bytes.tell()
+        audio_bytes.seek(0)  # rewound per attempt: Groq → OpenAI fallback re-sends the same file
+        raw_body = _iter_upload_body(head, audio_bytes, tail)
+
+    groq = 'groq' in host
+    status, data = upstream_https('groq' if groq else 'openai', host, 'POST',
+                                  '/openai/v1/audio/transcriptions' if groq else '/v1/audio/transcriptions',
+                                  body=raw_body, headers={
+                                      'Authorization': f'Bearer {api_key}',
+                                      'Content-Type': f'multipart/form-data; boundary={boundary}',
+                                      'Content-Length': str(len(head) + size + len(tail)),
+                                  }, timeout=300)
+    if status >= 400:
+        raise ValueError(f'Whisper API error {status} ({host}): {data.decode()[:300]}')
     text = data.decode('utf-8').strip()
     if not text:
         return None
@@ -1200,6 +2399,16 @@ def _whisper_request(host, api_key, model, audio_bytes, filename, mime_type):
         return text
 
 
+def _iter_upload_body(head, fileobj, tail, chunk_size=64 * 1024):
+    yield head
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+    yield tail
+
+
 def gemini_vision_describe(image_bytes, mime_type):
     """Describe image content using Gemini Vision API (free tier). Returns text description."""
     if not GEMINI_API_KEY:
@@ -1213,16 +2422,12 @@ def gemini_vision_describe(image_bytes, mime_type):
             ]
         }]
     }
-    conn = http.client.HTTPSConnection('generativelanguage.googleapis.com', timeout=120)
-    conn.request('POST',
-                 f'/v1beta/models/{GEMINI_VISION_MODEL}:generateContent?key={GEMINI_API_KEY}',
-                 body=json.dumps(body).encode(),
-                 headers={'Content-Type': 'application/json'})
-    resp = conn.getresponse()
-    data = resp.read()
-    conn.close()
-    if resp.status >= 400:
-        raise ValueError(f'Gemini API error {resp.status}: {data.decode()[:500]}')
+    status, data = upstream_https('gemini', 'generativelanguage.googleapis.com', 'POST',
+                                  f'/v1beta/models/{GEMINI_VISION_MODEL}:generateContent?key={GEMINI_API_KEY}',
+                                  body=json.dumps(body).encode(),
+                                  headers={'Content-Type': 'application/json'}, timeout=120)
+    if status >= 400:
+        raise ValueError(f'Gemini API error {status}: {data.decode()[:500]}')
     result = json.loads(data)
     return result['candidates'][0]['content']['parts'][0]['text']
 
@@ -1268,43 +2473,119 @@ def vision_describe(image_bytes, mime_type):
     raise ValueError('No vision API configured (need GEMINI_API_KEY or OPENAI_API_KEY)')
 
 
-def _download_from_supabase_storage(storage_path):
-    """Download file bytes from Supabase Storage bucket."""
+# Storage objects are streamed into a SpooledTemporaryFile: RAM up to
+# STORAGE_SPOOL_BYTES, then a temp file on disk, so a 500 MB recording costs one
+# read chunk of RAM instead of the whole object (plus copies). The extractors and
+# Whisper read from that file. STORAGE_DOWNLOAD_MAX_BYTES is checked against the
+# Content-Length before the body is read and again while streaming. Plain text and
+# images still have to be loaded whole (decode / base64); they are capped at
+# STORAGE_INLINE_MAX_BYTES.
+STORAGE_DOWNLOAD_MAX_BYTES = int(os.environ.get('STORAGE_DOWNLOAD_MAX_BYTES', str(1024 * 1024 * 1024)))
+STORAGE_SPOOL_BYTES = int(os.environ.get('STORAGE_SPOOL_BYTES', str(8 * 1024 * 1024)))
+STORAGE_INLINE_MAX_BYTES = int(os.environ.get('STORAGE_INLINE_MAX_BYTES', str(64 * 1024 * 1024)))
+STORAGE_READ_CHUNK_BYTES = 64 * 1024
+
+
+class StorageObjectTooLarge(ValueError):
+    """Object over STORAGE_DOWNLOAD_MAX_BYTES, or too big for an in-memory extractor."""
+
+
+def _storage_connection():
+    return http.client.HTTPSConnection(SUPABASE_HOST, timeout=60)
+
+
+def _download_from_supabase_storage(storage_path, max_bytes=None):
+    """Stream a file from the Supabase Storage bucket into a SpooledTemporaryFile.
+
+    Returns the file rewound to 0; the caller closes it. Raises StorageObjectTooLarge
+    past max_bytes (default STORAGE_DOWNLOAD_MAX_BYTES) — up front from Content-Length,
+    or mid-stream when the length is missing or wrong.
+    """
+    max_bytes = STORAGE_DOWNLOAD_MAX_BYTES if max_bytes is None else max_bytes
     key = SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY
     encoded_path = urllib.parse.quote(storage_path, safe='/')
     url = f'/storage/v1/object/spalla-arquivos/{encoded_path}'
 
-    conn = http.client.HTTPSConnection('knusqfbvhsqworzyhvip.supabase.co', timeout=60)
-    conn.request('GET', url, headers={
-        'apikey': key,
-        'Authorization': f'Bearer {key}',
-    })
-    resp = conn.getresponse()
-    data = resp.read()
-    conn.close()
-    if resp.status >= 400:
-        raise ValueError(f'Storage download failed {resp.status}: {data.decode()[:200]}')
-    return data
+    conn = _storage_connection()
+    try:
+        conn.request('GET', url, headers={
+            'apikey': key,
+            'Authorization': f'Bearer {key}',
+        })
+        resp = conn.getresponse()
+        if resp.status >= 400:
+            raise ValueError(f'Storage download failed {resp.status}: '
+                             f'{resp.read(4096).decode(errors="replace")[:200]}')
+        length = resp.getheader('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise StorageObjectTooLarge(f'Arquivo muito grande: {int(length)} bytes (máx {max_bytes})')
+        spool = tempfile.SpooledTemporaryFile(max_size=STORAGE_SPOOL_BYTES)
+        try:
+            size = 0
+            while True:
+                chunk = resp.read(STORAGE_READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise StorageObjectTooLarge(f'Arquivo muito grande: mais de {max_bytes} bytes')
+                spool.write(chunk)
+            spool.seek(0)
+            return spool
+        except BaseException:
+            spool.close()
+            raise
+    finally:
+        conn.close()
+
+
+@contextlib.contextmanager
+def _binary_source(source):
+    """Readable binary file for an extractor: a path, bytes, or an open seekable file.
+    Open files are rewound and left open — they belong to the caller."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield f
+    else:
+        source.seek(0)
+        if isinstance(source, tempfile.SpooledTemporaryFile):
+            # Before 3.11 the wrapper has no seekable()/readable(), which zipfile and
+            # TextIOWrapper need: hand over the BytesIO / temp file underneath
+            source = source._file
+        yield source
+
+
+def _read_inline(source, size, what):
+    """Whole payload as bytes, for consumers that need it in memory (text decode, base64)."""
+    if size > STORAGE_INLINE_MAX_BYTES:
+        raise StorageObjectTooLarge(f'{what} muito grande para processar: {size} bytes '
+                                    f'(máx {STORAGE_INLINE_MAX_BYTES})')
+    with _binary_source(source) as f:
+        return f.read()
 
 
-def _extract_text_pdf(file_bytes):
-    """Extract text from PDF using pdfplumber."""
+def _extract_text_pdf(source):
+    """Extract text from PDF using pdfplumber (source: path, bytes or binary file)."""
     try:
         import pdfplumber
-        import io
         text_parts = []
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        with _binary_source(source) as f, pdfplumber.open(f) as pdf:
             for i, page in enumerate(pdf.pages):
                 page_text = page.extract_text() or ''
                 if page_text.strip():
                     text_parts.append(f'--- Página {i+1} ---\n{page_text}')
         return '\n\n'.join(text_parts), {'pages': len(pdf.pages)}, 'pdf_extract'
     except ImportError:
-        # Fallback: try pymupdf
+        # Fallback: try pymupdf (opens paths directly; streams must be handed over as bytes)
         try:
             import fitz
-            import io
-            doc = fitz.open(stream=file_bytes, filetype='pdf')
+            if isinstance(source, (str, os.PathLike)):
+                doc = fitz.open(source)
+            else:
+                with _binary_source(source) as f:
+                    doc = fitz.open(stream=f.read(), filetype='pdf')
             text_parts = []
             for i, page in enumerate(doc):
                 page_text = page.get_text()
@@ -1315,48 +2596,52 @@ def _extract_text_pdf(file_bytes):
             raise ValueError('Neither pdfplumber nor pymupdf installed. Run: pip install pdfplumber')
 
 
-def _extract_text_docx(file_bytes):
-    """Extract text from DOCX."""
+def _extract_text_docx(source):
+    """Extract text from DOCX (source: path, bytes or binary file)."""
     try:
         import docx
-        import io
-        doc = docx.Document(io.BytesIO(file_bytes))
+        with _binary_source(source) as f:
+            doc = docx.Document(f)
         text_parts = [p.text for p in doc.paragraphs if p.text.strip()]
         return '\n\n'.join(text_parts), {'paragraphs': len(text_parts)}, 'docx_extract'
     except ImportError:
         raise ValueError('python-docx not installed. Run: pip install python-docx')
 
 
-def _extract_text_xlsx(file_bytes):
-    """Extract text from XLSX — each sheet as structured text."""
+def _extract_text_xlsx(source):
+    """Extract text from XLSX — each sheet as structured text (source: path, bytes or binary file)."""
     try:
         import openpyxl
-        import io
-        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
-        text_parts = []
-        structured = {}
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            rows = []
-            for row in ws.iter_rows(values_only=True):
-                row_text = ' | '.join(str(c) if c is not None else '' for c in row)
-                if row_text.strip(' |'):
-                    rows.append(row_text)
-            if rows:
-                sheet_text = f'=== Planilha: {sheet_name} ===\n' + '\n'.join(rows)
-                text_parts.append(sheet_text)
-                structured[sheet_name] = rows
+        with _binary_source(source) as f:
+            wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+            text_parts = []
+            structured = {}
+            for sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+                rows = []
+                for row in ws.iter_rows(values_only=True):
+                    row_text = ' | '.join(str(c) if c is not None else '' for c in row)
+                    if row_text.strip(' |'):
+                        rows.append(row_text)
+                if rows:
+                    sheet_text = f'=== Planilha: {sheet_name} ===\n' + '\n'.join(rows)
+                    text_parts.append(sheet_text)
+                    structured[sheet_name] = rows
+            wb.close()
         return '\n\n'.join(text_parts), {'sheets': list(wb.sheetnames)}, 'xlsx_extract'
     except ImportError:
         raise ValueError('openpyxl not installed. Run: pip install openpyxl')
 
 
-def _extract_text_csv(file_bytes):
-    """Extract text from CSV."""
-    import csv, io
-    text = file_bytes.decode('utf-8', errors='replace')
-    reader = csv.reader(io.StringIO(text))
-    rows = [' | '.join(row) for row in reader if any(c.strip() for c in row)]
+def _extract_text_csv(source):
+    """Extract text from CSV (source: path, bytes or binary file), decoded row by row."""
+    import csv
+    with _binary_source(source) as f:
+        text = io.TextIOWrapper(f, encoding='utf-8', errors='replace', newline='')
+        try:
+            rows = [' | '.join(row) for row in csv.reader(text) if any(c.strip() for c in row)]
+        finally:
+            text.detach()  # leave the caller's file open
     return '\n'.join(rows), {'rows': len(rows)}, 'text_direct'
 
 
@@ -1472,6 +2757,10 @@ def process_file_pipeline(arquivo_id):
     3. Chunk text
     4. Generate embeddings
     5. Store in sp_conteudo_extraido + sp_chunks
+
+    Returns the final status_processamento ('concluido' or 'ignorado'). Failures are
+    recorded on the row as 'erro' and re-raised; a cancelled job (see
+    ingestion_checkpoint) is put back to 'pendente' and raises IngestionCancelled.
     """
     log_info('Storage', f'Processing file {arquivo_id}...')
 
@@ -1479,7 +2768,7 @@ def process_file_pipeline(arquivo_id):
     result = supabase_request('GET', f'sp_arquivos?select=*&id=eq.{arquivo_id}')
     if not isinstance(result, list) or not result:
         log_error('Storage', f'File {arquivo_id} not found')
-        return
+        raise LookupError(f'File {arquivo_id} not found')
 
     arquivo = result[0]
     mime = arquivo['mime_type']
@@ -1487,14 +2776,19 @@ def process_file_pipeline(arquivo_id):
     storage_path = arquivo['storage_path']
     nome = arquivo['nome_original']
 
+    source = None
     try:
         # Update status
         supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
                         {'status_processamento': 'extraindo'})
 
-        # Download file
-        file_bytes = _download_from_supabase_storage(storage_path)
-        log_info('Storage', f'Downloaded {nome} ({len(file_bytes)} bytes)')
+        # Download file (spooled to disk past STORAGE_SPOOL_BYTES)
+        source = _download_from_supabase_storage(storage_path)
+        source.seek(0, os.SEEK_END)
+        file_size = source.tell()
+        source.seek(0)
+        log_info('Storage', f'Downloaded {nome} ({file_size} bytes)')
+        ingestion_checkpoint()
 
         # Extract content based on type
         texto = ''
@@ -1503,38 +2797,38 @@ def process_file_pipeline(arquivo_id):
         duracao_seg = None
 
         if mime in ('text/plain', 'text/markdown') or ext in ('txt', 'md'):
-            texto = file_bytes.decode('utf-8', errors='replace')
+            texto = _read_inline(source, file_size, 'Texto').decode('utf-8', errors='replace')
             metodo = 'text_direct'
 
         elif mime == 'application/pdf' or ext == 'pdf':
-            texto, metadados, metodo = _extract_text_pdf(file_bytes)
+            texto, metadados, metodo = _extract_text_pdf(source)
 
         elif mime == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document' or ext == 'docx':
-            texto, metadados, metodo = _extract_text_docx(file_bytes)
+            texto, metadados, metodo = _extract_text_docx(source)
 
         elif mime in ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'application/vnd.ms-excel') or ext in ('xlsx', 'xls'):
-            texto, metadados, metodo = _extract_text_xlsx(file_bytes)
+            texto, metadados, metodo = _extract_text_xlsx(source)
 
         elif mime == 'text/csv' or ext == 'csv':
-            texto, metadados, metodo = _extract_text_csv(file_bytes)
+            texto, metadados, metodo = _extract_text_csv(source)
 
         elif mime.startswith('audio/') or ext in ('mp3', 'wav', 'ogg', 'm4a'):
             if not OPENAI_API_KEY:
                 raise ValueError('OPENAI_API_KEY required for audio transcription')
-            texto = openai_whisper(file_bytes, nome, mime)
+            texto = openai_whisper(source, nome, mime)
             metodo = 'whisper_stt'
 
         elif mime.startswith('video/') or ext in ('mp4', 'mov', 'webm'):
             if not OPENAI_API_KEY:
                 raise ValueError('OPENAI_API_KEY required for video transcription')
             # Whisper API accepts video files directly (mp4, webm, etc)
-            texto = openai_whisper(file_bytes, nome, mime)
+            texto = openai_whisper(source, nome, mime)
             metodo = 'whisper_video'
 
         elif mime.startswith('image/') or ext in ('png', 'jpg', 'jpeg', 'webp'):
             if not GEMINI_API_KEY and not OPENAI_API_KEY:
                 raise ValueError('GEMINI_API_KEY or OPENAI_API_KEY required for image description')
-            texto, metodo = vision_describe(file_bytes, mime)
+            texto, metodo = vision_describe(_read_inline(source, file_size, 'Imagem'), mime)
 
         else:
             # Unsupported type — mark as ignored
@@ -1542,13 +2836,13 @@ def process_file_pipeline(arquivo_id):
                             {'status_processamento': 'ignorado',
                              'erro_processamento': f'Tipo não suportado: {mime}'})
             log_info('Storage', f'Skipped unsupported type: {mime}')
-            return
+            return 'ignorado'
 
         if not texto or not texto.strip():
             supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
                             {'status_processamento': 'ignorado',
                              'erro_processamento': 'Nenhum conteúdo extraído'})
-            return
+            return 'ignorado'
 
         word_count = len(texto.split())
         text_hash = _content_hash(texto)
@@ -1560,7 +2854,9 @@ def process_file_pipeline(arquivo_id):
             supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
                             {'status_processamento': 'concluido',
                              'processado_em': datetime.now(timezone.utc).isoformat()})
-            return
+            return 'concluido'
+
+        ingestion_checkpoint()
 
         # Save extracted content
         conteudo_row = supabase_request('POST', 'sp_conteudo_extraido', {
@@ -1570,7 +2866,7 @@ def process_file_pipeline(arquivo_id):
             'metadados_extracao': {
                 'word_count': word_count,
                 'method': metodo,
-                'file_size': len(file_bytes),
+                'file_size': file_size,
             },
             'metodo_extracao': metodo,
             'word_count': word_count,
@@ -1596,7 +2892,7 @@ def process_file_pipeline(arquivo_id):
                             {'status_processamento': 'concluido',
                              'content_hash': text_hash,
                              'processado_em': datetime.now(timezone.utc).isoformat()})
-            return
+            return 'concluido'
 
         # Update status
         supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
@@ -1610,6 +2906,7 @@ def process_file_pipeline(arquivo_id):
         BATCH_SIZE = 100
         all_embeddings = []
         for i in range(0, len(all_texts), BATCH_SIZE):
+            ingestion_checkpoint()
             batch = all_texts[i:i + BATCH_SIZE]
             log_info('Storage', f'Embedding batch {i//BATCH_SIZE + 1}: {len(batch)} texts via {EMBEDDING_PROVIDER}')
             embeddings = embed_texts(batch)
@@ -1621,15 +2918,17 @@ def process_file_pipeline(arquivo_id):
         mentorado_id, mentorado_nome = _resolve_mentorado_from_entity(
             arquivo['entidade_tipo'], arquivo.get('entidade_id'))
 
+        ingestion_checkpoint()
+
         # Delete old chunks if reprocessing
         supabase_request('DELETE', f'sp_chunks?arquivo_id=eq.{arquivo_id}')
 
-        # Insert chunks with embeddings
-        inserted = 0
+        # Insert chunks with embeddings (batched JSON-array POSTs)
+        chunk_rows = []
         for idx, (chunk_text, embedding, chunk_tipo) in enumerate(zip(all_texts, all_embeddings, chunk_tipos)):
             # Format embedding as pgvector string
             emb_str = '[' + ','.join(str(v) for v in embedding) + ']'
-            chunk_row = {
+            chunk_rows.append({
                 'arquivo_id': arquivo_id,
                 'conteudo_id': conteudo_id,
                 'texto': chunk_text,
@@ -1643,13 +2942,11 @@ def process_file_pipeline(arquivo_id):
                 'categoria': arquivo.get('categoria'),
                 'mentorado_id': mentorado_id,
                 'mentorado_nome': mentorado_nome,
-            }
-            result = supabase_request('POST', 'sp_chunks', chunk_row)
-            if isinstance(result, dict) and result.get('error'):
-                log_error('Storage', f'Chunk {idx} insert failed: {result["error"][:200]}')
-            else:
-                inserted += 1
-        log_info('Storage', f'Inserted {inserted}/{len(all_texts)} chunks')
+            })
+        outcome = supabase_bulk_insert('sp_chunks', chunk_rows)
+        for err in outcome['errors']:
+            log_error('Storage', f'Chunk {err["index"]} insert failed: {err["error"][:200]}')
+        log_info('Storage', f'Inserted {outcome["inserted"]}/{len(all_texts)} chunks')
 
         # Done! Save content hash
         supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
@@ -1658,12 +2955,26 @@ def process_file_pipeline(arquivo_id):
                          'processado_em': datetime.now(timezone.utc).isoformat()})
 
         log_info('Storage', f'✓ File {nome} processed: {len(standard_chunks)} standard + {len(context_chunks)} context chunks indexed')
+        return 'concluido'
 
+    except IngestionLeaseLost:
+        log_info('Storage', f'Lease lost while processing {nome} — another worker owns it now')
+        raise
+    except IngestionCancelled:
+        log_info('Storage', f'Processing cancelled for {nome}')
+        supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
+                        {'status_processamento': 'pendente',
+                         'erro_processamento': 'Cancelado'})
+        raise
     except Exception as e:
         log_error('Storage', f'Processing failed for {nome}', e)
         supabase_request('PATCH', f'sp_arquivos?id=eq.{arquivo_id}',
                         {'status_processamento': 'erro',
                          'erro_processamento': str(e)[:500]})
+        raise
+    finally:
+        if source is not None:
+            source.close()
 
 
 def search_semantic(query_text, mode='hybrid', filters=None, limit=10):
@@ -1681,7 +2992,7 @@ def search_semantic(query_text, mode='hybrid', filters=None, limit=10):
             'p_categoria': filters.get('categoria'),
             'p_mentorado_id': filters.get('mentorado_id'),
         }
-        result = supabase_request('POST', 'rpc/fn_busca_keyword', params)
+        result = pg_read('busca_keyword', params, lambda: supabase_request('POST', 'rpc/fn_busca_keyword', params))
         results = result if isinstance(result, list) else []
         return rerank_results(query_text, results, top_n=limit)
 
@@ -1702,7 +3013,7 @@ def search_semantic(query_text, mode='hybrid', filters=None, limit=10):
             'p_mentorado_id': filters.get('mentorado_id'),
             'p_threshold': filters.get('threshold', 0.3),
         }
-        result = supabase_request('POST', 'rpc/fn_busca_semantica', params)
+        result = pg_read('busca_semantica', params, lambda: supabase_request('POST', 'rpc/fn_busca_semantica', params))
         results = result if isinstance(result, list) else []
         return rerank_results(query_text, results, top_n=limit)
 
@@ -1717,7 +3028,7 @@ def search_semantic(query_text, mode='hybrid', filters=None, limit=10):
             'p_semantic_weight': filters.get('semantic_weight', 0.7),
             'p_threshold': filters.get('threshold', 0.25),
         }
-        result = supabase_request('POST', 'rpc/fn_busca_hibrida', params)
+        result = pg_read('busca_hibrida', params, lambda: supabase_request('POST', 'rpc/fn_busca_hibrida', params))
         results = result if isinstance(result, list) else []
         return rerank_results(query_text, results, top_n=limit)
 
@@ -1829,27 +3140,37 @@ def _descarrego_do_classification(descarrego_id):
     row = _descarrego_load(descarrego_id)
     text = row.get('transcricao') or row.get('conteudo_bruto') or ''
     mentorado_ctx = None
+    recent_interactions = None
+    previous_classifications = None
     if row.get('mentorado_id'):
-        try:
-            r = supabase_request(
+        r, ri, rp = gather(
+            lambda: supabase_request(
                 'GET',
                 f'mentorados?id=eq.{row["mentorado_id"]}'
                 f'&select=nome,fase_jornada,trilha&limit=1',
-            )
+            ),
+            # Enrich: últimas 5 interações do mentorado
+            lambda: supabase_request(
+                'GET',
+                f'mentorado_context?mentorado_id=eq.{row["mentorado_id"]}'
+                f'&select=tipo,titulo,conteudo&order=created_at.desc&limit=5',
+            ),
+            # Enrich: últimas 5 classificações anteriores (feedback loop)
+            lambda: supabase_request(
+                'GET',
+                f'descarregos?mentorado_id=eq.{row["mentorado_id"]}'
+                f'&classificacao_principal=not.is.null&id=neq.{descarrego_id}'
+                f'&select=classificacao_principal,classificacao_confidence,classificacao_payload'
+                f'&order=created_at.desc&limit=5',
+            ),
+        )
+        try:
             if r.status_code == 200 and r.json():
                 mentorado_ctx = r.json()[0]
         except Exception:
             pass
 
-    # Enrich: últimas 5 interações do mentorado
-    recent_interactions = None
-    if row.get('mentorado_id'):
         try:
-            ri = supabase_request(
-                'GET',
-                f'mentorado_context?mentorado_id=eq.{row["mentorado_id"]}'
-                f'&select=tipo,titulo,conteudo&order=created_at.desc&limit=5',
-            )
             if ri.status_code == 200 and ri.json():
                 recent_interactions = [
                     {'tipo': x.get('tipo', ''), 'resumo': (x.get('titulo') or x.get('conteudo', ''))[:200]}
@@ -1858,17 +3179,7 @@ def _descarrego_do_classification(descarrego_id):
         except Exception:
             pass
 
-    # Enrich: últimas 5 classificações anteriores (feedback loop)
-    previous_classifications = None
-    if row.get('mentorado_id'):
         try:
-            rp = supabase_request(
-                'GET',
-                f'descarregos?mentorado_id=eq.{row["mentorado_id"]}'
-                f'&classificacao_principal=not.is.null&id=neq.{descarrego_id}'
-                f'&select=classificacao_principal,classificacao_confidence,classificacao_payload'
-                f'&order=created_at.desc&limit=5',
-            )
             if rp.status_code == 200 and rp.json():
                 previous_classifications = [
                     {
@@ -2018,42 +3329,1618 @@ def _descarrego_execute_action(descarrego_id, mode='auto'):
             pass
 
 
+# ===== INGESTION EXECUTOR =====
+# process_file_pipeline jobs run on INGEST_WORKERS dedicated threads instead of a
+# bare thread per file. The queue is bounded (submit raises IngestionQueueFull
+# past INGEST_QUEUE_LIMIT), deduplicated per arquivo and drained round-robin by
+# group — one mentorado's bulk upload can't starve everyone else's. Queued jobs
+# are cancelled at once; running ones stop at the pipeline's next checkpoint.
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '2'))
+INGEST_QUEUE_LIMIT = int(os.environ.get('INGEST_QUEUE_LIMIT', '1000'))
+INGEST_HISTORY = 100  # finished jobs kept for /api/storage/queue
+INGEST_ENQUEUE_BATCH = 500  # files per submit_many call (one RPC/transaction on the durable stores)
+
+
+class IngestionQueueFull(RuntimeError):
+    pass
+
+
+class IngestionCancelled(Exception):
+    pass
+
+
+class IngestionLeaseLost(IngestionCancelled):
+    """The durable queue handed this job to another worker — stop without touching the row."""
+
+
+class IngestionJob:
+    __slots__ = ('arquivo_id', 'group', 'state', 'result', 'error', 'cancel_requested', 'lease_lost',
+                 'attempts', 'enqueued_at', 'started_at', 'finished_at')
+
+    def __init__(self, arquivo_id, group, attempts=0):
+        self.arquivo_id = arquivo_id
+        self.group = group
+        self.state = 'queued'  # queued → running → done | failed | cancelled (durable queue: also dead)
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.lease_lost = False
+        self.attempts = attempts
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            'arquivo_id': self.arquivo_id, 'group': self.group, 'state': self.state,
+            'result': self.result, 'error': self.error, 'cancel_requested': self.cancel_requested,
+            'attempts': self.attempts, 'enqueued_at': self.enqueued_at, 'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+_ingest_current = threading.local()  # .job = IngestionJob the worker thread is running
+
+
+def ingestion_checkpoint():
+    """Raise IngestionCancelled if the job running on this thread was cancelled (or its lease lost)."""
+    job = getattr(_ingest_current, 'job', None)
+    if job is None:
+        return
+    if job.lease_lost:
+        raise IngestionLeaseLost(f'arquivo {job.arquivo_id} lease lost')
+    if job.cancel_requested:
+        raise IngestionCancelled(f'arquivo {job.arquivo_id} cancelled')
+
+
+def _run_ingestion_job(job, run=None):
+    """Run one job on this thread. Returns (outcome, exception): done | cancelled | lease_lost | failed."""
+    _ingest_current.job = job
+    job.state = 'running'
+    job.started_at = time.time()
+    try:
+        job.result = (run or process_file_pipeline)(job.arquivo_id)
+        return 'done', None
+    except IngestionLeaseLost:
+        return 'lease_lost', None
+    except IngestionCancelled:
+        return 'cancelled', None
+    except Exception as e:
+        return 'failed', e
+    finally:
+        _ingest_current.job = None
+
+
+def ingest_group(arquivo):
+    """Fairness key for an sp_arquivos row: the entity it's attached to ('mentorado:42', 'task:…').
+
+    Files hang off mentorados directly or via tasks/dossiês; resolving the latter to
+    a mentorado costs extra lookups per file, so the owning entity stands in for it.
+    """
+    if not arquivo.get('entidade_tipo'):
+        return None
+    return f'{arquivo["entidade_tipo"]}:{arquivo.get("entidade_id") or ""}'
+
+
+class IngestionExecutor:
+    """Bounded, fair, cancellable worker pool for process_file_pipeline."""
+
+    def __init__(self, workers=INGEST_WORKERS, queue_limit=INGEST_QUEUE_LIMIT, run=None):
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.run = run  # None = process_file_pipeline, looked up per job
+        self._cond = threading.Condition()
+        self._groups = collections.OrderedDict()  # group → deque of queued jobs, in rotation order
+        self._jobs = {}  # arquivo_id → queued or running job
+        self._queued = 0
+        self._running = 0
+        self._finished = collections.deque(maxlen=INGEST_HISTORY)
+        self._threads = []
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'rejected': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, arquivo_id, group=None):
+        """Queue a file. Returns (job, created); an already queued/running file returns its job."""
+        arquivo_id = str(arquivo_id)
+        with self._cond:
+            job = self._jobs.get(arquivo_id)
+            if job is not None:
+                job.cancel_requested = False  # resubmitting a file whose cancel is pending keeps it going
+                self.stats['deduplicated'] += 1
+                return job, False
+            if self._queued >= self.queue_limit:
+                self.stats['rejected'] += 1
+                raise IngestionQueueFull(f'ingestion queue full ({self.queue_limit} jobs)')
+            job = IngestionJob(arquivo_id, group)
+            self._jobs[arquivo_id] = job
+            self._groups.setdefault(group, collections.deque()).append(job)
+            self._queued += 1
+            self.stats['submitted'] += 1
+            self.start()
+            self._cond.notify()
+        return job, True
+
+    def submit_many(self, items):
+        """Queue (arquivo_id, group) pairs in order. Returns (created, rejected): files already
+        queued/running are deduplicated, new ones that don't fit under queue_limit are rejected."""
+        created = rejected = 0
+        for arquivo_id, group in items:
+            try:
+                created += self.submit(arquivo_id, group)[1]
+            except IngestionQueueFull:
+                rejected += 1
+        return created, rejected
+
+    def start(self):
+        with self._cond:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._worker_loop, name=f'ingest-worker-{len(self._threads)}', daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def cancel(self, arquivo_id):
+        """Cancel one file's job. Returns the job (None if unknown)."""
+        with self._cond:
+            job = self._jobs.get(str(arquivo_id))
+            if job is None:
+                return None
+            if job.state == 'queued':
+                self._unqueue(job)
+                self._finish(job, 'cancelled')
+            else:
+                job.cancel_requested = True
+            return job
+
+    def cancel_all(self):
+        """Cancel every queued job and flag every running one. Returns how many were affected."""
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return sum(1 for job in jobs if self.cancel(job.arquivo_id) is not None)
+
+    def _unqueue(self, job):
+        jobs = self._groups[job.group]
+        jobs.remove(job)
+        if not jobs:
+            del self._groups[job.group]
+        self._queued -= 1
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        if self._jobs.get(job.arquivo_id) is job:
+            del self._jobs[job.arquivo_id]
+        self._finished.append(job)
+        self.stats[state] += 1
+
+    def _next_job(self):
+        """Pop the head of the next group in rotation (call with the lock held)."""
+        while not self._groups:
+            self._cond.wait()
+        group, jobs = next(iter(self._groups.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._groups.move_to_end(group)
+        else:
+            del self._groups[group]
+        self._queued -= 1
+        self._running += 1
+        job.state = 'running'
+        job.attempts += 1
+        return job
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+            outcome, error = _run_ingestion_job(job, self.run)
+            with self._cond:
+                self._running -= 1
+                self._finish(job, outcome, str(error)[:500] if error else None)
+
+    def counters(self):
+        with self._cond:
+            return {'backend': 'memory', 'workers': self.workers, 'queued': self._queued,
+                    'running': self._running, **self.stats}
+
+    def snapshot(self, limit=50):
+        with self._cond:
+            queued = [job for jobs in self._groups.values() for job in jobs]
+            running = [job for job in self._jobs.values() if job.state == 'running']
+            failed = [job for job in reversed(self._finished) if job.state == 'failed']
+            return {
+                **self.counters(),
+                'queue_limit': self.queue_limit,
+                'groups': len(self._groups),
+                'running_jobs': [job.to_dict() for job in running],
+                'queued_jobs': [job.to_dict() for job in queued[:limit]],
+                'failed_jobs': [job.to_dict() for job in failed[:limit]],
+            }
+
+
+# Durable queue (INGEST_QUEUE_BACKEND=sqlite|supabase): jobs live in a table and
+# workers lease them. A lease lasts INGEST_LEASE_SECONDS and is renewed by a
+# heartbeat while the pipeline runs; a worker that dies stops renewing, and once
+# the lease lapses (the visibility timeout) the job is claimed again. Failures are
+# retried with backoff up to INGEST_MAX_ATTEMPTS, then dead-lettered ('dead').
+# The default is the Supabase table sp_ingest_jobs (migration
+# *_sp_ingest_jobs.sql must be applied; without it the process falls back to the
+# in-memory queue): replicas share it and its claim is FOR UPDATE SKIP LOCKED —
+# one owner per job. sqlite is a single-host stand-in that is NOT shared between
+# replicas and only survives a redeploy if INGEST_QUEUE_DB is on a mounted volume
+# (a Railway container's /tmp is replaced with the container), so it has no default
+# path. Files still 'pendente' are only recovered from a durable store.
+INGEST_QUEUE_BACKEND = os.environ.get('INGEST_QUEUE_BACKEND', 'supabase')  # memory | sqlite | supabase
+INGEST_QUEUE_DB = os.environ.get('INGEST_QUEUE_DB', '')  # sqlite file on a persistent volume
+INGEST_LEASE_SECONDS = int(os.environ.get('INGEST_LEASE_SECONDS', '120'))
+INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', '3'))
+INGEST_RETRY_BASE_SECONDS = int(os.environ.get('INGEST_RETRY_BASE_SECONDS', '30'))
+INGEST_RETRY_MAX_SECONDS = 900
+INGEST_POLL_SECONDS = float(os.environ.get('INGEST_POLL_SECONDS', '5'))  # idle workers re-check the table
+INGEST_RETENTION_SECONDS = 7 * 86400  # done/cancelled rows kept this long
+
+
+class SqliteJobStore:
+    """ingest_jobs in a local sqlite file — survives restarts, shared only by processes on this host."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        arquivo_id TEXT NOT NULL,
+        grupo TEXT,
+        state TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        lease_owner TEXT,
+        lease_expires_at REAL,
+        visible_at REAL NOT NULL,
+        claimed_at REAL,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_ingest_jobs_active ON ingest_jobs (arquivo_id) WHERE state IN ('queued', 'leased');
+    CREATE INDEX IF NOT EXISTS idx_ingest_jobs_state ON ingest_jobs (state, visible_at);
+    CREATE INDEX IF NOT EXISTS idx_ingest_jobs_grupo ON ingest_jobs (grupo, claimed_at);
+    """
+
+    def __init__(self, path, max_attempts=INGEST_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(self.SCHEMA)
+
+    def _tx(self, fn):
+        """Run fn(db) inside BEGIN IMMEDIATE — serialises writers across processes."""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self._db)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def enqueue(self, arquivo_id, group, queue_limit):
+        """('queued'|'leased', created) or ('full', False)."""
+        def fn(db):
+            row = db.execute("SELECT state FROM ingest_jobs WHERE arquivo_id = ? AND state IN ('queued', 'leased')",
+                             (arquivo_id,)).fetchone()
+            if row:
+                db.execute("UPDATE ingest_jobs SET cancel_requested = 0 WHERE arquivo_id = ? AND state IN ('queued', 'leased')",
+                           (arquivo_id,))
+                return row['state'], False
+            if queue_limit and db.execute("SELECT count(*) FROM ingest_jobs WHERE state = 'queued'").fetchone()[0] >= queue_limit:
+                return 'full', False
+            now = time.time()
+            db.execute('INSERT INTO ingest_jobs (arquivo_id, grupo, max_attempts, visible_at, created_at) VALUES (?, ?, ?, ?, ?)',
+                       (arquivo_id, group, self.max_attempts, now, now))
+            return 'queued', True
+        return self._tx(fn)
+
+    def enqueue_many(self, items, queue_limit):
+        """Enqueue (arquivo_id, group) pairs in one transaction. Returns (created, rejected)."""
+        def fn(db):
+            queued = db.execute("SELECT count(*) FROM ingest_jobs WHERE state = 'queued'").fetchone()[0]
+            created = rejected = 0
+            now = time.time()
+            for arquivo_id, group in items:
+                if db.execute("UPDATE ingest_jobs SET cancel_requested = 0 WHERE arquivo_id = ? AND state IN ('queued', 'leased')",
+                              (arquivo_id,)).rowcount:
+                    continue
+                if queue_limit and queued >= queue_limit:
+                    rejected += 1
+                    continue
+                db.execute('INSERT INTO ingest_jobs (arquivo_id, grupo, max_attempts, visible_at, created_at) VALUES (?, ?, ?, ?, ?)',
+                           (arquivo_id, group, self.max_attempts, now, now))
+                queued += 1
+                created += 1
+            return created, rejected
+        return self._tx(fn)
+
+    def claim(self, owner, lease_seconds):
+        """Lease the next job (least recently served group first), or None."""
+        def fn(db):
+            now = time.time()
+            db.execute("""UPDATE ingest_jobs
+                             SET state = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                                 last_error = 'lease expired (' || coalesce(lease_owner, '?') || ')',
+                                 finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                                 lease_owner = NULL, lease_expires_at = NULL, visible_at = ?
+                           WHERE state = 'leased' AND lease_expires_at < ?""", (now, now, now))
+            db.execute("DELETE FROM ingest_jobs WHERE state IN ('done', 'cancelled', 'dead') AND finished_at < ?",
+                       (now - INGEST_RETENTION_SECONDS,))
+            # last claim per group via idx_ingest_jobs_grupo, only for the groups with visible jobs
+            row = db.execute("""SELECT q.id, (SELECT max(s.claimed_at) FROM ingest_jobs s
+                                                WHERE s.grupo = q.grupo) AS last_claimed
+                                  FROM ingest_jobs q
+                                 WHERE q.state = 'queued' AND q.visible_at <= ?
+                                 ORDER BY last_claimed IS NOT NULL, last_claimed, q.created_at, q.id
+                                 LIMIT 1""", (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("""UPDATE ingest_jobs SET state = 'leased', lease_owner = ?, lease_expires_at = ?,
+                                 attempts = attempts + 1, claimed_at = ?
+                           WHERE id = ?""", (owner, now + lease_seconds, now, row['id']))
+            return dict(db.execute('SELECT * FROM ingest_jobs WHERE id = ?', (row['id'],)).fetchone())
+        return self._tx(fn)
+
+    def heartbeat(self, job_id, owner, lease_seconds):
+        """Extend the lease. Returns cancel_requested, or None when the lease is no longer ours."""
+        def fn(db):
+            cur = db.execute("""UPDATE ingest_jobs SET lease_expires_at = ?
+                                 WHERE id = ? AND lease_owner = ? AND state = 'leased'""",
+                             (time.time() + lease_seconds, job_id, owner))
+            if not cur.rowcount:
+                return None
+            return bool(db.execute('SELECT cancel_requested FROM ingest_jobs WHERE id = ?', (job_id,)).fetchone()[0])
+        return self._tx(fn)
+
+    def finish(self, job_id, owner, state, error=None, retry_in=0):
+        """Settle a leased job as done | cancelled | dead, or back to queued after retry_in seconds."""
+        def fn(db):
+            now = time.time()
+            cur = db.execute("""UPDATE ingest_jobs
+                                   SET state = ?, last_error = coalesce(?, last_error), visible_at = ?,
+                                       finished_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                                       cancel_requested = 0
+                                 WHERE id = ? AND lease_owner = ? AND state = 'leased'""",
+                             (state, error, now + retry_in, None if state == 'queued' else now, job_id, owner))
+            return cur.rowcount > 0
+        return self._tx(fn)
+
+    def cancel(self, arquivo_id):
+        """Cancel a queued job or flag a leased one. Returns the job row, or None."""
+        def fn(db):
+            row = db.execute("SELECT * FROM ingest_jobs WHERE arquivo_id = ? AND state IN ('queued', 'leased')",
+                             (arquivo_id,)).fetchone()
+            if row is None:
+                return None
+            if row['state'] == 'queued':
+                db.execute("UPDATE ingest_jobs SET state = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), row['id']))
+            else:
+                db.execute('UPDATE ingest_jobs SET cancel_requested = 1 WHERE id = ?', (row['id'],))
+            return dict(db.execute('SELECT * FROM ingest_jobs WHERE id = ?', (row['id'],)).fetchone())
+        return self._tx(fn)
+
+    def cancel_all(self):
+        def fn(db):
+            queued = db.execute("UPDATE ingest_jobs SET state = 'cancelled', finished_at = ? WHERE state = 'queued'",
+                                (time.time(),)).rowcount
+            return queued + db.execute("UPDATE ingest_jobs SET cancel_requested = 1 WHERE state = 'leased'").rowcount
+        return self._tx(fn)
+
+    def snapshot(self, limit):
+        with self._lock:
+            counts = dict(self._db.execute('SELECT state, count(*) FROM ingest_jobs GROUP BY state').fetchall())
+            lists = {}
+            for key, where, order in (('queued', "state = 'queued'", 'visible_at, id'),
+                                      ('leased', "state = 'leased'", 'claimed_at'),
+                                      ('failed', "state = 'dead' OR (state = 'queued' AND last_error IS NOT NULL)",
+                                       'coalesce(finished_at, visible_at) DESC')):
+                lists[key] = [dict(r) for r in self._db.execute(
+                    f'SELECT * FROM ingest_jobs WHERE {where} ORDER BY {order} LIMIT ?', (limit,))]
+        return counts, lists
+
+
+class SupabaseJobStore:
+    """sp_ingest_jobs through PostgREST; enqueue/claim/heartbeat/finish are RPCs so they
+    run atomically on the database clock (see supabase/migrations/*_sp_ingest_jobs.sql)."""
+
+    def __init__(self, max_attempts=INGEST_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def _rpc(fn, params):
+        result = supabase_request('POST', f'rpc/{fn}', params)
+        if not isinstance(result, list):
+            raise SupabaseError(f'{fn} failed: {result.get("error") if hasattr(result, "get") else result}')
+        return result
+
+    def enqueue(self, arquivo_id, group, queue_limit):
+        row = self._rpc('fn_ingest_enqueue', {'p_arquivo_id': arquivo_id, 'p_grupo': group,
+                                              'p_max_attempts': self.max_attempts, 'p_queue_limit': queue_limit})[0]
+        return row['state'], row['created']
+
+    def enqueue_many(self, items, queue_limit):
+        row = self._rpc('fn_ingest_enqueue_many', {'p_arquivo_ids': [a for a, _ in items],
+                                                   'p_grupos': [g for _, g in items],
+                                                   'p_max_attempts': self.max_attempts, 'p_queue_limit': queue_limit})[0]
+        return row['created'], row['rejected']
+
+    def claim(self, owner, lease_seconds):
+        rows = self._rpc('fn_ingest_claim', {'p_worker': owner, 'p_lease_seconds': lease_seconds})
+        return rows[0] if rows else None
+
+    def heartbeat(self, job_id, owner, lease_seconds):
+        rows = self._rpc('fn_ingest_heartbeat', {'p_id': job_id, 'p_worker': owner, 'p_lease_seconds': lease_seconds})
+        return bool(rows[0]['cancel_requested']) if rows else None
+
+    def finish(self, job_id, owner, state, error=None, retry_in=0):
+        return bool(self._rpc('fn_ingest_finish', {'p_id': job_id, 'p_worker': owner, 'p_state': state,
+                                                   'p_error': error, 'p_retry_seconds': retry_in}))
+
+    def cancel(self, arquivo_id):
+        aid = urllib.parse.quote(arquivo_id)
+        now = datetime.now(timezone.utc).isoformat()
+        rows = supabase_request('PATCH', f'sp_ingest_jobs?arquivo_id=eq.{aid}&state=eq.queued',
+                                {'state': 'cancelled', 'finished_at': now})
+        if not rows:
+            rows = supabase_request('PATCH', f'sp_ingest_jobs?arquivo_id=eq.{aid}&state=eq.leased',
+                                    {'cancel_requested': True})
+        return rows[0] if isinstance(rows, list) and rows else None
+
+    def cancel_all(self):
+        now = datetime.now(timezone.utc).isoformat()
+        queued = supabase_request('PATCH', 'sp_ingest_jobs?state=eq.queued&select=id',
+                                  {'state': 'cancelled', 'finished_at': now})
+        leased = supabase_request('PATCH', 'sp_ingest_jobs?state=eq.leased&select=id', {'cancel_requested': True})
+        return sum(len(r) for r in (queued, leased) if isinstance(r, list))
+
+    def snapshot(self, limit):
+        active, queued, leased, failed = gather(
+            lambda: supabase_request('GET', 'sp_ingest_jobs?select=state&state=in.(queued,leased)'),
+            lambda: supabase_request('GET', f'sp_ingest_jobs?select=*&state=eq.queued&order=visible_at,id&limit={limit}'),
+            lambda: supabase_request('GET', f'sp_ingest_jobs?select=*&state=eq.leased&order=claimed_at&limit={limit}'),
+            lambda: supabase_request('GET', f'sp_ingest_jobs?select=*&or=(state.eq.dead,and(state.eq.queued,last_error.not.is.null))'
+                                            f'&order=finished_at.desc.nullslast,visible_at.desc&limit={limit}'),
+        )
+        counts = collections.Counter(r['state'] for r in active) if isinstance(active, list) else {}
+        lists = {k: v if isinstance(v, list) else [] for k, v in (('queued', queued), ('leased', leased), ('failed', failed))}
+        return dict(counts), lists
+
+
+class DurableIngestionExecutor:
+    """IngestionExecutor's interface over a SqliteJobStore/SupabaseJobStore: jobs are
+    leased from the table, heartbeated while they run and retried or dead-lettered."""
+
+    def __init__(self, store, workers=INGEST_WORKERS, queue_limit=INGEST_QUEUE_LIMIT, run=None,
+                 lease_seconds=INGEST_LEASE_SECONDS, poll_seconds=INGEST_POLL_SECONDS):
+        self.store = store
+        self.backend = 'sqlite' if isinstance(store, SqliteJobStore) else 'supabase'
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.run = run
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._cond = threading.Condition()
+        self._running = {}  # job row id → (IngestionJob, lease owner)
+        self._threads = []
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'rejected': 0, 'done': 0, 'retried': 0,
+                      'dead': 0, 'cancelled': 0, 'lease_lost': 0}
+
+    @staticmethod
+    def _job(row):
+        job = IngestionJob(row['arquivo_id'], row.get('grupo'), row.get('attempts') or 0)
+        job.state = {'leased': 'running'}.get(row['state'], row['state'])
+        job.error = row.get('last_error')
+        job.cancel_requested = bool(row.get('cancel_requested'))
+        return job
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, args=(f'{self.worker_id}:{i}',),
+                                     name=f'ingest-worker-{i}', daemon=True)
+                self._threads.append(t)
+                t.start()
+            t = threading.Thread(target=self._heartbeat_loop, name='ingest-heartbeat', daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, arquivo_id, group=None):
+        arquivo_id = str(arquivo_id)
+        state, created = self.store.enqueue(arquivo_id, group, self.queue_limit)
+        with self._cond:
+            if state == 'full':
+                self.stats['rejected'] += 1
+                raise IngestionQueueFull(f'ingestion queue full ({self.queue_limit} jobs)')
+            self.stats['submitted' if created else 'deduplicated'] += 1
+            for job, _ in self._running.values():
+                if job.arquivo_id == arquivo_id:
+                    job.cancel_requested = False
+            self._cond.notify()
+        self.start()
+        job = IngestionJob(arquivo_id, group)
+        job.state = 'running' if state == 'leased' else 'queued'
+        return job, created
+
+    def submit_many(self, items):
+        """Batch submit: one store call for all (arquivo_id, group) pairs. Returns (created, rejected)."""
+        items = [(str(arquivo_id), group) for arquivo_id, group in items]
+        created, rejected = self.store.enqueue_many(items, self.queue_limit)
+        ids = {arquivo_id for arquivo_id, _ in items}
+        with self._cond:
+            self.stats['submitted'] += created
+            self.stats['rejected'] += rejected
+            self.stats['deduplicated'] += len(items) - created - rejected
+            for job, _ in self._running.values():
+                if job.arquivo_id in ids:
+                    job.cancel_requested = False
+            self._cond.notify_all()
+        self.start()
+        return created, rejected
+
+    def cancel(self, arquivo_id):
+        row = self.store.cancel(str(arquivo_id))
+        if row is None:
+            return None
+        with self._cond:
+            for job, _ in self._running.values():
+                if job.arquivo_id == str(arquivo_id):
+                    job.cancel_requested = True
+        return self._job(row)
+
+    def cancel_all(self):
+        count = self.store.cancel_all()
+        with self._cond:
+            for job, _ in self._running.values():
+                job.cancel_requested = True
+        return count
+
+    def _worker_loop(self, owner):
+        while True:
+            try:
+                row = self.store.claim(owner, self.lease_seconds)
+            except Exception as e:
+                log_error('Ingest', f'claim failed ({self.backend})', e)
+                row = None
+            if row is None:
+                with self._cond:
+                    self._cond.wait(self.poll_seconds)
+                continue
+            job = self._job(row)
+            with self._cond:
+                self._running[row['id']] = (job, owner)
+            outcome, error = _run_ingestion_job(job, self.run)
+            with self._cond:
+                del self._running[row['id']]
+            self._settle(row, owner, outcome, error)
+
+    def _settle(self, row, owner, outcome, error):
+        """Record the outcome in the store: done | cancelled, retry later, or dead-letter."""
+        retry_in = 0
+        if outcome == 'lease_lost':
+            state = None
+        elif outcome != 'failed':
+            state = outcome
+        elif row['attempts'] < row['max_attempts'] and not isinstance(error, (LookupError, StorageObjectTooLarge)):
+            state = 'queued'
+            retry_in = min(INGEST_RETRY_MAX_SECONDS, INGEST_RETRY_BASE_SECONDS * 2 ** (row['attempts'] - 1))
+        else:
+            state = 'dead'  # out of attempts, or the file itself is gone / over the size cap
+        if state is not None:
+            try:
+                if not self.store.finish(row['id'], owner, state, str(error)[:500] if error else None, retry_in):
+                    state = None  # the lease lapsed mid-run; whoever holds it now settles the job
+            except Exception as e:
+                log_error('Ingest', f'finish failed for {row["arquivo_id"]}', e)
+        with self._cond:
+            self.stats['lease_lost' if state is None else {'queued': 'retried'}.get(state, state)] += 1
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(max(1, self.lease_seconds / 3))
+            with self._cond:
+                running = list(self._running.items())
+            for job_id, (job, owner) in running:
+                try:
+                    cancel = self.store.heartbeat(job_id, owner, self.lease_seconds)
+                except Exception as e:
+                    log_error('Ingest', f'heartbeat failed for {job.arquivo_id}', e)
+                    continue  # lease still has ~2/3 left; next beat retries
+                if cancel is None:
+                    job.lease_lost = True
+                elif cancel:
+                    job.cancel_requested = True
+
+    def counters(self):
+        with self._cond:
+            return {'backend': self.backend, 'workers': self.workers, 'worker_id': self.worker_id,
+                    'running': len(self._running), **self.stats}
+
+    def snapshot(self, limit=50):
+        counts, lists = self.store.snapshot(limit)
+        with self._cond:
+            running_here = {job.arquivo_id: job for job, _ in self._running.values()}
+        return {
+            **self.counters(),
+            'queue_limit': self.queue_limit,
+            'queued': counts.get('queued', 0),
+            'running': counts.get('leased', 0),
+            'running_here': len(running_here),
+            'by_state': counts,
+            'running_jobs': [dict(self._job(r).to_dict(), lease_owner=r.get('lease_owner')) for r in lists['leased']],
+            'queued_jobs': [self._job(r).to_dict() for r in lists['queued']],
+            'failed_jobs': [self._job(r).to_dict() for r in lists['failed']],
+        }
+
+
+def make_ingest_executor(backend=INGEST_QUEUE_BACKEND):
+    """Executor for INGEST_QUEUE_BACKEND; falls back to the in-memory queue when the
+    durable store is missing (table not migrated, no INGEST_QUEUE_DB, sqlite won't open)."""
+    if backend == 'supabase':
+        probe = supabase_request('GET', 'sp_ingest_jobs?select=id&limit=1')
+        if isinstance(probe, list) or probe.status_code != 404:  # transient errors: keep the table
+            return DurableIngestionExecutor(SupabaseJobStore())
+        log_error('Ingest', 'sp_ingest_jobs not found (migration not applied?) — using in-memory queue')
+    elif backend == 'sqlite':
+        if not INGEST_QUEUE_DB:
+            log_error('Ingest', 'INGEST_QUEUE_BACKEND=sqlite needs INGEST_QUEUE_DB on a persistent volume '
+                                '— using in-memory queue')
+        else:
+            try:
+                return DurableIngestionExecutor(SqliteJobStore(INGEST_QUEUE_DB))
+            except sqlite3.Error as e:
+                log_error('Ingest', f'sqlite queue at {INGEST_QUEUE_DB} unavailable — using in-memory queue', e)
+    return IngestionExecutor()
+
+
+_ingest_executor = None
+_ingest_executor_lock = threading.Lock()
+
+
+def get_ingest_executor():
+    """The process-wide executor, created on first use (not at import, so importing
+    the module — e.g. from a bench script — opens no queue)."""
+    global _ingest_executor
+    with _ingest_executor_lock:
+        if _ingest_executor is None:
+            _ingest_executor = make_ingest_executor()
+        return _ingest_executor
+
+
+def resume_stuck_ingestion():
+    """Boot: re-queue files a previous process left mid-pipeline (extraindo/chunking/embedding).
+
+    Jobs already queued or leased in the durable table are deduplicated, so a file
+    another replica is processing right now is left alone.
+    """
+    query = ('sp_arquivos?select=id,entidade_tipo,entidade_id&deleted_at=is.null'
+             '&status_processamento=in.(extraindo,chunking,embedding)&order=created_at,id')
+    executor = get_ingest_executor()
+    resumed = rejected = 0
+    batch = []
+    try:
+        for row in supabase_iter(query):
+            batch.append((row['id'], ingest_group(row)))
+            if len(batch) == INGEST_ENQUEUE_BATCH:
+                created, full = executor.submit_many(batch)
+                resumed, rejected, batch = resumed + created, rejected + full, []
+        if batch:
+            created, full = executor.submit_many(batch)
+            resumed, rejected = resumed + created, rejected + full
+    except (SupabaseError, sqlite3.Error) as e:
+        log_error('Ingest', 'resume of stuck files stopped early', e)
+    if rejected:
+        log_error('Ingest', f'{rejected} stuck files not re-queued: ingestion queue full')
+    if resumed:
+        log_info('Ingest', f'Re-queued {resumed} files left mid-pipeline by a previous run')
+    return resumed
+
+
 # ===== CUSTOM HTTP SERVER (fix SO_REUSEADDR) =====
 class ReuseAddrHTTPServer(http.server.HTTPServer):
     allow_reuse_address = True
 
 
+# ===== WORKER POOL SERVER =====
+# 'pool' = bounded worker pool (default), 'single' = legacy one-request-at-a-time,
+# 'asyncio' = event-loop engine with legacy adapter (see ASYNCIO ENGINE below)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'pool')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '16'))
+SERVER_QUEUE_DEPTH = int(os.environ.get('SERVER_QUEUE_DEPTH', '64'))
+
+# HTTP/1.1 keep-alive: idle sockets are closed after KEEPALIVE_IDLE_TIMEOUT and at
+# most KEEPALIVE_MAX_CONNECTIONS are held open (each one pins a pool worker).
+KEEPALIVE_IDLE_TIMEOUT = int(os.environ.get('KEEPALIVE_IDLE_TIMEOUT', '15'))
+KEEPALIVE_MAX_CONNECTIONS = int(os.environ.get('KEEPALIVE_MAX_CONNECTIONS', str(max(1, SERVER_WORKERS // 2))))
+
+# Per-route concurrency caps (path prefix → max in-flight). Slow AI/media calls
+# stay below SERVER_WORKERS so fast reads always have free workers.
+# Override with ROUTE_CONCURRENCY_CAPS="/api/fabric/run=2,/api/youtube/upload=1"
+ROUTE_CONCURRENCY_CAPS = {
+    '/api/fabric/run': 2,
+    '/api/dossie/evaluate': 1,
+    '/api/tasks/from-audio': 2,
+    '/api/context/transcribe': 2,
+    '/api/youtube/upload': 1,
+    '/api/mentee/weekly-summary': 2,
+    '/api/copilot': 3,
+    '/api/media/stream': 4,
+    '/api/storage/reprocess': 1,
+}
+_raw_caps = os.environ.get('ROUTE_CONCURRENCY_CAPS', '')
+if _raw_caps:
+    for entry in _raw_caps.split(','):
+        if '=' in entry:
+            _prefix, _limit = entry.split('=', 1)
+            ROUTE_CONCURRENCY_CAPS[_prefix.strip()] = int(_limit.strip())
+
+
+class RouteConcurrencyCaps:
+    """Path-prefix semaphores; longest prefix wins."""
+
+    def __init__(self, caps):
+        self._caps = sorted(
+            ((prefix, threading.BoundedSemaphore(limit)) for prefix, limit in caps.items()),
+            key=lambda item: len(item[0]), reverse=True,
+        )
+        self.rejected = 0
+
+    def acquire(self, path):
+        """Non-blocking acquire. Returns the semaphore, None if uncapped, False if the route is full."""
+        for prefix, sem in self._caps:
+            if path.startswith(prefix):
+                if sem.acquire(blocking=False):
+                    return sem
+                self.rejected += 1
+                return False
+        return None
+
+
+class PoolHTTPServer(ReuseAddrHTTPServer):
+    """HTTPServer with a fixed worker pool, bounded accept queue and per-route caps.
+
+    The accept loop only enqueues sockets; workers run the handler. When the
+    queue is full the connection gets an immediate 503 instead of waiting.
+    """
+
+    request_queue_size = 128  # listen() backlog; stdlib default of 5 drops SYNs under bursts
+
+    _OVERLOAD_RESPONSE = (
+        b'HTTP/1.0 503 Service Unavailable\r\n'
+        b'Content-Type: application/json\r\n'
+        b'Retry-After: 1\r\n'
+        b'Connection: close\r\n'
+        b'Content-Length: 35\r\n\r\n'
+        b'{"error": "Server busy, try again"}'
+    )
+
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS,
+                 queue_depth=SERVER_QUEUE_DEPTH, route_caps=None):
+        super().__init__(server_address, handler_class)
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self.route_caps = RouteConcurrencyCaps(route_caps or ROUTE_CONCURRENCY_CAPS)
+        self.stats = {'accepted': 0, 'rejected_queue': 0}
+        self._stats_lock = threading.Lock()
+        self._keepalive_open = 0
+        self._workers = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker_loop, name=f'http-worker-{i}', daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def process_request(self, request, client_address):
+        try:
+            self._queue.put_nowait((request, client_address))
+            self._count('accepted')
+        except queue.Full:
+            self._count('rejected_queue')
+            try:
+                request.sendall(self._OVERLOAD_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _worker_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def acquire_route_slot(self, path):
+        return self.route_caps.acquire(path)
+
+    def acquire_keepalive(self, held):
+        """May this connection stay open? Refused while sockets wait for a worker or the cap is hit."""
+        if self._queue.qsize():
+            return False
+        if held:
+            return True
+        with self._stats_lock:
+            if self._keepalive_open >= KEEPALIVE_MAX_CONNECTIONS:
+                return False
+            self._keepalive_open += 1
+            return True
+
+    def release_keepalive(self):
+        with self._stats_lock:
+            self._keepalive_open -= 1
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+
+def make_http_server(server_address, handler_class):
+    """Build the HTTP server for SERVER_MODE ('pool', 'single' or 'asyncio')."""
+    if SERVER_MODE == 'single':
+        return ReuseAddrHTTPServer(server_address, handler_class)
+    if SERVER_MODE == 'asyncio':
+        return AsyncHTTPEngine(server_address, handler_class)
+    return PoolHTTPServer(server_address, handler_class)
+
+
+# ===== RESPONSE COMPRESSION =====
+# JSON bodies above COMPRESS_MIN_BYTES are compressed per Accept-Encoding
+# (br when the optional brotli package is installed, else gzip). Identical
+# payloads — the same list polled by several consultants — hit a small LRU of
+# already-compressed bytes instead of being recompressed.
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', '6'))        # gzip 1-9
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))        # brotli 0-11
+COMPRESS_CACHE_ENTRIES = int(os.environ.get('COMPRESS_CACHE_ENTRIES', '64'))
+COMPRESS_CACHE_MAX_BYTES = int(os.environ.get('COMPRESS_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+_compress_cache = collections.OrderedDict()  # (encoding, digest) -> compressed bytes
+_compress_cache_bytes = 0
+_compress_lock = threading.Lock()
+compress_stats = {'compressed': 0, 'cache_hits': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header: the accepted coding
+    with the highest q (q=0 means refused); br wins a tie."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        name, *params = part.split(';')
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get('*', 0.0)
+    candidates = [('br', accepted.get('br', wildcard))] if brotli is not None else []
+    candidates.append(('gzip', accepted.get('gzip', wildcard)))
+    encoding, q = max(candidates, key=lambda c: c[1])  # first maximum: br on a tie
+    return encoding if q > 0 else None
+
+
+def compress_body(body, accept_encoding):
+    """Return (body, content_encoding). Bodies under COMPRESS_MIN_BYTES are sent as-is."""
+    global _compress_cache_bytes
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+    with _compress_lock:
+        cached = _compress_cache.get(key)
+        if cached is not None:
+            _compress_cache.move_to_end(key)
+            compress_stats['cache_hits'] += 1
+            return cached, encoding
+    if encoding == 'br':
+        out = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        out = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+    if len(out) >= len(body):
+        return body, None
+    with _compress_lock:
+        compress_stats['compressed'] += 1
+        compress_stats['bytes_in'] += len(body)
+        compress_stats['bytes_out'] += len(out)
+        if COMPRESS_CACHE_ENTRIES and len(out) <= COMPRESS_CACHE_MAX_BYTES and key not in _compress_cache:
+            _compress_cache[key] = out
+            _compress_cache_bytes += len(out)
+            while len(_compress_cache) > COMPRESS_CACHE_ENTRIES or _compress_cache_bytes > COMPRESS_CACHE_MAX_BYTES:
+                _, evicted = _compress_cache.popitem(last=False)
+                _compress_cache_bytes -= len(evicted)
+    return out, encoding
+
+
+JSON_STREAM_FLUSH_BYTES = int(os.environ.get('JSON_STREAM_FLUSH_BYTES', str(16 * 1024)))
+
+
+def stream_compressor(encoding):
+    """(compress, finish) callables for incremental gzip/br, or None for identity."""
+    if encoding == 'gzip':
+        z = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        return z.compress, z.flush
+    if encoding == 'br' and brotli is not None:
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return c.process, c.finish
+    return None
+
+
+# ===== CONDITIONAL GET (ETag) =====
+def make_etag(data):
+    """Strong validator for a body (or version marker) — 128-bit blake2b hex."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def format_etag(tag, encoding=None):
+    # Each content-coding is its own representation, so it gets its own tag
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def etag_matches(if_none_match, tag):
+    """If-None-Match uses weak comparison: ignore W/ and our -gzip/-br suffix.
+    Returns the matching validator to echo on the 304, or None."""
+    if not if_none_match:
+        return None
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return format_etag(tag)
+        opaque = candidate[2:] if candidate.startswith('W/') else candidate
+        if opaque.strip('"').split('-', 1)[0] == tag:
+            return opaque
+    return None
+
+
+# ===== MULTIPART UPLOADS =====
+# Replaces cgi.FieldStorage (deprecated, removed in 3.13). The body is read in
+# MULTIPART_CHUNK_BYTES slices straight from the socket; each part goes into a
+# SpooledTemporaryFile that rolls over to disk past MULTIPART_SPOOL_BYTES, so a
+# 40 MB recording costs one chunk of RAM, not 40 MB (twice). The total size is
+# already capped by Route.body_limit before a byte is read.
+MULTIPART_SPOOL_BYTES = int(os.environ.get('MULTIPART_SPOOL_BYTES', str(1024 * 1024)))
+MULTIPART_CHUNK_BYTES = 64 * 1024
+MULTIPART_MAX_HEADER_BYTES = 16 * 1024
+_MULTIPART_BOUNDARY_RE = re.compile(r'boundary=(?:"([^"]+)"|([^;\s]+))', re.IGNORECASE)
+
+
+class MultipartError(ValueError):
+    pass
+
+
+class UploadPart:
+    __slots__ = ('name', 'filename', 'content_type', 'file', 'size')
+
+    def __init__(self, name, filename, content_type):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = tempfile.SpooledTemporaryFile(max_size=MULTIPART_SPOOL_BYTES)
+        self.size = 0
+
+    @property
+    def value(self):
+        """Plain form fields as text."""
+        self.file.seek(0)
+        return self.file.read().decode('utf-8', errors='replace')
+
+
+class MultipartForm(dict):
+    """name → UploadPart (first part wins on duplicate names). Close to drop spooled files."""
+
+    def close(self):
+        for part in self.values():
+            part.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def parse_multipart(rfile, content_type, content_length):
+    """Stream a multipart/form-data body of content_length bytes into a MultipartForm."""
+    m = _MULTIPART_BOUNDARY_RE.search(content_type or '')
+    if not m:
+        raise MultipartError('multipart boundary missing')
+    delim = b'\r\n--' + (m.group(1) or m.group(2)).encode('latin-1')
+    remaining = content_length
+    buf = bytearray(b'\r\n')  # lets the first delimiter match without a special case
+    form = MultipartForm()
+
+    def fill():
+        nonlocal remaining
+        if remaining <= 0:
+            return False
+        data = rfile.read(min(MULTIPART_CHUNK_BYTES, remaining))
+        if not data:
+            raise MultipartError('request body truncated')
+        remaining -= len(data)
+        buf.extend(data)
+        return True
+
+    try:
+        while True:  # preamble
+            idx = buf.find(delim)
+            if idx >= 0:
+                del buf[:idx + len(delim)]
+                break
+            del buf[:max(0, len(buf) - len(delim))]
+            if not fill():
+                raise MultipartError('multipart boundary not found in body')
+        while True:
+            while len(buf) < 2:
+                if not fill():
+                    raise MultipartError('request body truncated')
+            if buf[:2] == b'--':  # close delimiter
+                break
+            while True:
+                end = buf.find(b'\r\n\r\n')
+                if end >= 0:
+                    break
+                if len(buf) > MULTIPART_MAX_HEADER_BYTES:
+                    raise MultipartError('multipart part headers too large')
+                if not fill():
+                    raise MultipartError('request body truncated')
+            headers = HeaderParser().parsestr(bytes(buf[:end]).decode('utf-8', errors='replace').lstrip('\r\n'))
+            del buf[:end + 4]
+            part = UploadPart(headers.get_param('name', header='content-disposition'),
+                              headers.get_filename(), headers.get('Content-Type'))
+            if part.name is not None and part.name not in form:
+                form[part.name] = part
+            while True:
+                idx = buf.find(delim)
+                if idx >= 0:
+                    part.file.write(buf[:idx])
+                    part.size += idx
+                    del buf[:idx + len(delim)]
+                    break
+                safe = len(buf) - (len(delim) - 1)  # the tail may hold a split delimiter
+                if safe > 0:
+                    part.file.write(buf[:safe])
+                    part.size += safe
+                    del buf[:safe]
+                if not fill():
+                    raise MultipartError('request body truncated')
+            part.file.seek(0)
+            if part.name is None or form.get(part.name) is not part:
+                part.file.close()
+        while fill():  # epilogue: drain so the connection can be reused
+            buf.clear()
+    except Exception:
+        form.close()
+        raise
+    return form
+
+
+# ===== STATIC ASSETS =====
+# The frontend bundle is read once at startup and served from memory with
+# gzip/br variants precomputed at max level. Local <script>/<link> references
+# in HTML entry points are rewritten to 'name?v=<content hash>'; a request
+# carrying the current hash is immutable, anything else revalidates via ETag.
+# Large already-compressed files (photos, fonts) stay on disk and go out via
+# sendfile. STATIC_MODE=disk keeps the old per-request disk reads (edit-reload dev).
+STATIC_ROOT = os.environ.get('STATIC_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend'))
+STATIC_MODE = os.environ.get('STATIC_MODE', 'memory')  # memory | disk
+STATIC_SENDFILE_MIN_BYTES = int(os.environ.get('STATIC_SENDFILE_MIN_BYTES', str(256 * 1024)))
+STATIC_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+STATIC_REVALIDATE_CACHE = 'public, no-cache'
+STATIC_COMPRESSIBLE = ('.html', '.js', '.css', '.json', '.svg', '.yaml', '.yml', '.txt', '.map', '.ttf', '.otf')
+_STATIC_REF_RE = re.compile(r'''((?:src|href)=["'])([^"'?#:]+\.(?:js|css))(?:\?[^"'#]*)?(["'])''')
+
+
+class StaticAsset:
+    __slots__ = ('path', 'content_type', 'hash', 'size', 'body', 'variants', 'disk_path')
+
+    def __init__(self, path, content_type, body, disk_path=None, size=None):
+        self.path = path
+        self.content_type = content_type
+        self.body = body  # None → served from disk_path via sendfile
+        self.disk_path = disk_path
+        self.size = len(body) if body is not None else size
+        self.hash = make_etag(body)[:16] if body is not None else None
+        self.variants = {}  # encoding → compressed bytes (only kept when smaller)
+
+
+class StaticAssetStore:
+    """Read-only snapshot of STATIC_ROOT, keyed by URL path ('/11-APP-app.js')."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}
+        self.stats = {'hits': 0, 'not_modified': 0, 'sendfile': 0}
+
+    def load(self):
+        t0 = time.time()
+        assets = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                disk_path = os.path.join(dirpath, name)
+                url = '/' + os.path.relpath(disk_path, self.root).replace(os.sep, '/')
+                assets[url] = self._load_file(url, disk_path)
+        # Entry points are rewritten after every other hash is known
+        for url, asset in assets.items():
+            if url.endswith('.html') and asset.body is not None:
+                body = self._fingerprint_refs(url, asset.body, assets)
+                if body is not asset.body:
+                    assets[url] = self._build(url, asset.content_type, body)
+        self.assets = assets
+        raw = sum(a.size for a in assets.values())
+        mem = sum(len(a.body) + sum(map(len, a.variants.values())) for a in assets.values() if a.body is not None)
+        print(f'[Static] {len(assets)} files from {self.root} ({raw / 1e6:.1f} MB on disk, '
+              f'{mem / 1e6:.1f} MB in memory incl. variants) in {time.time() - t0:.1f}s')
+        return self
+
+    def _load_file(self, url, disk_path):
+        content_type = mimetypes.guess_type(url)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        size = os.path.getsize(disk_path)
+        if size >= STATIC_SENDFILE_MIN_BYTES and not url.endswith(STATIC_COMPRESSIBLE):
+            asset = StaticAsset(url, content_type, None, disk_path=disk_path, size=size)
+            with open(disk_path, 'rb') as f:
+                asset.hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()[:16]
+            return asset
+        with open(disk_path, 'rb') as f:
+            return self._build(url, content_type, f.read())
+
+    @staticmethod
+    def _build(url, content_type, body):
+        asset = StaticAsset(url, content_type, body)
+        if url.endswith(STATIC_COMPRESSIBLE) and len(body) >= COMPRESS_MIN_BYTES:
+            candidates = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates['br'] = brotli.compress(body, quality=11)
+            asset.variants = {enc: data for enc, data in candidates.items() if len(data) < len(body) * 0.9}
+        return asset
+
+    @staticmethod
+    def _fingerprint_refs(url, body, assets):
+        base = url.rsplit('/', 1)[0]
+
+        def repl(m):
+            ref = m.group(2)
+            target = assets.get(ref if ref.startswith('/') else f'{base}/{ref.lstrip("./")}')
+            if target is None or target.hash is None:
+                return m.group(0)
+            return f'{m.group(1)}{ref}?v={target.hash}{m.group(3)}'
+
+        text = body.decode('utf-8', errors='surrogateescape')
+        rewritten = _STATIC_REF_RE.sub(repl, text)
+        return body if rewritten == text else rewritten.encode('utf-8', errors='surrogateescape')
+
+    def lookup(self, raw_path):
+        """(asset, immutable) for a request path, or (None, False)."""
+        path, _, query = raw_path.partition('?')
+        asset = self.assets.get(urllib.parse.unquote(path))
+        if asset is None:
+            return None, False
+        version = urllib.parse.parse_qs(query).get('v', [''])[0] if query else ''
+        return asset, version == asset.hash
+
+
+STATIC_ASSETS = None  # StaticAssetStore, loaded in __main__ when STATIC_MODE=memory
+
+
+# ===== ROUTER =====
+# Built once at import: exact paths are a dict lookup, prefix routes (pattern
+# ending in '*') live in a character trie (longest prefix wins), and all
+# parameterised routes (pattern starting with '^') are folded into one
+# precompiled alternation per method — first declared wins, like the old elif
+# chains. Lookup order is exact → regex → prefix. Patterns match the raw
+# request path (query string included), exactly as the old chains did.
+ROUTE_DEFAULT_BODY_LIMIT = int(os.environ.get('ROUTE_DEFAULT_BODY_LIMIT', str(25 * 1024 * 1024)))
+ROUTE_MEDIA_BODY_LIMIT = int(os.environ.get('ROUTE_MEDIA_BODY_LIMIT', str(100 * 1024 * 1024)))
+ROUTE_AUDIO_BODY_LIMIT = int(os.environ.get('ROUTE_AUDIO_BODY_LIMIT', str(50 * 1024 * 1024)))  # same cap as URL downloads
+ROUTE_DEFAULT_TIMEOUT = int(os.environ.get('ROUTE_DEFAULT_TIMEOUT', '60'))  # client socket inactivity, seconds
+
+
+class Route:
+    """One endpoint + metadata.
+
+    auth: 'handler' (handler authenticates itself), 'public', 'any' (check_auth_any
+    enforced by the router) or 'jwt' (Bearer JWT enforced by the router).
+    """
+    __slots__ = ('method', 'pattern', 'handler', 'args', 'auth', 'body_limit', 'timeout', 'kind', 'regex')
+
+    def __init__(self, method, pattern, handler, args=(), auth='handler',
+                 body_limit=None, timeout=None):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.args = tuple(args)
+        self.auth = auth
+        self.body_limit = ROUTE_DEFAULT_BODY_LIMIT if body_limit is None else body_limit
+        self.timeout = ROUTE_DEFAULT_TIMEOUT if timeout is None else timeout
+        if pattern.startswith('^'):
+            self.kind = 'regex'
+            self.regex = re.compile(pattern)
+        elif pattern.endswith('*'):
+            self.kind = 'prefix'
+            self.regex = None
+        else:
+            self.kind = 'exact'
+            self.regex = None
+
+    def __repr__(self):
+        return f'Route({self.method} {self.pattern} -> {self.handler})'
+
+
+class Router:
+    """Precompiled method → (exact dict, prefix trie, combined regex) lookup."""
+
+    def __init__(self, routes):
+        self.routes = list(routes)
+        self._exact = {}
+        self._tries = {}
+        self._regex = {}
+        regex_routes = {}
+        for route in self.routes:
+            if route.kind == 'exact':
+                self._exact.setdefault(route.method, {}).setdefault(route.pattern, route)
+            elif route.kind == 'prefix':
+                node = self._tries.setdefault(route.method, {})
+                for ch in route.pattern[:-1]:
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, route)
+            else:
+                regex_routes.setdefault(route.method, []).append(route)
+        for method, rlist in regex_routes.items():
+            parts, index = [], []
+            group = 1
+            for route in rlist:
+                parts.append(f'({route.pattern[1:].rstrip("$")})')
+                index.append((group, route, route.regex.groups))
+                group += 1 + route.regex.groups
+            combined = re.compile('^(?:' + '|'.join(parts) + ')$')
+            self._regex[method] = (combined, {g: (r, n) for g, r, n in index})
+
+    def match(self, method, path):
+        """Return (route, params) or None."""
+        route = self._exact.get(method, {}).get(path)
+        if route is not None:
+            return route, ()
+        compiled = self._regex.get(method)
+        if compiled is not None:
+            m = compiled[0].match(path)
+            if m is not None:
+                # lastindex is the wrapper group (it closes after its inner groups)
+                route, ngroups = compiled[1][m.lastindex]
+                return route, m.groups()[m.lastindex:m.lastindex + ngroups]
+        node = self._tries.get(method)
+        best = None
+        if node is not None:
+            for ch in path:
+                node = node.get(ch)
+                if node is None:
+                    break
+                if None in node:
+                    best = node[None]
+        return (best, ()) if best is not None else None
+
+
+_MEDIA = ROUTE_MEDIA_BODY_LIMIT
+_AUDIO = ROUTE_AUDIO_BODY_LIMIT
+
+ROUTES = [
+    # ----- GET -----
+    Route('GET', '/', '_handle_root', auth='public'),
+    Route('GET', '', '_handle_root', auth='public'),
+    Route('GET', '/api/health', '_handle_health', auth='public'),
+    Route('GET', '/api/auth/me', '_handle_auth_me'),
+    Route('GET', '/api/evolution/*', '_proxy_evolution', args=('GET',)),
+    Route('GET', '/api/evolution/instance-uuid', '_handle_instance_uuid'),
+    Route('GET', '/api/mentees/portfolio', '_handle_get_portfolio'),
+    Route('GET', '/api/mentees', '_handle_get_mentees'),
+    Route('GET', r'^/api/mentees/(\d+)/notes$', '_handle_get_notes'),
+    Route('GET', '/api/calendar/events*', '_handle_list_events'),
+    Route('GET', '/api/calls/upcoming', '_handle_upcoming_calls'),
+    Route('GET', '/api/media/presign*', '_handle_media_presign'),
+    Route('GET', '/api/media/stream*', '_handle_media_stream', timeout=300),
+    Route('GET', '/api/sheets/status', '_handle_sheets_status'),
+    Route('GET', '/api/wa/groups', '_handle_wa_groups_list'),
+    Route('GET', '/api/storage/files*', '_handle_storage_list_files'),
+    Route('GET', '/api/storage/status*', '_handle_storage_status'),
+    Route('GET', '/api/storage/queue', '_handle_storage_queue'),
+    # ORCH-07: Agent Metrics
+    Route('GET', '/api/agent-metrics', '_handle_agent_metrics'),
+    # WA DM v2 (S9-A)
+    Route('GET', '/api/mentees/triage', '_handle_mentees_triage'),
+    Route('GET', '/api/wa/media*', '_handle_wa_media'),
+    Route('GET', '/api/wa/labels/summary*', '_handle_wa_labels_summary'),
+    Route('GET', '/api/wa/inbox*', '_handle_wa_inbox'),
+    Route('GET', r'^/api/wa/presence/(\d+)$', '_handle_wa_presence_get'),
+    # Mentee Groups
+    Route('GET', '/api/mentee-groups', '_handle_get_groups'),
+    Route('GET', r'^/api/mentee-groups/(\d+)/members$', '_handle_get_group_members'),
+    Route('GET', r'^/api/mentees/(\d+)/descarregos$', '_handle_descarregos_list'),
+    Route('GET', '/api/clickup/command-center', '_handle_clickup_command_center'),
+    Route('GET', '/api/biblioteca*', '_handle_biblioteca_get'),
+    Route('GET', '/api/keys', '_handle_list_api_keys'),
+    Route('GET', r'^/api/mentees/(\d+)/messages$', '_handle_get_chatwoot_messages'),
+    Route('GET', '/api/crons/status', '_handle_cron_status'),
+    Route('GET', r'^/api/mentees/(\d+)/qa-scores$', '_handle_get_qa_scores'),
+
+    # ----- POST -----
+    Route('POST', r'^/api/mentees/(\d+)/notes$', '_handle_post_note'),
+    Route('POST', r'^/api/mentees/(\d+)/offboard$', '_handle_offboard_mentee'),
+    Route('POST', '/api/auth/register', '_handle_auth_register', auth='public'),
+    Route('POST', '/api/auth/login', '_handle_auth_login', auth='public', body_limit=16 * 1024),
+    Route('POST', '/api/auth/refresh', '_handle_auth_refresh', auth='public', body_limit=16 * 1024),
+    Route('POST', '/api/auth/reset-password', '_handle_auth_reset_password'),
+    Route('POST', '/api/evolution/*', '_proxy_evolution', args=('POST',), body_limit=_MEDIA),
+    Route('POST', '/api/schedule-call', '_handle_schedule_call'),
+    Route('POST', '/api/zoom/create-meeting', '_handle_create_zoom_meeting'),
+    Route('POST', '/api/calendar/create-event', '_handle_create_calendar_event'),
+    Route('POST', '/api/sheets/sync', '_handle_sheets_sync'),
+    Route('POST', '/api/welcome-flow/register', '_handle_welcome_flow_register'),
+    Route('POST', '/api/storage/process', '_handle_storage_process'),
+    Route('POST', '/api/storage/search', '_handle_storage_search'),
+    Route('POST', '/api/storage/test', '_handle_storage_test'),
+    Route('POST', '/api/storage/reprocess', '_handle_storage_reprocess'),
+    Route('POST', '/api/storage/queue/cancel', '_handle_storage_queue_cancel'),
+    Route('POST', '/api/wa/presence', '_handle_wa_presence_post'),
+    # Intelligence Layer (SPEC-6.1)
+    Route('POST', '/api/copilot', '_handle_copilot'),
+    Route('POST', '/api/ds/update-stage', '_handle_ds_update_stage'),
+    # Mentee Groups
+    Route('POST', '/api/mentee-groups', '_handle_post_group'),
+    Route('POST', r'^/api/mentee-groups/(\d+)/members$', '_handle_post_group_member'),
+    # ORCH-05 / ORCH-06 / LF Story 5 / FSM transitions
+    Route('POST', r'^/api/tasks/([^/]+)/agent-dispatch$', '_handle_agent_dispatch'),
+    Route('POST', r'^/api/tasks/([^/]+)/handoff$', '_handle_task_handoff'),
+    Route('POST', r'^/api/tasks/([^/]+)/transition$', '_handle_task_transition'),
+    Route('POST', r'^/api/mentees/([^/]+)/transition$', '_handle_mentorado_transition'),
+    Route('POST', r'^/api/dossies/producoes/([^/]+)/transition$', '_handle_dossie_producao_transition'),
+    Route('POST', r'^/api/dossies/documentos/([^/]+)/transition$', '_handle_dossie_documento_transition'),
+    # LF-FASE3: Descarrego
+    Route('POST', '/api/descarrego/capture', '_handle_descarrego_capture'),
+    Route('POST', '/api/descarrego/batch-capture', '_handle_descarrego_batch_capture'),
+    Route('POST', r'^/api/descarrego/([0-9a-f-]+)/process$', '_handle_descarrego_process'),
+    Route('POST', r'^/api/descarrego/([0-9a-f-]+)/approve$', '_handle_descarrego_approve'),
+    Route('POST', r'^/api/descarrego/([0-9a-f-]+)/reject$', '_handle_descarrego_reject'),
+    Route('POST', r'^/api/descarrego/([0-9a-f-]+)/reclassify$', '_handle_descarrego_reclassify'),
+    # ClickUp
+    Route('POST', '/api/clickup/sync-subtasks', '_handle_clickup_sync_subtasks'),
+    Route('POST', '/api/clickup/import-all', '_handle_clickup_import_all'),
+    Route('POST', '/api/clickup/webhook', '_handle_clickup_webhook', auth='public'),
+    Route('POST', r'^/api/clickup/push/(.+)$', '_handle_clickup_push'),
+    # API Keys / webhooks / WhatsApp
+    Route('POST', '/api/keys/generate', '_handle_generate_api_key'),
+    Route('POST', '/api/webhooks/evolution', '_handle_evolution_webhook', auth='public', body_limit=_MEDIA),
+    Route('POST', '/api/wa/send-text', '_handle_wa_send_text'),
+    Route('POST', '/api/wa/send-media', '_handle_wa_send_media'),
+    Route('POST', '/api/wa/reply', '_handle_wa_reply'),
+    Route('POST', '/api/wa/groups/sync', '_handle_wa_groups_sync'),
+    Route('POST', '/api/wa/groups/create', '_handle_wa_groups_create'),
+    Route('POST', r'^/api/wa/groups/([^/]+)/link$', '_handle_wa_group_link'),
+    # Media / AI
+    Route('POST', '/api/youtube/upload', '_handle_youtube_upload', body_limit=_MEDIA),
+    Route('POST', '/api/drive/sync', '_handle_drive_sync'),
+    Route('POST', '/api/mentee/weekly-summary', '_handle_weekly_summary'),
+    Route('POST', '/api/tasks/from-audio', '_handle_tasks_from_audio', body_limit=_AUDIO),
+    Route('POST', '/api/context/transcribe', '_handle_context_transcribe', body_limit=_AUDIO),
+    Route('POST', '/api/tasks/notify', '_handle_task_notify'),
+    Route('POST', '/api/webhooks/chatwoot', '_handle_chatwoot_webhook', auth='public'),
+    Route('POST', '/api/fabric/run', '_handle_fabric_run'),
+    Route('POST', '/api/dossie/evaluate', '_handle_ragas_evaluate'),
+    Route('POST', '/api/dossie/generate', '_handle_dossie_generate'),
+    # Dragon 16-18
+    Route('POST', '/api/automations/evaluate', '_handle_automations_evaluate'),
+    Route('POST', '/api/webhooks/outgoing/test', '_handle_webhook_outgoing_test'),
+    Route('POST', '/api/tasks/process-recurring', '_handle_process_recurring'),
+
+    # ----- PUT -----
+    Route('PUT', '/api/evolution/*', '_proxy_evolution', args=('PUT',), body_limit=_MEDIA),
+
+    # ----- PATCH -----
+    Route('PATCH', '/api/mentees/bulk', '_handle_bulk_patch_mentees'),
+    Route('PATCH', r'^/api/mentees/([0-9a-f-]+)$', '_handle_patch_mentee'),
+
+    # ----- DELETE -----
+    Route('DELETE', '/api/calendar/event/*', '_handle_delete_calendar_event'),
+    Route('DELETE', '/api/evolution/*', '_proxy_evolution', args=('DELETE',)),
+    Route('DELETE', '/api/wa/presence*', '_handle_wa_presence_delete'),
+    Route('DELETE', r'^/api/mentee-groups/(\d+)$', '_handle_delete_group'),
+    Route('DELETE', r'^/api/mentee-groups/(\d+)/members/(\d+)$', '_handle_delete_group_member'),
+    Route('DELETE', r'^/api/keys/([0-9a-f-]+)$', '_handle_revoke_api_key'),
+]
+
+ROUTER = Router(ROUTES)
+
+
 # ===== HTTP HANDLER =====
+CORS_ALLOWED_ORIGINS = (
+    'https://spalla-dashboard.vercel.app',
+    'https://spalla-dashboard-git-',  # Vercel preview URLs
+    'http://localhost:',
+    'http://127.0.0.1:',
+)
+
+
+def cors_origin(origin):
+    """Echo the request Origin when allowed, else the production dashboard."""
+    if origin and origin.startswith(CORS_ALLOWED_ORIGINS):
+        return origin
+    return 'https://spalla-dashboard.vercel.app'  # default
+
+
 class ProxyHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 persistent connections; see end_headers() for when we still close
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_IDLE_TIMEOUT
+    disable_nagle_algorithm = True  # headers and body are separate writes; avoid 40ms delayed-ACK stalls on reused sockets
+
+    # per-request response bookkeeping (reset in parse_request)
+    _response_status = None
+    _framed = False
+    _sent_connection_header = False
+    _sent_cache_control = False
+    _body_consumed = False
+    _keepalive_held = False
 
     def _read_body(self):
         length = int(self.headers.get('Content-Length', 0))
+        self._body_consumed = True
         return self.rfile.read(length) if length > 0 else b''
 
     def _read_json_body(self):
-        return json.loads(self._read_body())
+        return json_loads(self._read_body())
 
-    def _get_cors_origin(self):
-        origin = self.headers.get('Origin', '')
-        allowed = [
-            'https://spalla-dashboard.vercel.app',
-            'https://spalla-dashboard-git-',  # Vercel preview URLs
-            'http://localhost:',
-            'http://127.0.0.1:',
-        ]
-        if any(origin.startswith(a) for a in allowed):
-            return origin
-        return 'https://spalla-dashboard.vercel.app'  # default
+    def _read_multipart(self):
+        """Stream a multipart/form-data body into a MultipartForm (large parts spool to disk)."""
+        self._body_consumed = True
+        try:
+            return parse_multipart(self.rfile, self.headers.get('Content-Type', ''),
+                                   int(self.headers.get('Content-Length') or 0))
+        except MultipartError:
+            self.close_connection = True  # unknown amount of body left on the socket
+            raise
 
-    def _send_json(self, data, status=200):
-        body = json.dumps(data, ensure_ascii=False, default=str).encode()
+    def _get_cors_origin(self):
+        return cors_origin(self.headers.get('Origin', ''))
+
+    def _send_json(self, data, status=200, etag=None, headers=None):
+        """Send a JSON response. etag=True → strong ETag over the body; etag='<marker>' → ETag
+        from an upstream version marker, checked before serialising. A matching
+        If-None-Match on a 200 GET answers 304 with no body. headers: extra response headers."""
+        tag = None
+        conditional = etag and status == 200 and self.command in ('GET', 'HEAD')
+        if conditional and etag is not True:
+            tag = make_etag(str(etag).encode())
+            matched = etag_matches(self.headers.get('If-None-Match'), tag)
+            if matched:
+                return self._send_not_modified(matched)
+        body = json_dumps(data)
+        if conditional and etag is True:
+            tag = make_etag(body)
+            matched = etag_matches(self.headers.get('If-None-Match'), tag)
+            if matched:
+                return self._send_not_modified(matched)
+        body, encoding = compress_body(body, self.headers.get('Accept-Encoding', ''))
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if tag:
+            self.send_header('ETag', format_etag(tag, encoding))
+            self.send_header('Cache-Control', 'private, no-cache')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_header('Content-Length', len(body))
         self.end_headers()
         self.wfile.write(body)
 
+    def _auth_context(self):
+        """This request's AuthContext (built in _dispatch; rebuilt if the headers changed)."""
+        ctx = getattr(self, 'auth_ctx', None)
+        if ctx is None or ctx.headers is not self.headers:
+            ctx = self.auth_ctx = AuthContext(self.headers)
+        return ctx
+
+    def _client_ip(self):
+        """Client address; behind Railway's proxy the last X-Forwarded-For hop is the one it saw."""
+        forwarded = self.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.rsplit(',', 1)[-1].strip()
+        return self.client_address[0] if self.client_address else ''
+
+    def _send_json_stream(self, items, status=200):
+        """Stream a JSON array item by item with chunked transfer-encoding.
+
+        Only one encoded item (plus a JSON_STREAM_FLUSH_BYTES buffer) is held at a
+        time, so large lists never exist as one str/bytes copy, and the first bytes
+        leave before the last item is encoded. Compressed on the fly when accepted.
+        The first item is pulled before the headers go out, so a lazy source that
+        fails right away (supabase_iter) raises to the caller while a 500 is possible.
+        """
+        items = iter(items)
+        head = list(itertools.islice(items, 1))
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding', ''))
+        compressor = stream_compressor(encoding)
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()  # HTTP/1.0: no framing → end_headers closes after the body
+
+        def emit(data):
+            if compressor:
+                data = compressor[0](data)
+            if data:
+                self._write_chunk(data, chunked)
+
+        buf = bytearray(b'[')
+        try:
+            for i, item in enumerate(itertools.chain(head, items)):
+                if i:
+                    buf += b','
+                buf += json_dumps(item)
+                if len(buf) >= JSON_STREAM_FLUSH_BYTES:
+                    emit(bytes(buf))
+                    buf.clear()
+            buf += b']'
+            emit(bytes(buf))
+            if compressor:
+                self._write_chunk(compressor[1](), chunked)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # Headers are gone; drop the socket without the terminating chunk so the client sees a failure
+            log_error('Stream', f'{self.path} aborted mid-stream: {e}', e)
+            self.close_connection = True
+
+    def _write_chunk(self, data, chunked):
+        if not data:
+            return
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+
+    def _send_not_modified(self, validator):
+        self.send_response(304)
+        self.send_header('ETag', validator)
+        self.send_header('Cache-Control', 'private, no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
+        self.end_headers()
+
     # ===== CLICKUP COMMAND CENTER =====
     def _handle_clickup_command_center(self):
         """GET /api/clickup/command-center — Sprint tasks, team summary, activity from ClickUp"""
@@ -2080,7 +4967,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
         def clickup_get(url):
             req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=10) as r:
+            with upstream_urlopen('clickup', req, timeout=10) as r:
                 return json.loads(r.read())
 
         def normalize_status(raw):
@@ -2216,7 +5103,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     # ===== CLICKUP IMPORT ALL TASKS =====
     def _handle_clickup_import_all(self):
         """POST /api/clickup/import-all — Full import of tasks from ClickUp lists (auth required)"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -2229,7 +5116,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
         def clickup_get(url):
             req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=20) as r:
+            with upstream_urlopen('clickup', req, timeout=20) as r:
                 return json.loads(r.read())
 
         def normalize_status(raw):
@@ -2274,12 +5161,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self._send_json({'error': 'No list_ids provided and no god_lists with clickup_list_id found'}, 400)
                 return
 
-            # Fetch existing operon_id mapping
-            existing = supabase_request('GET', 'god_tasks?select=id,operon_id&operon_id=not.is.null')
-            existing_map = {r['operon_id']: r['id'] for r in (existing or [])}
-
-            imported = 0
-            updated = 0
+            rows = []
             errors = 0
 
             for list_id in list_ids:
@@ -2327,24 +5209,20 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                             except (ValueError, TypeError):
                                 pass
 
-                        if cu_id in existing_map:
-                            result = supabase_request('PATCH', f'god_tasks?id=eq.{existing_map[cu_id]}', row)
-                            updated += 1
-                        else:
-                            result = supabase_request('POST', 'god_tasks', row)
-                            imported += 1
-
-                        if isinstance(result, dict) and result.get('error'):
-                            errors += 1
+                        rows.append(row)
 
                     if data.get('last_page', True):
                         break
                     page += 1
 
+            # One upsert keyed by operon_id: new tasks are inserted, known ones updated in place
+            outcome = supabase_bulk_upsert('god_tasks', rows, on_conflict='operon_id')
+            for err in outcome['errors']:
+                log_error('ClickUp', f'Import of {rows[err["index"]]["operon_id"]} failed: {err["error"][:200]}')
+
             self._send_json({
-                'imported': imported,
-                'updated': updated,
-                'errors': errors,
+                'upserted': outcome['upserted'],
+                'errors': errors + outcome['failed'],
                 'lists_processed': len(list_ids),
             })
 
@@ -2416,7 +5294,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     # ===== CLICKUP PUSH TASK =====
     def _handle_clickup_push(self, task_uuid):
         """POST /api/clickup/push/<task_uuid> — Push a Spalla task to ClickUp (auth required)"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -2462,7 +5340,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     headers=headers,
                     method='PUT'
                 )
-                with urllib.request.urlopen(req, timeout=15) as r:
+                with upstream_urlopen('clickup', req, timeout=15) as r:
                     result = json.loads(r.read())
                 supabase_request('PATCH', f'god_tasks?id=eq.{task_uuid}', {
                     'clickup_synced_at': datetime.now(timezone.utc).isoformat()
@@ -2478,7 +5356,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     headers=headers,
                     method='POST'
                 )
-                with urllib.request.urlopen(req, timeout=15) as r:
+                with upstream_urlopen('clickup', req, timeout=15) as r:
                     result = json.loads(r.read())
                 new_cu_id = result.get('id', '')
                 new_cu_url = clickup_deep_link(result.get('url', ''))
@@ -2505,7 +5383,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
         def clickup_get(url):
             req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, timeout=15) as r:
+            with upstream_urlopen('clickup', req, timeout=15) as r:
                 return json.loads(r.read())
 
         def normalize_status(raw):
@@ -2541,12 +5419,16 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     if item.get('parent'):
                         clickup_subs.setdefault(item['parent'], []).append(item)
 
-            # 2. Fetch god_tasks that have operon_id set (maps ClickUp ID → Supabase UUID)
-            gt_rows = supabase_request('GET', 'god_tasks?select=id,operon_id&operon_id=not.is.null')
-            if isinstance(gt_rows, dict) and gt_rows.get('error'):
-                self._send_json({'error': f"DB error: {gt_rows['error']}"}, 500)
-                return
-            operon_to_uuid = {r['operon_id']: r['id'] for r in (gt_rows or [])}
+            # 2. Resolve only the parents we saw (ClickUp ID → Supabase UUID), in URL-sized slices
+            operon_to_uuid = {}
+            parent_ids = list(clickup_subs)
+            for i in range(0, len(parent_ids), 100):
+                in_clause = ','.join(f'"{cu_id}"' for cu_id in parent_ids[i:i + 100])
+                gt_rows = supabase_request('GET', f'god_tasks?select=id,operon_id&operon_id=in.({in_clause})')
+                if not supa_ok(gt_rows):
+                    self._send_json({'error': f"DB error: {gt_rows.get('error')}"}, 500)
+                    return
+                operon_to_uuid.update((r['operon_id'], r['id']) for r in gt_rows)
 
             # 3. Find parents that exist both in ClickUp subtasks and god_tasks
             matched_parents = {
@@ -2563,25 +5445,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 })
                 return
 
-            # 4. Fetch existing clickup-sourced subtasks for matched task UUIDs
-            uuid_csv = ','.join(matched_parents.values())
-            existing_rows = supabase_request(
-                'GET',
-                f'god_task_subtasks?select=id,task_id,clickup_id&task_id=in.({uuid_csv})&clickup_id=not.is.null'
-            )
-            existing_map = {}  # (task_uuid, clickup_id) → subtask row id
-            for row in (existing_rows or []):
-                if row.get('clickup_id'):
-                    existing_map[(row['task_id'], row['clickup_id'])] = row['id']
-
-            # 5. Upsert subtasks
-            synced = 0
-            errors = 0
+            # 4. Upsert subtasks keyed by (task_id, clickup_id)
+            rows = []
             for cu_parent_id, god_task_uuid in matched_parents.items():
                 for st in clickup_subs[cu_parent_id]:
-                    cu_st_id = st.get('id', '')
                     status = normalize_status(st.get('status', {}).get('status', ''))
-                    row = {
+                    rows.append({
                         'task_id':     god_task_uuid,
                         'texto':       st.get('name', ''),
                         'done':        status == 'concluida',
@@ -2593,17 +5462,11 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                         'data_inicio': ms_to_date(st.get('start_date')),
                         'data_fim':    ms_to_date(st.get('due_date')),
                         'prioridade':  'normal',
-                        'clickup_id':  cu_st_id,
-                    }
-                    key = (god_task_uuid, cu_st_id)
-                    if key in existing_map:
-                        result = supabase_request('PATCH', f'god_task_subtasks?id=eq.{existing_map[key]}', row)
-                    else:
-                        result = supabase_request('POST', 'god_task_subtasks', row)
-                    if isinstance(result, dict) and result.get('error'):
-                        errors += 1
-                    else:
-                        synced += 1
+                        'clickup_id':  st.get('id', ''),
+                    })
+            outcome = supabase_bulk_upsert('god_task_subtasks', rows, on_conflict='task_id,clickup_id')
+            synced = outcome['upserted']
+            errors = outcome['failed']
 
             self._send_json({
                 'synced': synced,
@@ -2622,7 +5485,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/tasks/{id}/transition
         Body: { event: 'start'|'complete'|..., payload?: {...} }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2715,7 +5578,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         Dispatches task to the appropriate agent based on execution_endpoint.
         Body: { force?: boolean }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2790,7 +5653,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         Body: { from_person: str, to_person: str, note?: str }
         Logs a handoff and auto-dispatches if new responsavel is an agent.
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2841,7 +5704,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     # ============================================================
     def _handle_agent_metrics(self):
         """GET /api/agent-metrics — returns agent performance data from vw_agent_metrics."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2849,7 +5712,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not supa_ok(r):
                 return self._send_json({'error': 'failed to fetch metrics'}, 500)
             agents = r if isinstance(r, list) else []
-            self._send_json({'agents': agents})
+            self._send_json({'agents': agents}, etag=True)
         except Exception as e:
             log_error('agent_metrics', str(e), e)
             self._send_json({'error': str(e)}, 500)
@@ -2861,7 +5724,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/mentees/{id}/transition
         Body: { event: 'contract_signed'|'kickoff_done'|..., payload?: {...} }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2921,7 +5784,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/dossies/producoes/{id}/transition
         Body: { event: 'start_production'|'request_review'|..., payload?: {...} }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -2981,7 +5844,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/dossies/documentos/{id}/transition
         Body: { event: 'start_writing'|'submit_to_qg'|..., trilha?: 'scale'|'clinic', payload?: {...} }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -3049,7 +5912,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/descarrego/capture
         Body: { mentorado_id, tipo_bruto, conteudo_bruto?, arquivo_url?, fonte? }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -3091,7 +5954,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         Creates multiple descarregos at once. Max 20 per batch.
         Optionally auto-processes them if auto_process=true.
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -3157,7 +6020,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_descarrego_process(self, descarrego_id):
         """POST /api/descarrego/{id}/process — async pipeline."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         # Spawn worker thread
@@ -3174,7 +6037,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_descarrego_approve(self, descarrego_id):
         """POST /api/descarrego/{id}/approve — HITL approve."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         actor = auth.get('user_id') if isinstance(auth, dict) else str(auth)
@@ -3193,7 +6056,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_descarrego_reject(self, descarrego_id):
         """POST /api/descarrego/{id}/reject — HITL reject."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         actor = auth.get('user_id') if isinstance(auth, dict) else str(auth)
@@ -3214,7 +6077,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """POST /api/descarrego/{id}/reclassify — manual reclassification.
         Body: { new_type: 'task'|'contexto'|... }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -3258,7 +6121,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_descarregos_list(self, mentorado_id):
         """GET /api/mentees/{id}/descarregos"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             return self._send_json({'error': 'unauthorized'}, 401)
         try:
@@ -3279,301 +6142,241 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Max-Age', '86400')
         self.end_headers()
 
+    def _handle_health(self):
+        """GET /api/health"""
+        self._send_json({
+            'status': 'ok',
+            'zoom_configured': bool(ZOOM_ACCOUNT_ID and ZOOM_CLIENT_ID),
+            'gcal_configured': bool(os.environ.get('GOOGLE_SA_JSON') or os.environ.get('GOOGLE_SA_CREDENTIALS_B64') or os.path.exists(GOOGLE_SA_PATH)),
+            'supabase_configured': bool(SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY),
+            'supabase_pool': _supa_pool.snapshot(),
+            'supabase_singleflight': _supa_flight.snapshot(),
+            'supabase_cache': _supa_cache.snapshot(),
+            'breakers': {name: b.snapshot() for name, b in BREAKERS.items()},
+            'read_backend': pg_reads_snapshot(),
+            'api_keys': {**_api_key_cache.snapshot(), 'usage': _api_key_usage.snapshot()},
+            'jwt_cache': _jwt_cache.snapshot(),
+            'ingestion': _ingest_executor.counters() if _ingest_executor is not None else None,
+            'login': {'password_pool': _password_pool.snapshot(), 'throttle': _login_throttle.snapshot()},
+            'sheets_configured': get_sheets_service() is not None,
+            'openai_configured': bool(OPENAI_API_KEY),
+            'storage_search': bool(OPENAI_API_KEY),
+            'evolution_configured': bool(EVOLUTION_API_KEY),
+            'evolution_base': EVOLUTION_BASE,
+            'evolution_key_prefix': EVOLUTION_API_KEY[:8] + '...' if EVOLUTION_API_KEY else 'EMPTY',
+        })
+
+    def _handle_root(self):
+        """GET / — service banner"""
+        self._send_json({
+            'service': 'Spalla Dashboard API',
+            'version': '1.0.0',
+            'status': 'operational',
+            'docs': 'https://spalla-dashboard.vercel.app/api-docs',
+            'health': '/api/health',
+            'endpoints': len(ROUTES),
+        })
+
+    def _dispatch(self):
+        """Route the request via ROUTER. Returns False when no route matches."""
+        found = ROUTER.match(self.command, self.path)
+        if found is None:
+            return False
+        route, params = found
+        self.route = route
+        if int(self.headers.get('Content-Length') or 0) > route.body_limit:
+            self.close_connection = True
+            self._send_json({'error': f'Request body too large (max {route.body_limit} bytes)'}, 413)
+            return True
+        if route.timeout and self.connection is not None:
+            self.connection.settimeout(route.timeout)
+        _request_deadline.at = time.monotonic() + REQUEST_RETRY_DEADLINE
+        self.auth_ctx = AuthContext(self.headers)
+        if route.auth == 'any' and not self.auth_ctx.auth:
+            self._send_json({'error': 'Authentication required'}, 401)
+            return True
+        if route.auth == 'jwt' and not self.auth_ctx.claims:
+            self._send_json({'error': 'Unauthorized'}, 401)
+            return True
+        try:
+            getattr(self, route.handler)(*route.args, *params)
+        finally:
+            _request_deadline.at = None  # worker threads are reused; crons/pipelines run unbounded
+        return True
+
     def do_GET(self):
-        if self.path == '/api/auth/me':
-            self._handle_auth_me()
-        elif self.path.startswith('/api/evolution/'):
-            self._proxy_evolution('GET')
-        elif self.path == '/api/mentees/portfolio':
-            self._handle_get_portfolio()
-        elif self.path == '/api/mentees':
-            self._handle_get_mentees()
-        elif re.match(r'^/api/mentees/(\d+)/notes$', self.path):
-            _m = re.match(r'^/api/mentees/(\d+)/notes$', self.path)
-            self._handle_get_notes(_m.group(1))
-        elif self.path.startswith('/api/calendar/events'):
-            self._handle_list_events()
-        elif self.path == '/api/calls/upcoming':
-            self._handle_upcoming_calls()
-        elif self.path.startswith('/api/media/presign'):
-            self._handle_media_presign()
-        elif self.path.startswith('/api/media/stream'):
-            self._handle_media_stream()
-        elif self.path == '/api/evolution/instance-uuid':
-            self._handle_instance_uuid()
-        elif self.path == '/api/sheets/status':
-            self._handle_sheets_status()
-        elif self.path == '/api/wa/groups':
-            self._handle_wa_groups_list()
-        elif self.path.startswith('/api/storage/files'):
-            self._handle_storage_list_files()
-        elif self.path.startswith('/api/storage/status'):
-            self._handle_storage_status()
-        elif self.path == '/api/health':
-            self._send_json({
-                'status': 'ok',
-                'zoom_configured': bool(ZOOM_ACCOUNT_ID and ZOOM_CLIENT_ID),
-                'gcal_configured': bool(os.environ.get('GOOGLE_SA_JSON') or os.environ.get('GOOGLE_SA_CREDENTIALS_B64') or os.path.exists(GOOGLE_SA_PATH)),
-                'supabase_configured': bool(SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY),
-                'sheets_configured': get_sheets_service() is not None,
-                'openai_configured': bool(OPENAI_API_KEY),
-                'storage_search': bool(OPENAI_API_KEY),
-                'evolution_configured': bool(EVOLUTION_API_KEY),
-                'evolution_base': EVOLUTION_BASE,
-                'evolution_key_prefix': EVOLUTION_API_KEY[:8] + '...' if EVOLUTION_API_KEY else 'EMPTY',
-            })
-        # ===== ORCH-07: Agent Metrics =====
-        elif self.path == '/api/agent-metrics':
-            self._handle_agent_metrics()
-        # ===== WA DM v2 (S9-A) =====
-        elif self.path == '/api/mentees/triage':
-            self._handle_mentees_triage()
-        elif self.path.startswith('/api/wa/media'):
-            self._handle_wa_media()
-        elif self.path.startswith('/api/wa/labels/summary'):
-            self._handle_wa_labels_summary()
-        elif self.path.startswith('/api/wa/inbox'):
-            self._handle_wa_inbox()
-        elif re.match(r'^/api/wa/presence/(\d+)$', self.path):
-            _m = re.match(r'^/api/wa/presence/(\d+)$', self.path)
-            self._handle_wa_presence_get(_m.group(1))
-        # ===== Mentee Groups =====
-        elif self.path == '/api/mentee-groups':
-            self._handle_get_groups()
-        elif re.match(r'^/api/mentee-groups/(\d+)/members$', self.path):
-            _m = re.match(r'^/api/mentee-groups/(\d+)/members$', self.path)
-            self._handle_get_group_members(_m.group(1))
-        elif re.match(r'^/api/mentees/(\d+)/descarregos$', self.path):
-            _m = re.match(r'^/api/mentees/(\d+)/descarregos$', self.path)
-            self._handle_descarregos_list(_m.group(1))
-        elif self.path == '/api/clickup/command-center':
-            self._handle_clickup_command_center()
-        # ===== Biblioteca =====
-        elif self.path.startswith('/api/biblioteca'):
-            self._handle_biblioteca_get()
-        # ===== API Keys Management =====
-        elif self.path == '/api/keys':
-            self._handle_list_api_keys()
-        # ===== Chatwoot Messages =====
-        elif re.match(r'^/api/mentees/(\d+)/messages$', self.path):
-            _m = re.match(r'^/api/mentees/(\d+)/messages$', self.path)
-            self._handle_get_chatwoot_messages(_m.group(1))
-        # ===== Cron Jobs Status (OpenFang — EPIC 5) =====
-        elif self.path == '/api/crons/status':
-            self._handle_cron_status()
-        # ===== Dossiê QA Scores =====
-        elif re.match(r'^/api/mentees/(\d+)/qa-scores$', self.path):
-            _m = re.match(r'^/api/mentees/(\d+)/qa-scores$', self.path)
-            self._handle_get_qa_scores(_m.group(1))
-        # ===== Root =====
-        elif self.path == '/' or self.path == '':
-            self._send_json({
-                'service': 'Spalla Dashboard API',
-                'version': '1.0.0',
-                'status': 'operational',
-                'docs': 'https://spalla-dashboard.vercel.app/api-docs',
-                'health': '/api/health',
-                'endpoints': 58,
-            })
-        else:
+        if not self._dispatch() and not self._serve_static():
             super().do_GET()
 
+    def do_HEAD(self):
+        if not self._serve_static(head=True):
+            super().do_HEAD()
+
+    def _serve_static(self, head=False):
+        """Serve a frontend file from STATIC_ASSETS; False when it isn't in the store."""
+        if STATIC_ASSETS is None:
+            return False
+        asset, immutable = STATIC_ASSETS.lookup(self.path)
+        if asset is None:
+            return False
+        encoding = None
+        body = asset.body
+        if asset.variants:
+            encoding = negotiate_encoding(self.headers.get('Accept-Encoding', ''))
+            if encoding in asset.variants:
+                body = asset.variants[encoding]
+            else:
+                encoding = None  # variant dropped at load: it wasn't meaningfully smaller
+        validator = etag_matches(self.headers.get('If-None-Match'), asset.hash)
+        status = 304 if validator else 200
+        self.send_response(status)
+        self.send_header('ETag', validator or format_etag(asset.hash, encoding))
+        self.send_header('Cache-Control', STATIC_IMMUTABLE_CACHE if immutable else STATIC_REVALIDATE_CACHE)
+        if asset.variants:
+            self.send_header('Vary', 'Accept-Encoding')
+        if status == 304:
+            STATIC_ASSETS.stats['not_modified'] += 1
+            self.end_headers()
+            return True
+        STATIC_ASSETS.stats['hits'] += 1
+        self.send_header('Content-Type', asset.content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body) if body is not None else asset.size))
+        self.end_headers()
+        if head:
+            return True
+        if body is not None:
+            self.wfile.write(body)
+        elif self.connection is not None:
+            STATIC_ASSETS.stats['sendfile'] += 1
+            with open(asset.disk_path, 'rb') as f:
+                self.connection.sendfile(f)  # os.sendfile on plain sockets, send() loop otherwise
+        else:
+            with open(asset.disk_path, 'rb') as f:
+                self.wfile.write(f.read())
+        return True
+
     def end_headers(self):
-        # Disable browser cache for JS/HTML/CSS files
-        if hasattr(self, 'path') and any(ext in self.path for ext in ('.js', '.html', '.css', '.jpg', '.png')):
+        # Disable browser cache for JS/HTML/CSS files served from disk (the static store sets its own)
+        if not self._sent_cache_control and hasattr(self, 'path') and any(ext in self.path for ext in ('.js', '.html', '.css', '.jpg', '.png')):
             self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
             self.send_header('Pragma', 'no-cache')
             self.send_header('Expires', '0')
+        if not self.close_connection and not self._keepalive_allowed():
+            self.close_connection = True
+        if self.close_connection:
+            if not self._sent_connection_header:
+                self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
         super().end_headers()
 
+    def send_response(self, code, message=None):
+        self._response_status = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        key = keyword.lower()
+        if key == 'content-length' or (key == 'transfer-encoding' and 'chunked' in str(value).lower()):
+            self._framed = True
+        elif key == 'connection':
+            self._sent_connection_header = True
+        elif key == 'cache-control':
+            self._sent_cache_control = True
+        super().send_header(keyword, value)
+
+    def _keepalive_allowed(self):
+        """The response is self-delimiting, the request body is drained and the server has room."""
+        if not (self._framed or self.command == 'HEAD' or self._response_status in (204, 304)):
+            return False
+        if int(self.headers.get('Content-Length') or 0) > 0 and not self._body_consumed:
+            return False  # unread body would be parsed as the next request
+        acquire = getattr(self.server, 'acquire_keepalive', None)
+        if acquire is None or not acquire(self._keepalive_held):
+            return False
+        self._keepalive_held = True
+        return True
+
+    def _relay_body(self, upstream, content_length, chunk_size=8192):
+        """Copy an upstream body to the client; chunked framing when the length is unknown.
+        Caller sends 'Transfer-Encoding: chunked' instead of Content-Length in that case."""
+        chunked = not content_length and self.request_version == 'HTTP/1.1'
+        try:
+            while True:
+                chunk = upstream.read(chunk_size)
+                if not chunk:
+                    break
+                self._write_chunk(chunk, chunked)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Exception:
+            self.close_connection = True  # response is truncated; never reuse the socket
+            raise
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            if self._keepalive_held:
+                self._keepalive_held = False
+                release = getattr(self.server, 'release_keepalive', None)
+                if release:
+                    release()
+
+    def parse_request(self):
+        """Parse request line/headers, then claim the per-route concurrency slot (pool mode)."""
+        self._route_slot = None
+        self._response_status = None
+        self._framed = False
+        self._sent_connection_header = False
+        self._sent_cache_control = False
+        self._body_consumed = False
+        if not super().parse_request():
+            return False
+        acquire = getattr(self.server, 'acquire_route_slot', None)
+        if acquire and self.command != 'OPTIONS':
+            slot = acquire(self.path)
+            if slot is False:
+                self.close_connection = True
+                self.send_response(503)
+                self.send_header('Retry-After', '5')
+                self.send_header('Connection', 'close')
+                body = json.dumps({'error': 'Too many concurrent requests for this route, try again shortly'}).encode()
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
+                self.send_header('Content-Length', len(body))
+                self.end_headers()
+                self.wfile.write(body)
+                return False
+            self._route_slot = slot
+        return True
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        finally:
+            slot = getattr(self, '_route_slot', None)
+            if slot:
+                self._route_slot = None
+                slot.release()
+            if self.connection is not None and self.timeout:
+                self.connection.settimeout(self.timeout)  # back to idle timeout after route overrides
+
     def do_POST(self):
-        _notes_post = re.match(r'^/api/mentees/(\d+)/notes$', self.path)
-        _offboard = re.match(r'^/api/mentees/(\d+)/offboard$', self.path)
-        if _notes_post:
-            self._handle_post_note(_notes_post.group(1))
-        elif _offboard:
-            self._handle_offboard_mentee(_offboard.group(1))
-        elif self.path == '/api/auth/register':
-            self._handle_auth_register()
-        elif self.path == '/api/auth/login':
-            self._handle_auth_login()
-        elif self.path == '/api/auth/refresh':
-            self._handle_auth_refresh()
-        elif self.path == '/api/auth/reset-password':
-            self._handle_auth_reset_password()
-        elif self.path.startswith('/api/evolution/'):
-            self._proxy_evolution('POST')
-        elif self.path == '/api/schedule-call':
-            self._handle_schedule_call()
-        elif self.path == '/api/zoom/create-meeting':
-            self._handle_create_zoom_meeting()
-        elif self.path == '/api/calendar/create-event':
-            self._handle_create_calendar_event()
-        elif self.path == '/api/sheets/sync':
-            self._handle_sheets_sync()
-        elif self.path == '/api/welcome-flow/register':
-            self._handle_welcome_flow_register()
-        elif self.path == '/api/storage/process':
-            self._handle_storage_process()
-        elif self.path == '/api/storage/search':
-            self._handle_storage_search()
-        elif self.path == '/api/storage/test':
-            self._handle_storage_test()
-        elif self.path == '/api/storage/reprocess':
-            self._handle_storage_reprocess()
-        # ===== WA DM v2 (S9-A) =====
-        elif self.path == '/api/wa/presence':
-            self._handle_wa_presence_post()
-# ===== Intelligence Layer (SPEC-6.1) =====
-        elif self.path == '/api/copilot':
-            self._handle_copilot()
-        elif self.path == '/api/ds/update-stage':
-            self._handle_ds_update_stage()
-        # ===== Mentee Groups =====
-        elif self.path == '/api/mentee-groups':
-            self._handle_post_group()
-        elif re.match(r'^/api/mentee-groups/(\d+)/members$', self.path):
-            _m = re.match(r'^/api/mentee-groups/(\d+)/members$', self.path)
-            self._handle_post_group_member(_m.group(1))
-        # ===== ORCH-05: Agent Dispatch =====
-        elif re.match(r'^/api/tasks/([^/]+)/agent-dispatch$', self.path):
-            _ad = re.match(r'^/api/tasks/([^/]+)/agent-dispatch$', self.path)
-            self._handle_agent_dispatch(_ad.group(1))
-        # ===== ORCH-06: Handoff Protocol =====
-        elif re.match(r'^/api/tasks/([^/]+)/handoff$', self.path):
-            _hf = re.match(r'^/api/tasks/([^/]+)/handoff$', self.path)
-            self._handle_task_handoff(_hf.group(1))
-        # ===== LF Story 5: Task FSM transition =====
-        elif re.match(r'^/api/tasks/([^/]+)/transition$', self.path):
-            _tm = re.match(r'^/api/tasks/([^/]+)/transition$', self.path)
-            self._handle_task_transition(_tm.group(1))
-        # ===== FSM: Mentorado transition =====
-        elif re.match(r'^/api/mentees/([^/]+)/transition$', self.path):
-            _mm = re.match(r'^/api/mentees/([^/]+)/transition$', self.path)
-            self._handle_mentorado_transition(_mm.group(1))
-        # ===== FSM: Dossiê Produção transition =====
-        elif re.match(r'^/api/dossies/producoes/([^/]+)/transition$', self.path):
-            _dp = re.match(r'^/api/dossies/producoes/([^/]+)/transition$', self.path)
-            self._handle_dossie_producao_transition(_dp.group(1))
-        # ===== FSM: Dossiê Documento transition =====
-        elif re.match(r'^/api/dossies/documentos/([^/]+)/transition$', self.path):
-            _dd = re.match(r'^/api/dossies/documentos/([^/]+)/transition$', self.path)
-            self._handle_dossie_documento_transition(_dd.group(1))
-        # ===== LF-FASE3: Descarrego =====
-        elif self.path == '/api/descarrego/capture':
-            self._handle_descarrego_capture()
-        elif self.path == '/api/descarrego/batch-capture':
-            self._handle_descarrego_batch_capture()
-        elif re.match(r'^/api/descarrego/([0-9a-f-]+)/process$', self.path):
-            _dm = re.match(r'^/api/descarrego/([0-9a-f-]+)/process$', self.path)
-            self._handle_descarrego_process(_dm.group(1))
-        elif re.match(r'^/api/descarrego/([0-9a-f-]+)/approve$', self.path):
-            _dm = re.match(r'^/api/descarrego/([0-9a-f-]+)/approve$', self.path)
-            self._handle_descarrego_approve(_dm.group(1))
-        elif re.match(r'^/api/descarrego/([0-9a-f-]+)/reject$', self.path):
-            _dm = re.match(r'^/api/descarrego/([0-9a-f-]+)/reject$', self.path)
-            self._handle_descarrego_reject(_dm.group(1))
-        elif re.match(r'^/api/descarrego/([0-9a-f-]+)/reclassify$', self.path):
-            _dm = re.match(r'^/api/descarrego/([0-9a-f-]+)/reclassify$', self.path)
-            self._handle_descarrego_reclassify(_dm.group(1))
-        elif self.path == '/api/clickup/sync-subtasks':
-            self._handle_clickup_sync_subtasks()
-        elif self.path == '/api/clickup/import-all':
-            self._handle_clickup_import_all()
-        elif self.path == '/api/clickup/webhook':
-            self._handle_clickup_webhook()
-        elif re.match(r'^/api/clickup/push/(.+)$', self.path):
-            _m = re.match(r'^/api/clickup/push/(.+)$', self.path)
-            self._handle_clickup_push(_m.group(1))
-        # ===== API Keys Management =====
-        elif self.path == '/api/keys/generate':
-            self._handle_generate_api_key()
-        # ===== Evolution Webhook (Status Updates) =====
-        elif self.path == '/api/webhooks/evolution':
-            self._handle_evolution_webhook()
-        # ===== WhatsApp Send Endpoints =====
-        elif self.path == '/api/wa/send-text':
-            self._handle_wa_send_text()
-        elif self.path == '/api/wa/send-media':
-            self._handle_wa_send_media()
-        elif self.path == '/api/wa/reply':
-            self._handle_wa_reply()
-        # ===== WhatsApp Group Management =====
-        elif self.path == '/api/wa/groups/sync':
-            self._handle_wa_groups_sync()
-        elif self.path == '/api/wa/groups/create':
-            self._handle_wa_groups_create()
-        elif re.match(r'^/api/wa/groups/([^/]+)/link$', self.path):
-            _gm = re.match(r'^/api/wa/groups/([^/]+)/link$', self.path)
-            self._handle_wa_group_link(_gm.group(1))
-        # ===== YouTube Upload =====
-        elif self.path == '/api/youtube/upload':
-            self._handle_youtube_upload()
-        # ===== Google Drive Sync =====
-        elif self.path == '/api/drive/sync':
-            self._handle_drive_sync()
-        # ===== Resumo Semanal =====
-        elif self.path == '/api/mentee/weekly-summary':
-            self._handle_weekly_summary()
-        # ===== Task from Audio (TASK-07) =====
-        elif self.path == '/api/tasks/from-audio':
-            self._handle_tasks_from_audio()
-        # ===== Context Hub: Transcribe audio =====
-        elif self.path == '/api/context/transcribe':
-            self._handle_context_transcribe()
-        # ===== Task Notifications =====
-        elif self.path == '/api/tasks/notify':
-            self._handle_task_notify()
-        # ===== Chatwoot Webhook =====
-        elif self.path == '/api/webhooks/chatwoot':
-            self._handle_chatwoot_webhook()
-        # ===== Fabric Pattern Runner =====
-        elif self.path == '/api/fabric/run':
-            self._handle_fabric_run()
-        # ===== RAGAS Quality Gate =====
-        elif self.path == '/api/dossie/evaluate':
-            self._handle_ragas_evaluate()
-        # ===== Dossiê Generation (Goose Agent — EPIC 6) =====
-        elif self.path == '/api/dossie/generate':
-            self._handle_dossie_generate()
-        # ===== Automations Cron (Dragon 16) =====
-        elif self.path == '/api/automations/evaluate':
-            self._handle_automations_evaluate()
-        # ===== Webhook Outgoing (Dragon 17) =====
-        elif self.path == '/api/webhooks/outgoing/test':
-            self._handle_webhook_outgoing_test()
-        # ===== Recurring Tasks (Dragon 18) =====
-        elif self.path == '/api/tasks/process-recurring':
-            self._handle_process_recurring()
-        else:
+        if not self._dispatch():
             self._send_json({'error': 'Not found'}, 404)
 
     def do_PUT(self):
-        if self.path.startswith('/api/evolution/'):
-            self._proxy_evolution('PUT')
-        else:
+        if not self._dispatch():
+            self._send_json({'error': 'Not found'}, 404)
+
+    def do_PATCH(self):
+        if not self._dispatch():
             self._send_json({'error': 'Not found'}, 404)
 
     def do_DELETE(self):
-        if self.path.startswith('/api/calendar/event/'):
-            self._handle_delete_calendar_event()
-        elif self.path.startswith('/api/evolution/'):
-            self._proxy_evolution('DELETE')
-        # ===== WA DM v2 (S9-A) =====
-        elif self.path.startswith('/api/wa/presence'):
-            self._handle_wa_presence_delete()
-        # ===== Mentee Groups =====
-        elif re.match(r'^/api/mentee-groups/(\d+)$', self.path):
-            _m = re.match(r'^/api/mentee-groups/(\d+)$', self.path)
-            self._handle_delete_group(_m.group(1))
-        elif re.match(r'^/api/mentee-groups/(\d+)/members/(\d+)$', self.path):
-            _m = re.match(r'^/api/mentee-groups/(\d+)/members/(\d+)$', self.path)
-            self._handle_delete_group_member(_m.group(1), _m.group(2))
-        # ===== API Keys Management =====
-        elif re.match(r'^/api/keys/([0-9a-f-]+)$', self.path):
-            _m = re.match(r'^/api/keys/([0-9a-f-]+)$', self.path)
-            self._handle_revoke_api_key(_m.group(1))
-        else:
+        if not self._dispatch():
             self._send_json({'error': 'Not found'}, 404)
 
     # ===== WA DM v2 HANDLERS (S9-A) =====
@@ -3583,24 +6386,25 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             Uses vw_wa_mentee_inbox + wa_topics to compute priority scores.
             Returns: [{ id, nome, score, level, factors }] sorted by score desc.
             """
-            auth = check_auth_any(self.headers)
+            auth = self._auth_context().auth
             if not auth:
                 self._send_json({'error': 'Authentication required'}, 401)
                 return
             try:
-                inbox = supabase_request('GET',
-                    'vw_wa_mentee_inbox?select=*&order=horas_sem_resposta_equipe.desc.nullslast')
+                inbox = pg_read('wa_inbox', {'health': None, 'fase': None, 'search': None, 'sort': 'sla_desc'},
+                                lambda: supabase_request('GET',
+                                    'vw_wa_mentee_inbox?select=*&order=horas_sem_resposta_equipe.desc.nullslast'))
                 if not isinstance(inbox, list):
                     inbox = []
 
                 cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-                topics = supabase_request('GET',
-                    f'wa_topics?select=group_jid,sentiment&sentiment=in.(negativo,critico)'
-                    f'&last_message_at=gte.{cutoff}')
-                if not isinstance(topics, list):
-                    topics = []
-
-                neg_jids = {t['group_jid'] for t in topics if t.get('group_jid')}
+                try:
+                    neg_jids = {t['group_jid'] for t in pg_read('negative_topics', {'cutoff': cutoff}, lambda: supabase_iter(
+                        f'wa_topics?select=id,group_jid&sentiment=in.(negativo,critico)'
+                        f'&last_message_at=gte.{urllib.parse.quote(cutoff)}', key='id')) if t.get('group_jid')}
+                except SupabaseError as e:
+                    log_error('Triage', 'negative topics unavailable', e)
+                    neg_jids = set()
 
                 results = []
                 for m in inbox:
@@ -3713,12 +6517,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         Enriches system prompt with mentee context (fase, saúde, tópicos WA, notas recentes).
         Returns: { reply: str, context_used: bool }
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             mentee_id = body.get('mentee_id')
             user_message = (body.get('message') or '').strip()
             history = body.get('history') or []
@@ -3737,9 +6541,23 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
             if mentee_id:
                 try:
-                    # Mentee profile + inbox snapshot
-                    inbox = supabase_request('GET',
-                        f'vw_wa_mentee_inbox?mentorado_id=eq.{mentee_id}&limit=1')
+                    cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+                    inbox, topics, notes = gather(
+                        # Mentee profile + inbox snapshot
+                        lambda: supabase_request('GET',
+                            f'vw_wa_mentee_inbox?mentorado_id=eq.{mentee_id}&limit=1'),
+                        # Recent WA topics (last 5, last 7 days)
+                        lambda: supabase_request('GET',
+                            f'wa_topics?mentorado_id=eq.{mentee_id}'
+                            f'&last_message_at=gte.{urllib.parse.quote(cutoff)}'
+                            f'&order=last_message_at.desc&limit=5'
+                            f'&select=title,sentiment,message_count,last_message_at'),
+                        # Recent notes (last 3)
+                        lambda: supabase_request('GET',
+                            f'mentee_notes?mentorado_id=eq.{mentee_id}'
+                            f'&order=created_at.desc&limit=3'
+                            f'&select=tipo,conteudo,created_at'),
+                    )
                     if isinstance(inbox, list) and inbox:
                         m = inbox[0]
                         context_lines.append(f'Mentorado: {m.get("nome", "?")}')
@@ -3755,13 +6573,6 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                             sender = 'Equipe' if m.get('last_message_is_team') else m.get('nome', 'Mentorado')
                             context_lines.append(f'Última msg ({sender}): "{last_msg[:120]}"')
 
-                    # Recent WA topics (last 5, last 7 days)
-                    cutoff = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-                    topics = supabase_request('GET',
-                        f'wa_topics?mentorado_id=eq.{mentee_id}'
-                        f'&last_message_at=gte.{urllib.parse.quote(cutoff)}'
-                        f'&order=last_message_at.desc&limit=5'
-                        f'&select=title,sentiment,message_count,last_message_at')
                     if isinstance(topics, list) and topics:
                         context_lines.append('\nTópicos WA recentes (7 dias):')
                         for t in topics:
@@ -3769,11 +6580,6 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                             sent_label = f' [{sent}]' if sent and sent != 'neutral' else ''
                             context_lines.append(f'  • {t.get("title", "?")} ({t.get("message_count", 0)} msgs){sent_label}')
 
-                    # Recent notes (last 3)
-                    notes = supabase_request('GET',
-                        f'mentee_notes?mentorado_id=eq.{mentee_id}'
-                        f'&order=created_at.desc&limit=3'
-                        f'&select=tipo,conteudo,created_at')
                     if isinstance(notes, list) and notes:
                         context_lines.append('\nNotas recentes:')
                         for n in notes:
@@ -3830,28 +6636,32 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
             cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
 
-            # Fetch topic types (static lookup)
-            types = supabase_request('GET',
-                'wa_topic_types?select=id,slug,name,color,icon&order=sort_order.asc')
-            if not isinstance(types, list):
-                types = []
-            type_map = {t['id']: t for t in types}
-
             # Count topics per type within timeframe
-            qs = (f'wa_topics?select=type_id,status'
+            qs = (f'wa_topics?select=id,type_id'
                   f'&last_message_at=gte.{urllib.parse.quote(cutoff)}'
                   f'&type_id=not.is.null')
             if mentee_id:
                 qs += f'&mentorado_id=eq.{mentee_id}'
-            topics = supabase_request('GET', qs)
-            if not isinstance(topics, list):
-                topics = []
 
-            counts = {}
-            for t in topics:
-                tid = t.get('type_id')
-                if tid:
-                    counts[tid] = counts.get(tid, 0) + 1
+            def count_by_type():
+                counts = {}
+                for t in supabase_iter(qs, key='id'):
+                    tid = t.get('type_id')
+                    if tid:
+                        counts[tid] = counts.get(tid, 0) + 1
+                return counts
+
+            types, counts = gather(
+                # Topic types (static lookup)
+                lambda: supabase_request('GET',
+                    'wa_topic_types?select=id,slug,name,color,icon&order=sort_order.asc'),
+                count_by_type,
+            )
+            if isinstance(counts, Exception):
+                raise counts  # partial counts would be wrong, not just incomplete
+            if not isinstance(types, list):
+                types = []
+            type_map = {t['id']: t for t in types}
 
             result = []
             for tid, cnt in counts.items():
@@ -3879,7 +6689,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
           search:        ilike match on nome
           sort:          sla_desc (default) | unread_desc | last_message_desc
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -3913,7 +6723,8 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         if filters:
             query += '&' + '&'.join(filters)
 
-        result = supabase_request('GET', query)
+        result = pg_read('wa_inbox', {'health': health, 'fase': fase, 'search': search, 'sort': sort},
+                         lambda: supabase_request('GET', query))
         if isinstance(result, dict) and result.get('error'):
             self._send_json({'error': 'upstream error', 'detail': result.get('message', str(result))}, 502)
             return
@@ -3927,7 +6738,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         Uses PATCH-then-INSERT pattern (avoids custom Prefer header).
         """
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
         except Exception:
             self._send_json({'error': 'Invalid JSON'}, 400)
             return
@@ -4026,18 +6837,8 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     # ===== END WA DM v2 HANDLERS =====
 
-    def do_PATCH(self):
-        # bulk MUST come before individual to avoid /api/mentees/bulk matching UUID
-        if self.path == '/api/mentees/bulk':
-            self._handle_bulk_patch_mentees()
-        else:
-            _m = re.match(r'^/api/mentees/([0-9a-f-]+)$', self.path)
-            if _m:
-                self._handle_patch_mentee(_m.group(1))
-            else:
-                self._send_json({'error': 'Not found'}, 404)
     def _handle_delete_calendar_event(self):
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -4055,12 +6856,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         2. Create Google Calendar event with Zoom link
         3. Store in Supabase calls_mentoria
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
         except Exception:
             self._send_json({'error': 'Invalid JSON'}, 400)
             return
@@ -4152,12 +6953,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     # ===== INDIVIDUAL ENDPOINTS =====
     def _handle_create_zoom_meeting(self):
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             result = create_zoom_meeting(
                 topic=body.get('topic', 'Call Mentoria'),
                 start_time=body.get('start_time', ''),
@@ -4169,12 +6970,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self._send_json({'error': str(e)}, 500)
 
     def _handle_create_calendar_event(self):
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             result = create_calendar_event(
                 summary=body.get('summary', ''),
                 start_iso=body.get('start_iso') or body.get('start', ''),
@@ -4245,18 +7046,15 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Content-Type', content_type)
             if content_length:
                 self.send_header('Content-Length', content_length)
+            elif self.request_version == 'HTTP/1.1':
+                self.send_header('Transfer-Encoding', 'chunked')
             # Allow CORS from frontend
             self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
             self.send_header('Cache-Control', 'public, max-age=3600')
             self.end_headers()
 
             # Stream the file
-            chunk_size = 8192
-            while True:
-                chunk = response.read(chunk_size)
-                if not chunk:
-                    break
-                self.wfile.write(chunk)
+            self._relay_body(response, content_length)
 
             print(f'[Stream] Successfully streamed {key}')
 
@@ -4272,13 +7070,11 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     self.send_response(200)
                     self.send_header('Content-Type', ct)
                     if cl: self.send_header('Content-Length', cl)
+                    elif self.request_version == 'HTTP/1.1': self.send_header('Transfer-Encoding', 'chunked')
                     self.send_header('Access-Control-Allow-Origin', self._get_cors_origin())
                     self.send_header('Cache-Control', 'public, max-age=3600')
                     self.end_headers()
-                    while True:
-                        chunk = fb_resp.read(8192)
-                        if not chunk: break
-                        self.wfile.write(chunk)
+                    self._relay_body(fb_resp, cl)
                     print(f'[Stream] Fallback URL worked for {key}')
                     return
                 except Exception as fb_err:
@@ -4341,55 +7137,56 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
             email = payload.get('email', '')
 
             # Fetch mentees assigned to this consultant
-            mentees = supabase_request(
+            mentees = pg_read('portfolio_mentees', {'email': email}, lambda: supabase_request(
                 'GET',
                 f'mentorados?select=id,nome,email,instagram,fase_jornada,cohort,ativo,consultor_responsavel,whatsapp_7d,whatsapp_30d'
                 f'&ativo=eq.true&consultor_responsavel=eq.{urllib.parse.quote(email)}&order=nome'
-            )
+            ))
             if isinstance(mentees, dict) and 'error' in mentees:
                 self._send_json({'error': mentees['error']}, 500)
                 return
             if not isinstance(mentees, list):
                 mentees = []
 
-            # Fetch all wa_topics for health signals (one call, then group by mentee name)
-            topics_raw = supabase_request(
-                'GET',
-                'vw_wa_topic_board?select=group_jid,mentorado_nome,status,type_slug,last_message_at&order=last_message_at.desc'
-            )
+            # Health signals from wa_topics, paged and folded per mentee as they arrive:
+            # only this consultant's mentees, keeping aggregates + the 3 most recent topics
+            wanted = {m.get('nome', '') for m in mentees}
             topics_by_nome = {}
-            if isinstance(topics_raw, list):
-                for t in topics_raw:
+            try:
+                for t in pg_read('portfolio_topics', {'nomes': sorted(wanted)}, lambda: supabase_iter(
+                        'vw_wa_topic_board?select=id,group_jid,mentorado_nome,status,type_slug,last_message_at'
+                        '&order=last_message_at.desc.nullslast,id.desc')):
                     nome = t.get('mentorado_nome') or ''
-                    if nome not in topics_by_nome:
-                        topics_by_nome[nome] = []
-                    topics_by_nome[nome].append(t)
+                    if nome not in wanted:
+                        continue
+                    agg = topics_by_nome.setdefault(nome, {'recent': [], 'last_activity': None, 'negative': 0})
+                    if len(agg['recent']) < 3:
+                        t.pop('id', None)
+                        agg['recent'].append(t)
+                    lma = t.get('last_message_at')
+                    if lma and (agg['last_activity'] is None or lma > agg['last_activity']):
+                        agg['last_activity'] = lma
+                    if t.get('type_slug') in ('problema', 'risco', 'reclamacao', 'negativo'):
+                        agg['negative'] += 1
+            except SupabaseError as e:
+                log_error('Portfolio', 'topic signals unavailable', e)
+                topics_by_nome = {}
 
             now = datetime.now(timezone.utc)
             result = []
             for m in mentees:
-                nome = m.get('nome', '')
-                mtopics = topics_by_nome.get(nome, [])
+                agg = topics_by_nome.get(m.get('nome', ''), {'recent': [], 'last_activity': None, 'negative': 0})
 
                 unread_count = m.get('whatsapp_7d') or 0
-                last_activity = None
-                negative_topics = 0
-
-                for t in mtopics:
-                    lma = t.get('last_message_at')
-                    if lma:
-                        if last_activity is None or lma > last_activity:
-                            last_activity = lma
-                    if t.get('type_slug') in ('problema', 'risco', 'reclamacao', 'negativo'):
-                        negative_topics += 1
+                last_activity = agg['last_activity']
+                negative_topics = agg['negative']
 
                 # Health: green/yellow/red based on days since last activity
                 health = 'green'
@@ -4442,7 +7239,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                     'unread_count': unread_count,
                     'negative_topics': negative_topics,
                     'priority_score': priority,
-                    'recent_topics': mtopics[:3],
+                    'recent_topics': agg['recent'],
                 })
 
             # Sort by priority descending (snoozed go to bottom)
@@ -4455,7 +7252,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_get_mentees(self):
         result = get_mentees_with_email()
-        self._send_json(result if isinstance(result, list) else [result])
+        self._send_json(result if isinstance(result, list) else [result], etag=isinstance(result, list))
 
     def _handle_patch_mentee(self, mentee_id):
         """PATCH /api/mentees/{id} — update fase_jornada or snoozed_until"""
@@ -4464,14 +7261,13 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
 
             try:
-                body = json.loads(self._read_body())
+                body = self._read_json_body()
             except Exception:
                 self._send_json({'error': 'Invalid JSON'}, 400)
                 return
@@ -4518,14 +7314,13 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
 
             try:
-                body = json.loads(self._read_body())
+                body = self._read_json_body()
             except Exception:
                 self._send_json({'error': 'Invalid JSON'}, 400)
                 return
@@ -4564,14 +7359,13 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
 
             try:
-                body = json.loads(self._read_body())
+                body = self._read_json_body()
             except Exception:
                 self._send_json({'error': 'Invalid JSON'}, 400)
                 return
@@ -4613,8 +7407,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
@@ -4623,7 +7416,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 'GET',
                 f'mentee_notes?select=*&mentorado_id=eq.{mentee_id}&order=created_at.desc'
             )
-            self._send_json(notes if isinstance(notes, list) else [])
+            self._send_json_stream(notes if isinstance(notes, list) else [])
         except Exception as e:
             log_error('Notes', f'GET notes failed: {e}')
             self._send_json({'error': str(e)}, 500)
@@ -4635,15 +7428,14 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401)
                 return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
 
             email = payload.get('email', '')
 
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             tipo = body.get('tipo', '')
             valid_types = {'checkpoint_mensal', 'feedback_aula', 'registro_ligacao', 'livre', 'nota_livre'}
             if tipo not in valid_types:
@@ -4677,8 +7469,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            token = auth_header[7:]
-            if not verify_jwt_token(token):
+            if not self._auth_context().claims:
                 self._send_json({'error': 'Invalid token'}, 401); return
             groups = supabase_request('GET', 'mentee_groups?select=*,mentee_group_members(mentee_id)&order=nome.asc')
             if not isinstance(groups, list):
@@ -4689,7 +7480,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 g['member_count'] = len(members)
                 g['member_ids'] = [m['mentee_id'] for m in members]
                 result.append(g)
-            self._send_json(result)
+            self._send_json(result, etag=True)
         except Exception as e:
             log_error('Groups', f'GET groups failed: {e}')
             self._send_json({'error': str(e)}, 500)
@@ -4700,7 +7491,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            if not verify_jwt_token(auth_header[7:]):
+            if not self._auth_context().claims:
                 self._send_json({'error': 'Invalid token'}, 401); return
             members = supabase_request('GET', f'mentee_group_members?select=*&group_id=eq.{group_id}')
             self._send_json(members if isinstance(members, list) else [])
@@ -4714,11 +7505,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload:
                 self._send_json({'error': 'Invalid token'}, 401); return
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             nome = body.get('nome', '').strip()
             if not nome:
                 self._send_json({'error': 'nome is required'}, 400); return
@@ -4740,7 +7530,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            if not verify_jwt_token(auth_header[7:]):
+            if not self._auth_context().claims:
                 self._send_json({'error': 'Invalid token'}, 401); return
             supabase_request('DELETE', f'mentee_groups?id=eq.{group_id}')
             self._send_json({'ok': True})
@@ -4754,9 +7544,9 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            if not verify_jwt_token(auth_header[7:]):
+            if not self._auth_context().claims:
                 self._send_json({'error': 'Invalid token'}, 401); return
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             mentee_id = body.get('mentee_id')
             if not mentee_id:
                 self._send_json({'error': 'mentee_id required'}, 400); return
@@ -4772,7 +7562,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             auth_header = self.headers.get('Authorization', '')
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Unauthorized'}, 401); return
-            if not verify_jwt_token(auth_header[7:]):
+            if not self._auth_context().claims:
                 self._send_json({'error': 'Invalid token'}, 401); return
             supabase_request('DELETE', f'mentee_group_members?group_id=eq.{group_id}&mentee_id=eq.{mentee_id}')
             self._send_json({'ok': True})
@@ -4787,7 +7577,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_upcoming_calls(self):
         # Get ALL calls (not just scheduled), ordered by date DESC to show latest first
         result = supabase_request('GET', "calls_mentoria?select=*&order=data_call.desc&limit=500")
-        self._send_json(result if isinstance(result, list) else [result] if result else [])
+        self._send_json_stream(result if isinstance(result, list) else [result] if result else [])
 
     # ===== EVOLUTION PROXY =====
     def _resolve_evolution_apikey(self, target_path):
@@ -4821,7 +7611,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         req.add_header('apikey', apikey)
 
         try:
-            with urllib.request.urlopen(req, timeout=30) as resp:
+            with upstream_urlopen('evolution', req, timeout=30) as resp:
                 resp_body = resp.read()
                 self.send_response(resp.status)
                 self.send_header('Content-Type', 'application/json')
@@ -4829,6 +7619,8 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_header('Content-Length', len(resp_body))
                 self.end_headers()
                 self.wfile.write(resp_body)
+        except CircuitOpenError as e:
+            self._send_json({'error': str(e)}, 503)
         except urllib.error.HTTPError as e:
             error_body = e.read()
             self.send_response(e.code)
@@ -4867,7 +7659,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         if not auth_header.startswith('Bearer '):
             self._send_json({'error': 'Missing or invalid token'}, 401)
             return None
-        payload = verify_jwt_token(auth_header[7:])
+        payload = self._auth_context().claims
         if not payload or payload.get('type') == 'refresh':
             self._send_json({'error': 'Invalid or expired token'}, 401)
             return None
@@ -4906,7 +7698,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             return
 
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
         except Exception:
             self._send_json({'error': 'Invalid JSON'}, 400)
             return
@@ -5033,7 +7825,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_auth_register(self):
         """Register new user (Supabase-backed)"""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             email = body.get('email', '').strip().lower()
             password = body.get('password', '').strip()
             full_name = body.get('fullName', body.get('full_name', '')).strip()
@@ -5093,8 +7885,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self._send_json({'error': 'Missing or invalid token'}, 401)
                 return
 
-            token = auth_header[7:]
-            payload = verify_jwt_token(token)
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid or expired token'}, 401)
                 return
@@ -5102,10 +7893,10 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             user_id = payload.get('user_id')
             email = payload.get('email')
 
-            # Fetch fresh user data from DB
-            result = supabase_request('GET', f'auth_users?id=eq.{user_id}&select=id,email,full_name')
-            if isinstance(result, list) and len(result) > 0:
-                self._send_json({'user': result[0]})
+            # Fresh user data from DB (the request's AuthContext fetches it once)
+            member = self._auth_context().member
+            if member:
+                self._send_json({'user': {k: member.get(k) for k in ('id', 'email', 'full_name')}})
             else:
                 self._send_json({'user': {'id': user_id, 'email': email}})
         except Exception as e:
@@ -5115,7 +7906,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_auth_login(self):
         """Login user and issue JWT (Supabase-backed)"""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             email = body.get('email', '').strip().lower()
             password = body.get('password', '').strip()
 
@@ -5123,23 +7914,37 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self._send_json({'error': 'Email and password required'}, 400)
                 return
 
+            retry_in = _login_throttle.check(email, self._client_ip())
+            if retry_in:
+                self._send_json({'error': 'Too many login attempts, try again later'}, 429,
+                                headers={'Retry-After': str(retry_in)})
+                return
+
             result = supabase_request('GET', f'auth_users?email=eq.{email}&select=id,email,full_name,password_hash')
-            if not isinstance(result, list) or len(result) == 0:
+            if not isinstance(result, list):
+                # Lookup failed: not the caller's fault, so it doesn't count toward the account lockout
+                log_error('AUTH', f'User lookup failed: {getattr(result, "status_code", "?")}')
+                self._send_json({'error': 'Login temporarily unavailable'}, 503, headers={'Retry-After': '5'})
+                return
+            if len(result) == 0:
+                _login_throttle.failed(email)
                 self._send_json({'error': 'Invalid email or password'}, 401)
                 return
 
             row = result[0]
-            pw_result = verify_password(password, row['password_hash'])
+            pw_result = _password_pool.verify(password, row['password_hash'])
             if not pw_result:
+                _login_throttle.failed(email)
                 self._send_json({'error': 'Invalid email or password'}, 401)
                 return
+            _login_throttle.succeeded(email)
 
             user_id = row['id']
             db_email = row['email']
 
             # Lazy migration: upgrade legacy SHA-256 hash to bcrypt
             if pw_result == 'migrate' and _bcrypt:
-                new_hash = hash_password(password)
+                new_hash = _password_pool.hash(password)
                 supabase_request('PATCH', f'auth_users?id=eq.{user_id}', {'password_hash': new_hash})
                 print(f'[AUTH] Migrated password hash for user {user_id} to bcrypt')
             full_name = row.get('full_name', '')
@@ -5155,6 +7960,8 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 'refresh_token': refresh_token,
                 'expires_in': ACCESS_TOKEN_EXPIRY_MINUTES * 60
             }, 200)
+        except PasswordPoolBusy as e:
+            self._send_json({'error': str(e)}, 503, headers={'Retry-After': '2'})
         except Exception as e:
             log_error('AUTH', f'Login failed: {e}')
             self._send_json({'error': 'Login failed'}, 500)
@@ -5162,7 +7969,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_auth_refresh(self):
         """Refresh JWT token"""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             refresh_token = body.get('refresh_token', '').strip()
 
             if not refresh_token:
@@ -5199,7 +8006,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_auth_reset_password(self):
         """Handle password reset request — returns generic message to prevent email enumeration"""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             email = body.get('email', '').strip().lower()
 
             if not email:
@@ -5226,7 +8033,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def _handle_welcome_flow_register(self):
         """Register mentorado from welcome-flow wizard (public endpoint, no auth required)"""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             email = body.get('email', '').strip().lower()
             nome = body.get('nome', '').strip()
             whatsapp = body.get('whatsapp', '').strip()
@@ -5288,12 +8095,12 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_storage_process(self):
         """POST /api/storage/process — Trigger file processing pipeline."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
         except Exception:
             self._send_json({'error': 'Invalid JSON'}, 400)
             return
@@ -5303,22 +8110,28 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self._send_json({'error': 'arquivo_id is required'}, 400)
             return
 
-        # Process in background thread
-        def _bg():
-            try:
-                process_file_pipeline(arquivo_id)
-            except Exception as e:
-                log_error('Storage', f'Background processing failed: {e}')
-
-        t = threading.Thread(target=_bg, daemon=True)
-        t.start()
+        rows = supabase_request('GET', f'sp_arquivos?select=id,entidade_tipo,entidade_id'
+                                       f'&id=eq.{urllib.parse.quote(str(arquivo_id))}')
+        if isinstance(rows, list) and not rows:
+            self._send_json({'error': 'File not found'}, 404)
+            return
+        group = ingest_group(rows[0]) if isinstance(rows, list) else None
 
-        self._send_json({'status': 'processing', 'arquivo_id': arquivo_id})
+        try:
+            job, _ = get_ingest_executor().submit(arquivo_id, group)
+        except IngestionQueueFull as e:
+            self._send_json({'error': str(e)}, 503, headers={'Retry-After': '30'})
+            return
+        except (SupabaseError, sqlite3.Error) as e:
+            log_error('Storage', f'enqueue of {arquivo_id} failed', e)
+            self._send_json({'error': 'Ingestion queue unavailable'}, 503, headers={'Retry-After': '30'})
+            return
+        self._send_json({'status': job.state, 'arquivo_id': arquivo_id})
 
     def _handle_storage_search(self):
         """POST /api/storage/search — Semantic/keyword/hybrid search."""
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
         except Exception:
             self._send_json({'error': 'Invalid JSON'}, 400)
             return
@@ -5360,19 +8173,24 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         entidade_tipo = params.get('entidade_tipo', [None])[0]
         entidade_id = params.get('entidade_id', [None])[0]
 
-        query = 'sp_arquivos?select=*&deleted_at=is.null&order=created_at.desc'
+        query = 'sp_arquivos?select=*&deleted_at=is.null&order=created_at.desc,id.desc'
         if entidade_tipo:
             query += f'&entidade_tipo=eq.{entidade_tipo}'
         if entidade_id:
             query += f'&entidade_id=eq.{entidade_id}'
 
-        result = supabase_request('GET', query)
-        self._send_json(result if isinstance(result, list) else [])
+        try:
+            self._send_json_stream(supabase_iter(query))
+        except SupabaseError as e:
+            log_error('Storage', 'List files failed', e)
+            self._send_json([])
 
     def _handle_storage_status(self):
         """GET /api/storage/status — Storage overview (files, sizes, processing queue)."""
-        overview = supabase_request('GET', 'vw_storage_overview?select=*')
-        queue = supabase_request('GET', 'vw_processamento_fila?select=*&limit=20')
+        overview, queue = gather(
+            lambda: supabase_request('GET', 'vw_storage_overview?select=*'),
+            lambda: supabase_request('GET', 'vw_processamento_fila?select=*&limit=20'),
+        )
         self._send_json({
             'overview': overview if isinstance(overview, list) else [],
             'queue': queue if isinstance(queue, list) else [],
@@ -5407,18 +8225,18 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_storage_reprocess(self):
         """POST /api/storage/reprocess — Reprocess all files with status 'pendente' or 'erro'."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body()) if int(self.headers.get('Content-Length', 0)) > 0 else {}
+            body = self._read_json_body() if int(self.headers.get('Content-Length', 0)) > 0 else {}
         except Exception:
             body = {}
 
         status_filter = body.get('status', 'pendente')  # 'pendente', 'erro', or 'all'
 
-        query = 'sp_arquivos?select=id&deleted_at=is.null'
+        query = 'sp_arquivos?select=id,entidade_tipo,entidade_id&deleted_at=is.null'
         if status_filter == 'all':
             query += '&status_processamento=in.(pendente,erro)'
         else:
@@ -5429,21 +8247,56 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             self._send_json({'error': 'Failed to query files'}, 500)
             return
 
-        count = 0
-        for row in result:
-            def _bg(aid=row['id']):
-                try:
-                    process_file_pipeline(aid)
-                except Exception as e:
-                    log_error('Storage', f'Reprocess failed for {aid}: {e}')
-            t = threading.Thread(target=_bg, daemon=True)
-            t.start()
-            count += 1
-            # Stagger to avoid overwhelming OpenAI API
-            if count % 5 == 0:
-                time.sleep(1)
+        executor = get_ingest_executor()
+        count = rejected = 0
+        for i in range(0, len(result), INGEST_ENQUEUE_BATCH):
+            batch = [(row['id'], ingest_group(row)) for row in result[i:i + INGEST_ENQUEUE_BATCH]]
+            try:
+                created, full = executor.submit_many(batch)
+            except (SupabaseError, sqlite3.Error) as e:
+                # files from this batch on were not queued; what is already queued stays queued
+                log_error('Storage', f'reprocess enqueue failed after {count} files', e)
+                self._send_json({'error': 'Ingestion queue unavailable', 'queued': count,
+                                 'rejected': rejected + len(result) - i, 'status_filter': status_filter},
+                                503, headers={'Retry-After': '30'})
+                return
+            count += created
+            rejected += full
+
+        self._send_json({'queued': count, 'rejected': rejected, 'status_filter': status_filter})
+
+    def _handle_storage_queue(self):
+        """GET /api/storage/queue — Ingestion executor status (queued, running and recently failed jobs)."""
+        auth = self._auth_context().auth
+        if not auth:
+            self._send_json({'error': 'Auth required'}, 401)
+            return
+        self._send_json(get_ingest_executor().snapshot())
+
+    def _handle_storage_queue_cancel(self):
+        """POST /api/storage/queue/cancel — Cancel one file ({arquivo_id}) or everything ({all: true})."""
+        auth = self._auth_context().auth
+        if not auth:
+            self._send_json({'error': 'Auth required'}, 401)
+            return
+        try:
+            body = self._read_json_body()
+        except Exception:
+            self._send_json({'error': 'Invalid JSON'}, 400)
+            return
 
-        self._send_json({'queued': count, 'status_filter': status_filter})
+        if body.get('all'):
+            self._send_json({'cancelled': get_ingest_executor().cancel_all()})
+            return
+        arquivo_id = body.get('arquivo_id')
+        if not arquivo_id:
+            self._send_json({'error': 'arquivo_id or all is required'}, 400)
+            return
+        job = get_ingest_executor().cancel(arquivo_id)
+        if job is None:
+            self._send_json({'error': 'No queued or running job for this file'}, 404)
+            return
+        self._send_json({'arquivo_id': job.arquivo_id, 'state': job.state, 'cancel_requested': job.cancel_requested})
 
     # ===== BIBLIOTECA =====
 
@@ -5466,7 +8319,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 f'sp_documentos?id=eq.{doc_id}&select=*&limit=1',
             )
             if isinstance(result, list) and result:
-                self._send_json(result[0])
+                self._send_json(result[0], etag=_biblioteca_version(result[0]))
             else:
                 self._send_json({'error': 'Not found'}, 404)
             return
@@ -5479,7 +8332,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 f'sp_documentos?deep_link_slug=eq.{slug}&select=*&limit=1',
             )
             if isinstance(result, list) and result:
-                self._send_json(result[0])
+                self._send_json(result[0], etag=_biblioteca_version(result[0]))
             else:
                 self._send_json({'error': 'Not found'}, 404)
             return
@@ -5496,7 +8349,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             filters.append(f'tipo=eq.{tipo}')
         query = base + ('&' + '&'.join(filters) if filters else '') + '&order=mentee_nome,tipo,criado_em'
         result = supabase_request('GET', query)
-        self._send_json(result if isinstance(result, list) else [])
+        self._send_json(result if isinstance(result, list) else [], etag=isinstance(result, list))
 
     # ===== API KEYS MANAGEMENT =====
 
@@ -5507,7 +8360,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Admin JWT required'}, 401)
                 return
-            payload = verify_jwt_token(auth_header[7:])
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
@@ -5515,7 +8368,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self._send_json({'error': 'Admin role required to generate API keys'}, 403)
                 return
 
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             label = (body.get('label') or '').strip()
             if not label:
                 self._send_json({'error': 'label is required'}, 400)
@@ -5554,7 +8407,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Admin JWT required'}, 401)
                 return
-            payload = verify_jwt_token(auth_header[7:])
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
@@ -5576,7 +8429,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             if not auth_header.startswith('Bearer '):
                 self._send_json({'error': 'Admin JWT required'}, 401)
                 return
-            payload = verify_jwt_token(auth_header[7:])
+            payload = self._auth_context().claims
             if not payload or payload.get('type') == 'refresh':
                 self._send_json({'error': 'Invalid token'}, 401)
                 return
@@ -5586,6 +8439,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             result = supabase_request('PATCH',
                 f'api_keys?id=eq.{key_id}&select=id,label,active',
                 {'active': False})
+            _api_key_cache.revoke(key_id)
             if isinstance(result, list) and result:
                 self._send_json({'ok': True, 'key_id': key_id, 'revoked': True})
             else:
@@ -5600,19 +8454,19 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         """GET /api/wa/groups — List all tracked WA groups from Supabase."""
         try:
             result = supabase_request('GET', 'wa_groups?select=*&order=last_activity.desc.nullsfirst&is_active=eq.true')
-            self._send_json(result if isinstance(result, list) else [])
+            self._send_json(result if isinstance(result, list) else [], etag=isinstance(result, list))
         except Exception as e:
             log_error('WA-Groups', f'list failed: {e}', e)
             self._send_json({'error': str(e)}, 500)
 
     def _handle_wa_groups_sync(self):
         """POST /api/wa/groups/sync — Sync groups from Evolution API to Supabase."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             instance = body.get('instance', '').strip()
             if not instance:
                 self._send_json({'error': 'instance is required'}, 400)
@@ -5622,7 +8476,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             url = f'{EVOLUTION_BASE}/group/fetchAllGroups/{instance}?getParticipants=true'
             req = urllib.request.Request(url, method='GET')
             req.add_header('apikey', EVOLUTION_API_KEY)
-            with urllib.request.urlopen(req, timeout=30) as resp:
+            with upstream_urlopen('evolution', req, timeout=30) as resp:
                 groups = json.loads(resp.read())
 
             if not isinstance(groups, list):
@@ -5666,7 +8520,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_youtube_upload(self):
         """POST /api/youtube/upload — Upload Zoom recording to YouTube."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -5738,7 +8592,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_drive_sync(self):
         """POST /api/drive/sync — List Google Drive files for a mentorado folder."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -5834,7 +8688,7 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
 
     def _handle_weekly_summary(self):
         """POST /api/mentee/weekly-summary — Generate AI weekly summary for a mentorado."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -5845,33 +8699,32 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
                 self._send_json({'error': 'mentorado_id required'}, 400)
                 return
 
-            # Gather data from last 7 days
-            seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
-
-            # 1. Messages
-            messages = supabase_request('GET',
-                f'interacoes_mentoria?mentorado_id=eq.{mentorado_id}&created_at=gte.{seven_days_ago}'
-                f'&select=conteudo,categoria,sentimento,tipo_interacao,requer_resposta,respondido,sender_name,created_at'
-                f'&order=created_at.asc&limit=50')
-
-            # 2. Tasks
-            tasks = supabase_request('GET',
-                f'god_tasks?mentorado_id=eq.{mentorado_id}&updated_at=gte.{seven_days_ago}'
-                f'&select=titulo,status,tipo,responsavel,updated_at&limit=30')
-
-            # 3. Percepcoes
-            percs = supabase_request('GET',
-                f'percepcoes_mentorado?mentorado_id=eq.{mentorado_id}&created_at=gte.{seven_days_ago}'
-                f'&select=conteudo,tipo,autor,created_at&limit=10')
-
             if not GEMINI_API_KEY:
                 self._send_json({'error': 'GEMINI_API_KEY not configured'}, 501)
                 return
 
+            # Gather data from last 7 days
+            seven_days_ago = urllib.parse.quote((datetime.now(timezone.utc) - timedelta(days=7)).isoformat())
+            messages, tasks, percs = (r if isinstance(r, list) else [] for r in gather(
+                # 1. Messages
+                lambda: supabase_request('GET',
+                    f'interacoes_mentoria?mentorado_id=eq.{mentorado_id}&created_at=gte.{seven_days_ago}'
+                    f'&select=conteudo,categoria,sentimento,tipo_interacao,requer_resposta,respondido,sender_name,created_at'
+                    f'&order=created_at.asc&limit=50'),
+                # 2. Tasks
+                lambda: supabase_request('GET',
+                    f'god_tasks?mentorado_id=eq.{mentorado_id}&updated_at=gte.{seven_days_ago}'
+                    f'&select=titulo,status,tipo,responsavel,updated_at&limit=30'),
+                # 3. Percepcoes
+                lambda: supabase_request('GET',
+                    f'percepcoes_mentorado?mentorado_id=eq.{mentorado_id}&created_at=gte.{seven_days_ago}'
+                    f'&select=conteudo,tipo,autor,created_at&limit=10'),
+            ))
+
             # Build context
-            msg_texts = [f"[{m.get('categoria','?')}] {m.get('sender_name','?')}: {(m.get('conteudo',''))[:200]}" for m in (messages or [])]
-            task_texts = [f"[{t.get('status','')}] {t.get('titulo','')}" for t in (tasks or [])]
-            perc_texts = [f"[{p.get('tipo','')}] {p.get('conteudo','')}" for p in (percs or [])]
+            msg_texts = [f"[{m.get('categoria','?')}] {m.get('sender_name','?')}: {(m.get('conteudo',''))[:200]}" for m in messages]
+            task_texts = [f"[{t.get('status','')}] {t.get('titulo','')}" for t in tasks]
+            perc_texts = [f"[{p.get('tipo','')}] {p.get('conteudo','')}" for p in percs]
 
             prompt = f"""Gere um resumo semanal para o consultor sobre este mentorado.
 Seja direto, prático, em português. Máximo 300 palavras.
@@ -5897,17 +8750,13 @@ Dados da semana:
                 'contents': [{'parts': [{'text': prompt}]}],
                 'generationConfig': {'temperature': 0.3, 'maxOutputTokens': 800}
             }
-            conn = http.client.HTTPSConnection('generativelanguage.googleapis.com', timeout=30)
-            conn.request('POST',
-                         f'/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}',
-                         body=json.dumps(gemini_body).encode(),
-                         headers={'Content-Type': 'application/json'})
-            resp = conn.getresponse()
-            resp_data = resp.read()
-            conn.close()
+            status, resp_data = upstream_https('gemini', 'generativelanguage.googleapis.com', 'POST',
+                                               f'/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}',
+                                               body=json.dumps(gemini_body).encode(),
+                                               headers={'Content-Type': 'application/json'}, timeout=30)
 
-            if resp.status >= 400:
-                self._send_json({'error': f'Gemini error {resp.status}'}, 500)
+            if status >= 400:
+                self._send_json({'error': f'Gemini error {status}'}, 500)
                 return
 
             result = json.loads(resp_data)
@@ -5927,7 +8776,7 @@ Dados da semana:
 
     def _handle_tasks_from_audio(self):
         """POST /api/tasks/from-audio — Transcribe audio, extract N tasks via Gemini."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -5937,17 +8786,15 @@ Dados da semana:
                 self._send_json({'error': 'Expected multipart/form-data'}, 400)
                 return
 
-            # Parse multipart
-            import cgi
-            environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type}
-            form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ=environ)
-            audio_field = form['audio']
-            audio_bytes = audio_field.file.read()
-            filename = audio_field.filename or 'audio.webm'
-            mime_type = audio_field.type or 'audio/webm'
-
-            # Step 1: Transcribe via Whisper
-            transcript = openai_whisper(audio_bytes, filename, mime_type)
+            # Step 1: Transcribe via Whisper, streaming the spooled upload
+            with self._read_multipart() as form:
+                audio_field = form.get('audio')
+                if audio_field is None:
+                    self._send_json({'error': "Campo 'audio' ausente"}, 400)
+                    return
+                filename = audio_field.filename or 'audio.webm'
+                mime_type = audio_field.content_type or 'audio/webm'
+                transcript = openai_whisper(audio_field.file, filename, mime_type)
             if not transcript or len(transcript.strip()) < 10:
                 self._send_json({'error': 'Transcrição vazia ou muito curta', 'transcript': transcript}, 400)
                 return
@@ -6000,17 +8847,13 @@ Transcrição:
                 'contents': [{'parts': [{'text': extraction_prompt}]}],
                 'generationConfig': {'temperature': 0.1, 'responseMimeType': 'application/json'}
             }
-            conn = http.client.HTTPSConnection('generativelanguage.googleapis.com', timeout=30)
-            conn.request('POST',
-                         f'/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}',
-                         body=json.dumps(gemini_body).encode(),
-                         headers={'Content-Type': 'application/json'})
-            resp = conn.getresponse()
-            resp_data = resp.read()
-            conn.close()
+            status, resp_data = upstream_https('gemini', 'generativelanguage.googleapis.com', 'POST',
+                                               f'/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}',
+                                               body=json.dumps(gemini_body).encode(),
+                                               headers={'Content-Type': 'application/json'}, timeout=30)
 
-            if resp.status >= 400:
-                self._send_json({'error': f'Gemini error {resp.status}', 'detail': resp_data.decode()[:300]}, 500)
+            if status >= 400:
+                self._send_json({'error': f'Gemini error {status}', 'detail': resp_data.decode()[:300]}, 500)
                 return
 
             gemini_result = json.loads(resp_data)
@@ -6029,6 +8872,8 @@ Transcrição:
                 'tasks': tasks,
                 'count': len(tasks),
             })
+        except MultipartError as e:
+            self._send_json({'error': str(e)}, 400)
         except Exception as e:
             print(f'[tasks-from-audio] Error: {e}')
             self._send_json({'error': str(e)}, 500)
@@ -6038,26 +8883,27 @@ Transcrição:
         Accepts JSON { arquivo_url } or multipart with 'audio' field.
         Returns { transcricao }.
         """
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
+        form = None
         try:
             content_type = self.headers.get('Content-Type', '')
 
             if 'multipart/form-data' in content_type:
-                # Direct audio blob upload
-                import cgi
-                environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type}
-                form = cgi.FieldStorage(fp=self.rfile, headers=self.headers, environ=environ)
-                audio_field = form['audio']
-                audio_bytes = audio_field.file.read()
+                # Direct audio blob upload — spooled, handed to Whisper as a file
+                form = self._read_multipart()
+                audio_field = form.get('audio')
+                if audio_field is None:
+                    self._send_json({'error': "Campo 'audio' ausente"}, 400)
+                    return
+                audio_bytes = audio_field.file
                 filename = audio_field.filename or 'audio.webm'
-                mime_type = audio_field.type or 'audio/webm'
+                mime_type = audio_field.content_type or 'audio/webm'
             else:
                 # JSON body with arquivo_url
-                length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(length)
+                body = self._read_body()
                 import json as _json
                 payload = _json.loads(body)
                 arquivo_url = payload.get('arquivo_url')
@@ -6094,13 +8940,18 @@ Transcrição:
                 return
 
             self._send_json({'transcricao': transcricao.strip()})
+        except MultipartError as e:
+            self._send_json({'error': str(e)}, 400)
         except Exception as e:
             print(f'[context-transcribe] Error: {e}')
             self._send_json({'error': str(e)}, 500)
+        finally:
+            if form is not None:
+                form.close()
 
     def _handle_task_notify(self):
         """POST /api/tasks/notify — Send WhatsApp notification when a task is created."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
@@ -6153,12 +9004,12 @@ Transcrição:
 
     def _handle_wa_groups_create(self):
         """POST /api/wa/groups/create — Create a new WA group via Evolution API."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             instance = body.get('instance', '').strip()
             subject = body.get('subject', '').strip()
             participants = body.get('participants', [])  # list of phone numbers
@@ -6174,7 +9025,7 @@ Transcrição:
             req = urllib.request.Request(url, data=payload, method='POST')
             req.add_header('Content-Type', 'application/json')
             req.add_header('apikey', EVOLUTION_API_KEY)
-            with urllib.request.urlopen(req, timeout=30) as resp:
+            with upstream_urlopen('evolution', req, timeout=30) as resp:
                 result = json.loads(resp.read())
 
             group_jid = result.get('id') or result.get('jid', '')
@@ -6206,12 +9057,12 @@ Transcrição:
 
     def _handle_wa_group_link(self, group_id):
         """POST /api/wa/groups/{id}/link — Link a WA group to a mentorado."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Auth required'}, 401)
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             mentorado_id = body.get('mentorado_id')
             if mentorado_id is None:
                 self._send_json({'error': 'mentorado_id is required'}, 400)
@@ -6247,7 +9098,7 @@ Transcrição:
 
     def _wa_require_auth(self):
         """Require JWT auth for WA endpoints. Returns auth dict or None (sends 401)."""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return None
@@ -6263,7 +9114,7 @@ Transcrição:
         req = urllib.request.Request(url, data=body, method='POST')
         req.add_header('Content-Type', 'application/json')
         req.add_header('apikey', EVOLUTION_API_KEY)
-        with urllib.request.urlopen(req, timeout=15) as resp:
+        with upstream_urlopen('evolution', req, timeout=15) as resp:
             return json.loads(resp.read())
 
     def _wa_send_media_via_evolution(self, instance, number, media_type, media_url, caption='', media_name=''):
@@ -6283,7 +9134,7 @@ Transcrição:
         req = urllib.request.Request(url, data=body, method='POST')
         req.add_header('Content-Type', 'application/json')
         req.add_header('apikey', EVOLUTION_API_KEY)
-        with urllib.request.urlopen(req, timeout=30) as resp:
+        with upstream_urlopen('evolution', req, timeout=30) as resp:
             return json.loads(resp.read())
 
     def _wa_insert_message(self, message_id, group_jid, sender_name, content_type, content_text,
@@ -6372,7 +9223,7 @@ Transcrição:
         if not auth:
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             number = body.get('number', '').strip()
             text = body.get('text', '').strip()
             instance = body.get('instance', '').strip()
@@ -6423,7 +9274,7 @@ Transcrição:
         if not auth:
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             number = body.get('number', '').strip()
             instance = body.get('instance', '').strip()
             group_jid = body.get('group_jid', '').strip()
@@ -6473,7 +9324,7 @@ Transcrição:
         if not auth:
             return
         try:
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             number = body.get('number', '').strip()
             text = body.get('text', '').strip()
             instance = body.get('instance', '').strip()
@@ -6665,11 +9516,11 @@ Transcrição:
     def _handle_fabric_run(self):
         """POST /api/fabric/run — Run a Fabric pattern on input text"""
         try:
-            auth = check_auth_any(self.headers)
+            auth = self._auth_context().auth
             if not auth:
                 self._send_json({'error': 'Authentication required'}, 401)
                 return
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             pattern = body.get('pattern', '').strip()
             input_text = body.get('input', '').strip()
             model = body.get('model', 'claude-sonnet-4-20250514')
@@ -6745,7 +9596,7 @@ Transcrição:
                     data=json.dumps(payload).encode(),
                     headers={'Content-Type': 'application/json'},
                     method='POST')
-                with urllib.request.urlopen(req, timeout=120) as resp:
+                with upstream_urlopen('gemini', req, timeout=120) as resp:
                     result = json.loads(resp.read())
 
                 output = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
@@ -6775,11 +9626,11 @@ Transcrição:
     def _handle_ragas_evaluate(self):
         """POST /api/dossie/evaluate — Run RAGAS quality evaluation on a dossiê"""
         try:
-            auth = check_auth_any(self.headers)
+            auth = self._auth_context().auth
             if not auth:
                 self._send_json({'error': 'Authentication required'}, 401)
                 return
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             dossie_text = body.get('dossie', '').strip()
             source_texts = body.get('sources', [])
             mentorado_id = body.get('mentorado_id')
@@ -6865,7 +9716,7 @@ Transcrição:
     # ===== AUTOMATIONS EVALUATE (Dragon 16) =====
     def _handle_automations_evaluate(self):
         """POST /api/automations/evaluate — Trigger manual evaluation of all automations"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -6877,7 +9728,7 @@ Transcrição:
     # ===== WEBHOOK OUTGOING TEST (Dragon 17) =====
     def _handle_webhook_outgoing_test(self):
         """POST /api/webhooks/outgoing/test — Test outgoing webhook delivery (auth + SSRF guard)"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -6947,7 +9798,7 @@ Transcrição:
     # ===== RECURRING TASKS PROCESS (Dragon 18) =====
     def _handle_process_recurring(self):
         """POST /api/tasks/process-recurring — Manually trigger recurring task creation"""
-        auth = check_auth_any(self.headers)
+        auth = self._auth_context().auth
         if not auth:
             self._send_json({'error': 'Authentication required'}, 401)
             return
@@ -6961,11 +9812,11 @@ Transcrição:
     def _handle_dossie_generate(self):
         """POST /api/dossie/generate — Trigger autonomous dossiê generation pipeline"""
         try:
-            auth = check_auth_any(self.headers)
+            auth = self._auth_context().auth
             if not auth:
                 self._send_json({'error': 'Authentication required'}, 401)
                 return
-            body = json.loads(self._read_body())
+            body = self._read_json_body()
             mentorado_id = body.get('mentorado_id')
             dossie_type = body.get('type', 'oferta')  # oferta, posicionamento, funil
 
@@ -7016,8 +9867,326 @@ Transcrição:
             print(f'[API] {args[0]}')
 
 
+# ===== ASYNCIO ENGINE (SERVER_MODE=asyncio) =====
+# One event loop owns every socket; idle/keep-alive connections are coroutines,
+# not threads. Routes registered with @async_route run natively on the loop with
+# the non-blocking upstream client below. Everything else goes through the
+# legacy adapter: the raw request is replayed into ProxyHandler on a worker
+# thread against in-memory buffers, so do_GET/do_POST keep working unchanged.
+# Request bodies are checked against the matched route's body_limit before a
+# byte is read (chunked ones while they stream), must arrive within
+# ASYNC_BODY_TIMEOUT, and are spooled like multipart parts: RAM up to
+# MULTIPART_SPOOL_BYTES, then a temp file.
+ASYNC_IDLE_TIMEOUT = int(os.environ.get('ASYNC_IDLE_TIMEOUT', '30'))
+ASYNC_BODY_TIMEOUT = int(os.environ.get('ASYNC_BODY_TIMEOUT', '300'))  # whole request body, seconds
+ASYNC_MAX_KEEPALIVE = int(os.environ.get('ASYNC_MAX_KEEPALIVE', '1000'))
+ASYNC_MAX_HEADER_BYTES = 64 * 1024
+ASYNC_READ_CHUNK_BYTES = 64 * 1024
+_ASYNC_SSL_CTX = ssl.create_default_context()
+_ASYNC_ROUTES = {}
+
+
+def async_route(method, path):
+    """Register a coroutine handler for an exact (method, path) on the asyncio engine."""
+    def decorator(fn):
+        _ASYNC_ROUTES[(method, path)] = fn
+        return fn
+    return decorator
+
+
+class AsyncRequest:
+    """Parsed request handed to native coroutine routes."""
+    __slots__ = ('method', 'path', 'query', 'version', 'headers', 'body', 'client_address')
+
+    def __init__(self, method, target, version, headers, body, client_address):
+        self.method = method
+        self.path, _, self.query = target.partition('?')
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.client_address = client_address
+
+    def json(self):
+        return json.loads(self.body) if self.body else {}
+
+
+def json_response(request, data, status=200):
+    """Build the (status, headers, body) triple native routes return — same wire format as _send_json."""
+    body, encoding = compress_body(json_dumps(data), request.headers.get('Accept-Encoding', ''))
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': cors_origin(request.headers.get('Origin', '')),
+        'Vary': 'Accept-Encoding',
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return status, headers, body
+
+
+async def _async_read_head(reader):
+    """Read a request/status line + headers. Returns (first_line, HTTPMessage, raw_head_bytes)."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    first_line, _, header_bytes = head.partition(b'\r\n')
+    return first_line.decode('latin-1'), http.client.parse_headers(io.BytesIO(header_bytes)), head
+
+
+class AsyncBodyTooLarge(ValueError):
+    pass
+
+
+async def _async_read_body(reader, headers, sink, until_eof=False, limit=None):
+    """Stream a message body (chunked / Content-Length / until EOF) into sink, a writable
+    binary file, in ASYNC_READ_CHUNK_BYTES slices. Returns the size. Raises
+    AsyncBodyTooLarge past limit — before reading anything when Content-Length says so."""
+    size = 0
+
+    def account(n):
+        nonlocal size
+        if n < 0:
+            raise ValueError('negative body length')
+        size += n
+        if limit is not None and size > limit:
+            raise AsyncBodyTooLarge(f'Request body too large (max {limit} bytes)')
+
+    async def copy(n):
+        account(n)
+        while n:
+            part = await reader.readexactly(min(n, ASYNC_READ_CHUNK_BYTES))
+            sink.write(part)
+            n -= len(part)
+
+    if 'chunked' in (headers.get('Transfer-Encoding') or '').lower():
+        while True:
+            size_line = await reader.readline()
+            n = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+            if n == 0:
+                await reader.readline()  # trailing CRLF (no trailers expected)
+                return size
+            await copy(n)
+            await reader.readexactly(2)
+    length = headers.get('Content-Length')
+    if length is not None:
+        await copy(int(length))
+    elif until_eof:
+        while True:
+            part = await reader.read(ASYNC_READ_CHUNK_BYTES)
+            if not part:
+                break
+            account(len(part))
+            sink.write(part)
+    return size
+
+
+async def async_http_request(host, method, path, headers=None, body=None, timeout=30, port=443):
+    """Non-blocking HTTPS/1.1 request (one connection per call). Returns (status, headers, body)."""
+    async def _do():
+        reader, writer = await asyncio.open_connection(host, port, ssl=_ASYNC_SSL_CTX, server_hostname=host)
+        try:
+            lines = [f'{method} {path} HTTP/1.1', f'Host: {host}', 'Connection: close', 'Accept-Encoding: identity']
+            lines += [f'{k}: {v}' for k, v in (headers or {}).items()]
+            lines.append(f'Content-Length: {len(body) if body else 0}')
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b''))
+            await writer.drain()
+            status_line, resp_headers, _ = await _async_read_head(reader)
+            status = int(status_line.split(' ', 2)[1])
+            resp_body = io.BytesIO()
+            await _async_read_body(reader, resp_headers, resp_body, until_eof=True)
+            return status, resp_headers, resp_body.getvalue()
+        finally:
+            writer.close()
+    return await asyncio.wait_for(_do(), timeout)
+
+
+async def async_supabase_request(method, path, body=None, _retries=3, _backoff=1.0):
+    """Coroutine twin of supabase_request — same SList/SDict/SupabaseResponse return types."""
+    key = SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY
+    if not key:
+        return SupabaseResponse({'error': 'Supabase key not configured'}, 500)
+    headers = {
+        'apikey': key,
+        'Authorization': f'Bearer {key}',
+        'Content-Type': 'application/json',
+        'Prefer': 'return=representation',
+    }
+    data = json.dumps(body).encode() if body else None
+    last_error = None
+    for attempt in range(_retries):
+        try:
+            status, _, resp_body = await async_http_request(
+                SUPABASE_HOST, method, f'/rest/v1/{path}', headers, data, timeout=15)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            last_error = SupabaseResponse({'error': str(e) or type(e).__name__}, 503)
+        else:
+            if status in (200, 201):
+                return _wrap_supabase_payload(resp_body, status)
+            if status == 204:
+                return SDict204()
+            last_error = SupabaseResponse({'error': f'Supabase {status}: {resp_body.decode()}'}, status)
+            if status not in (503, 429, 500, 502, 504):
+                return last_error
+        if attempt < _retries - 1:
+            await asyncio.sleep(_backoff * (2 ** attempt))
+    log_error('Supabase', f'[async] Todas as {_retries} tentativas falharam', None)
+    return last_error
+
+
+class _BufferedHandlerMixin:
+    """Runs a stdlib request handler against buffers instead of a socket: the request
+    is a rewound file holding head + body (see AsyncHTTPEngine._handle_connection)."""
+
+    def setup(self):
+        self.connection = None
+        self.rfile = self.request
+        self.wfile = io.BytesIO()
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()  # exactly one request; the engine owns the connection loop
+
+    def finish(self):
+        pass
+
+
+class AsyncHTTPEngine:
+    """asyncio HTTP front end: native @async_route coroutines + legacy ProxyHandler adapter.
+
+    Mirrors the HTTPServer surface used at startup (serve_forever/server_close).
+    Legacy responses are buffered in memory, so streaming routes (/api/media/stream)
+    are best left on SERVER_MODE=pool until they are ported. Request bodies are not:
+    they are held to the route's body_limit and spooled (MULTIPART_SPOOL_BYTES).
+    """
+
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS, route_caps=None):
+        self.server_address = server_address
+        self.RequestHandlerClass = handler_class
+        self._legacy_class = type(f'Buffered{handler_class.__name__}', (_BufferedHandlerMixin, handler_class), {})
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='legacy-route')
+        self.route_caps = RouteConcurrencyCaps(route_caps or ROUTE_CONCURRENCY_CAPS)
+        self.stats = {'connections': 0, 'native': 0, 'legacy': 0}
+        self._idle = 0  # connections parked waiting for their next request
+        self._loop = None
+        self._server = None
+
+    def acquire_route_slot(self, path):
+        return self.route_caps.acquire(path)
+
+    def acquire_keepalive(self, held):
+        return True  # idle connections are coroutines; the engine enforces ASYNC_MAX_KEEPALIVE
+
+    def _run_legacy(self, request_file, client_address):
+        """Returns (response_bytes, close_connection)."""
+        handler = self._legacy_class(request_file, client_address, self)
+        return handler.wfile.getvalue(), handler.close_connection
+
+    async def _handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        peer = writer.get_extra_info('peername') or ('', 0)
+        try:
+            while True:
+                self._idle += 1
+                try:
+                    request_line, headers, raw_head = await asyncio.wait_for(
+                        _async_read_head(reader), ASYNC_IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError, ValueError):
+                    return
+                finally:
+                    self._idle -= 1
+                try:
+                    method, target, version = request_line.split()
+                except ValueError:
+                    writer.write(b'HTTP/1.0 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                    return
+
+                route = _ASYNC_ROUTES.get((method, target.split('?', 1)[0]))
+                found = ROUTER.match(method, target) if route is None else None
+                body = tempfile.SpooledTemporaryFile(max_size=MULTIPART_SPOOL_BYTES)
+                try:
+                    if route is None:
+                        body.write(raw_head)  # the legacy handler parses head + body from one file
+                    try:
+                        await asyncio.wait_for(
+                            _async_read_body(reader, headers, body,
+                                             limit=found[0].body_limit if found else ROUTE_DEFAULT_BODY_LIMIT),
+                            ASYNC_BODY_TIMEOUT)
+                    except AsyncBodyTooLarge as e:
+                        out = json_dumps({'error': str(e)})
+                        writer.write(b'HTTP/1.1 413 Payload Too Large\r\nContent-Type: application/json\r\n'
+                                     b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(out), out))
+                        await writer.drain()
+                        return
+                    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                            ConnectionError, ValueError):
+                        return
+                    body.seek(0)
+                    if route is None:
+                        # Legacy adapter: ProxyHandler decides keep-alive exactly as in pool mode.
+                        self.stats['legacy'] += 1
+                        out, close = await self._loop.run_in_executor(self._executor, self._run_legacy, body, peer)
+                        writer.write(out)
+                        await writer.drain()
+                        if close:
+                            return
+                        continue
+                    body_bytes = body.read()
+                finally:
+                    body.close()
+
+                self.stats['native'] += 1
+                request = AsyncRequest(method, target, version, headers, body_bytes, peer)
+                try:
+                    status, resp_headers, resp_body = await route(request)
+                except Exception as e:
+                    log_error('AsyncEngine', f'{method} {target} failed: {e}', e)
+                    status, resp_headers, resp_body = json_response(request, {'error': str(e)}, 500)
+                keep_alive = (version == 'HTTP/1.1' and (headers.get('Connection') or '').lower() != 'close'
+                              and self._idle < ASYNC_MAX_KEEPALIVE)
+                lines = [f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}']
+                lines += [f'{k}: {v}' for k, v in resp_headers.items()]
+                lines.append(f'Content-Length: {len(resp_body)}')
+                lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + resp_body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        host, port = self.server_address
+        self._server = await asyncio.start_server(
+            self._handle_connection, host or None, port,
+            limit=ASYNC_MAX_HEADER_BYTES, reuse_address=True, backlog=512)
+        async with self._server:
+            await self._server.serve_forever()
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    def server_close(self):
+        self._executor.shutdown(wait=False)
+
+
+# ----- Native coroutine routes (ported one at a time from ProxyHandler) -----
+
+@async_route('GET', '/api/calls/upcoming')
+async def _async_upcoming_calls(request):
+    """GET /api/calls/upcoming — coroutine port of ProxyHandler._handle_upcoming_calls"""
+    result = await async_supabase_request('GET', 'calls_mentoria?select=*&order=data_call.desc&limit=500')
+    return json_response(request, result if isinstance(result, list) else [result] if result else [])
+
+
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if STATIC_MODE == 'memory' and os.path.isdir(STATIC_ROOT):
+        STATIC_ASSETS = StaticAssetStore(STATIC_ROOT).load()
 
     # Print status
     print(f'[Spalla] Server running at http://localhost:{PORT}')
@@ -7025,6 +10194,7 @@ if __name__ == '__main__':
     print(f'[Spalla] GCal:     {"✓ service account found" if os.path.exists(GOOGLE_SA_PATH) else "✗ no service account"}')
     print(f'[Spalla] Supabase: {"✓ configured" if SUPABASE_SERVICE_KEY or SUPABASE_ANON_KEY else "✗ set SUPABASE_SERVICE_KEY"}')
     print(f'[Spalla] Evolution: {"✓ configured" if EVOLUTION_API_KEY else "✗ set EVOLUTION_API_KEY"}')
+    print(f'[Spalla] Reads:    {"✓ direct Postgres for hot paths" if _pg_pool is not None else "PostgREST"}')
     print(f'[Spalla] JWT:      {"✓ secret from env" if os.environ.get("JWT_SECRET") else "⚠ ephemeral key (set JWT_SECRET)"}')
     print(f'[Spalla] Bcrypt:   {"✓ installed" if _bcrypt else "⚠ not installed (using SHA-256)"}')
     print(f'[Spalla] Proxy:    /api/evolution/*')
@@ -7059,6 +10229,24 @@ if __name__ == '__main__':
     sync_thread.start()
     print(f'[Spalla] Sheets sync: background thread started (every 6h, first in 30s)')
 
+    threading.Thread(target=_api_key_usage_loop, daemon=True).start()
+    atexit.register(_api_key_usage.flush)
+
+    def _on_sigterm(signum, frame):
+        """docker stop / a rollout sends SIGTERM to PID 1, whose default action skips atexit."""
+        try:
+            _api_key_usage.flush()
+        finally:
+            sys.exit(0)
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    print(f'[Spalla] API key usage: flushed every {API_KEY_USAGE_FLUSH_SECONDS}s')
+
+    ingest_executor = get_ingest_executor()
+    ingest_executor.start()
+    threading.Thread(target=resume_stuck_ingestion, daemon=True).start()
+    print(f'[Spalla] Ingestion: {ingest_executor.counters()["backend"]} queue, {ingest_executor.workers} workers'
+          f' (resuming files left mid-pipeline)')
+
     # ── Dragon 16: Automation cron background thread ──
     def _automations_cron():
         """Evaluate time-based automations every 5 minutes (idempotent + per-automation scope)"""
@@ -7366,7 +10554,7 @@ if __name__ == '__main__':
                                 data=cu_body,
                                 headers={'Authorization': token, 'Content-Type': 'application/json'},
                                 method='PUT')
-                            urllib.request.urlopen(req, timeout=15)
+                            upstream_urlopen('clickup', req, timeout=15)
                             supabase_request('PATCH',
                                 f"/rest/v1/god_tasks?id=eq.{task['id']}",
                                 body={'clickup_synced_at': datetime.now(timezone.utc).isoformat()})
@@ -7382,7 +10570,13 @@ if __name__ == '__main__':
     cu_sync_thread.start()
     print(f'[Spalla] ClickUp auto-sync: thread started (every 10min)')
 
-    server = ReuseAddrHTTPServer(('', PORT), ProxyHandler)
+    server = make_http_server(('', PORT), ProxyHandler)
+    if isinstance(server, PoolHTTPServer):
+        print(f'[Spalla] HTTP:     worker pool ({SERVER_WORKERS} workers, queue {SERVER_QUEUE_DEPTH}, {len(ROUTE_CONCURRENCY_CAPS)} capped routes)')
+    elif isinstance(server, AsyncHTTPEngine):
+        print(f'[Spalla] HTTP:     asyncio engine ({len(_ASYNC_ROUTES)} native routes, {SERVER_WORKERS} legacy workers)')
+    else:
+        print('[Spalla] HTTP:     single-threaded (SERVER_MODE=single)')
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -7442,7 +7442,7 @@ this._buildNotifications(); // F2.5 — refresh notification bell after tasks lo
         const res = await fetch(`${CONFIG.API_BASE}/api/clickup/import-all`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: '{}' });
         const json = await res.json();
         if (!res.ok) { this.toast(json.error || 'Erro ao importar', 'error'); return; }
-        this.toast(`Importadas: ${json.imported}, Atualizadas: ${json.updated}`, 'success');
+        this.toast(`Importadas/atualizadas: ${json.upserted}${json.errors ? `, erros: ${json.errors}` : ''}`, 'success');
         await this.loadTasks();
       } catch (e) { this.toast('Erro de conexao', 'error'); }
       finally { this.ui.syncingSubtasks = false; }
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark — insert de chunks: um POST por linha vs supabase_bulk_insert
+========================================================================
+
+Sobe um PostgREST falso local (latência fixa por request + custo por linha,
+arrays aplicados de forma atômica como no PostgREST real) e insere
+BENCH_ROWS linhas no formato de sp_chunks (embedding 1024-d como string
+pgvector) de duas formas:
+  - per-row: supabase_request('POST', 'sp_chunks', row) em loop (antes)
+  - bulk:    supabase_bulk_insert('sp_chunks', rows)          (depois)
+
+Algumas linhas são inválidas de propósito (BENCH_BAD_ROWS): o bulk deve
+isolá-las por bisseção e inserir todas as outras.
+
+Uso:
+  python scripts/bench_bulk_insert.py
+  BENCH_ROWS=1000 BENCH_LATENCY_MS=40 python scripts/bench_bulk_insert.py
+"""
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+ROWS = int(os.environ.get('BENCH_ROWS', '300'))
+LATENCY_MS = float(os.environ.get('BENCH_LATENCY_MS', '20'))
+PER_ROW_MS = float(os.environ.get('BENCH_PER_ROW_MS', '0.2'))
+BAD_ROWS = int(os.environ.get('BENCH_BAD_ROWS', '3'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+random.seed(5)
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    stored = []
+    requests = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        rows = body if isinstance(body, list) else [body]
+        FakePostgREST.requests += 1
+        time.sleep((LATENCY_MS + PER_ROW_MS * len(rows)) / 1000)
+        if any(r.get('token_count') is None for r in rows):  # NOT NULL violation aborts the whole array
+            out, status = b'{"code":"23502","message":"null value in column \\"token_count\\""}', 400
+        else:
+            FakePostgREST.stored.extend(rows)
+            minimal = 'return=minimal' in (self.headers.get('Prefer') or '')
+            out, status = (b'' if minimal else json.dumps(rows).encode()), 201
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def chunk_rows(n):
+    bad = set(random.sample(range(n), min(BAD_ROWS, n)))
+    return [{
+        'arquivo_id': 'a1', 'conteudo_id': 'c1', 'texto': f'Trecho {i} do documento de oferta. ' * 20,
+        'chunk_index': i, 'token_count': None if i in bad else 150,
+        'embedding': '[' + ','.join(f'{random.uniform(-1, 1):.6f}' for _ in range(1024)) + ']',
+        'chunk_tipo': 'standard', 'arquivo_nome': 'oferta.pdf', 'entidade_tipo': 'mentorado',
+        'entidade_id': '42', 'categoria': 'dossie', 'mentorado_id': 42, 'mentorado_nome': 'Mentorado 42',
+    } for i in range(n)], bad
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', 4, port=upstream.server_address[1],
+                                            connection_class=http.client.HTTPConnection)
+    rows, bad = chunk_rows(ROWS)
+    print(f'[bench] {ROWS} sp_chunks rows ({len(bad)} invalid), upstream {LATENCY_MS}ms/request '
+          f'+ {PER_ROW_MS}ms/row, batch={srv.SUPABASE_BULK_BATCH_SIZE}')
+
+    FakePostgREST.stored, FakePostgREST.requests = [], 0
+    t0 = time.perf_counter()
+    ok = sum(1 for row in rows if srv.supa_ok(srv.supabase_request('POST', 'sp_chunks', row, _retries=1)))
+    per_row = time.perf_counter() - t0
+    print(f'  per-row  {per_row * 1000:8.0f} ms  requests={FakePostgREST.requests:4d}  inserted={ok}')
+
+    FakePostgREST.stored, FakePostgREST.requests = [], 0
+    t0 = time.perf_counter()
+    outcome = srv.supabase_bulk_insert('sp_chunks', rows)
+    bulk = time.perf_counter() - t0
+    print(f'  bulk     {bulk * 1000:8.0f} ms  requests={FakePostgREST.requests:4d}  inserted={outcome["inserted"]}  '
+          f'failed={sorted(e["index"] for e in outcome["errors"])}')
+    print(f'  speedup  {per_row / bulk:5.1f}x')
+
+    upstream.shutdown()
+    isolated = {e['index'] for e in outcome['errors']} == bad and len(FakePostgREST.stored) == ROWS - len(bad)
+    return 0 if isolated else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark — bytes on wire e custo de CPU da compressão de respostas JSON
+=========================================================================
+
+Gera payloads realistas das rotas mais pesadas e mede, para cada encoding
+(identity, gzip em vários níveis, br se o pacote brotli estiver instalado):
+tamanho final, taxa de compressão e ms de CPU por resposta. Mede também o
+custo de um hit no cache de compressed bytes do compress_body().
+
+  /api/calls/upcoming   calls_mentoria?select=*&limit=500
+  /api/wa/inbox         vw_wa_mentee_inbox?select=*
+  /api/biblioteca/{id}  documento com conteudo_md completo
+
+Uso:
+  python scripts/bench_compression.py
+  BENCH_ROUNDS=50 python scripts/bench_compression.py
+"""
+import gzip
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '20'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+random.seed(7)
+NOMES = ['Ana Paula', 'Bruno Lima', 'Carla Souza', 'Daniel Rocha', 'Elisa Martins', 'Felipe Alves']
+STATUS = ['agendada', 'realizada', 'cancelada', 'remarcada']
+
+
+def payload_calls():
+    return [{
+        'id': i, 'mentorado_id': random.randint(1, 180), 'mentorado_nome': random.choice(NOMES),
+        'data_call': f'2026-0{random.randint(1, 9)}-{random.randint(10, 28)}T{random.randint(10, 20)}:00:00+00:00',
+        'status_call': random.choice(STATUS), 'tipo': 'mentoria_individual',
+        'zoom_link': f'https://us06web.zoom.us/j/{random.randint(10**9, 10**10)}',
+        'gcal_event_id': f'{random.getrandbits(64):x}', 'duracao_minutos': 60,
+        'observacoes': 'Revisar oferta e funil; mentorado trouxe dúvidas sobre precificação.' if i % 3 else None,
+        'created_at': '2026-03-01T12:00:00+00:00',
+    } for i in range(500)]
+
+
+def payload_inbox():
+    return [{
+        'mentorado_id': i, 'nome': random.choice(NOMES), 'group_jid': f'1203630{random.randint(10**10, 10**11)}@g.us',
+        'ultima_mensagem': 'Oi equipe, consegui finalizar o roteiro do reels, podem revisar?',
+        'ultima_mensagem_em': '2026-04-07T18:22:10+00:00', 'horas_sem_resposta_equipe': round(random.random() * 72, 2),
+        'nao_lidas': random.randint(0, 12), 'fase_jornada': random.choice(['onboarding', 'execucao', 'escala']),
+        'labels': ['prioridade', 'dossie'] if i % 4 == 0 else [],
+    } for i in range(180)]
+
+
+def payload_biblioteca():
+    paragraph = ('## Oferta\n\nO mentorado atende clínicas de estética de médio porte. '
+                 'A tese central é previsibilidade de agenda com protocolos recorrentes. ') * 8
+    return {'id': 'b1d0c2e4-0000-4000-8000-000000000001', 'slug': 'danyella-truiz-oferta',
+            'titulo': 'Dossiê de Oferta', 'conteudo_md': paragraph * 60}
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def timed(fn, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        out = fn()
+    return out, (time.perf_counter() - t0) / rounds * 1000
+
+
+def main():
+    srv = load_server()
+    encoders = [('identity', lambda b: b)]
+    encoders += [(f'gzip-{lvl}', lambda b, lvl=lvl: gzip.compress(b, compresslevel=lvl, mtime=0)) for lvl in (1, 6, 9)]
+    if brotli is not None:
+        encoders += [(f'br-{q}', lambda b, q=q: brotli.compress(b, quality=q)) for q in (4, 5, 9)]
+
+    routes = [('/api/calls/upcoming', payload_calls()),
+              ('/api/wa/inbox', payload_inbox()),
+              ('/api/biblioteca/{id}', payload_biblioteca())]
+    print(f'[bench] {ROUNDS} rounds; server default: {"br" if srv.brotli else "gzip"}, '
+          f'level={srv.COMPRESS_LEVEL}, min={srv.COMPRESS_MIN_BYTES}B')
+    for route, data in routes:
+        body = json.dumps(data, ensure_ascii=False, default=str).encode()
+        print(f'\n{route}  ({len(body) / 1024:.1f} KB raw)')
+        for name, enc in encoders:
+            out, ms = timed(lambda: enc(body), ROUNDS)
+            print(f'  {name:<9} {len(out) / 1024:8.1f} KB  ratio {len(body) / len(out):5.1f}x  {ms:7.2f} ms/resp')
+        accept = 'gzip, deflate, br'
+        srv.compress_body(body, accept)  # warm the cache
+        _, hit_ms = timed(lambda: srv.compress_body(body, accept), ROUNDS)
+        print(f'  cache hit {"":>8}     {"":>13}  {hit_ms:7.3f} ms/resp')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark — queries independentes em sequência vs gather()
+===========================================================
+
+Sobe um PostgREST falso local com BENCH_LATENCY_MS de latência por query e
+monta o contexto do copiloto (inbox, tópicos, notas) de duas formas:
+  - sequencial: três supabase_request em série (antes)
+  - gather:     gather(...) no pool de fan-out (depois)
+
+Roda BENCH_CONCURRENT handlers ao mesmo tempo para mostrar o efeito com o
+pool compartilhado ocupado. Confere que os resultados chegam na ordem pedida
+e que um erro numa query não derruba as outras.
+
+Uso:
+  python scripts/bench_gather.py
+  BENCH_LATENCY_MS=200 BENCH_CONCURRENT=8 python scripts/bench_gather.py
+"""
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LATENCY_MS = int(os.environ.get('BENCH_LATENCY_MS', '80'))
+CONCURRENT = int(os.environ.get('BENCH_CONCURRENT', '4'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '5'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+QUERIES = [
+    'vw_wa_mentee_inbox?mentorado_id=eq.42&limit=1',
+    'wa_topics?mentorado_id=eq.42&order=last_message_at.desc&limit=5',
+    'mentee_notes?mentorado_id=eq.42&order=created_at.desc&limit=3',
+]
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(LATENCY_MS / 1000)
+        table = self.path.split('/rest/v1/', 1)[1].split('?', 1)[0]
+        out = json.dumps([{'table': table}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def sequential(srv):
+    return [srv.supabase_request('GET', q) for q in QUERIES]
+
+
+def fanned(srv):
+    return srv.gather(*[lambda q=q: srv.supabase_request('GET', q) for q in QUERIES])
+
+
+def timed(srv, fn):
+    t0 = time.perf_counter()
+    results = fn(srv)
+    ordered = [r[0]['table'] for r in results] == [q.split('?')[0] for q in QUERIES]
+    return (time.perf_counter() - t0) * 1000, ordered
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    srv.SUPABASE_SINGLEFLIGHT = False
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', 32, port=upstream.server_address[1],
+                                            connection_class=http.client.HTTPConnection)
+    print(f'[bench] {len(QUERIES)} queries/handler, upstream {LATENCY_MS}ms, {CONCURRENT} concurrent handlers, '
+          f'fan-out pool {srv.FANOUT_WORKERS}')
+    ok = True
+    with ThreadPoolExecutor(max_workers=CONCURRENT) as pool:
+        for label, fn in (('sequential', sequential), ('gather', fanned)):
+            samples = []
+            for _ in range(ROUNDS):
+                samples += list(pool.map(lambda _: timed(srv, fn), range(CONCURRENT)))
+            ok = ok and all(ordered for _, ordered in samples)
+            ms = [m for m, _ in samples]
+            print(f'  {label:<10} p50 {statistics.median(ms):7.1f} ms  max {max(ms):7.1f} ms')
+
+    def boom():
+        raise RuntimeError('upstream exploded')
+    mixed = srv.gather(lambda: srv.supabase_request('GET', QUERIES[0]), boom,
+                       lambda: srv.supabase_request('GET', QUERIES[2]))
+    isolated = isinstance(mixed[1], RuntimeError) and all(isinstance(r, list) for r in (mixed[0], mixed[2]))
+    print(f'  error isolated: {isolated}')
+    upstream.shutdown()
+    return 0 if ok and isolated else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
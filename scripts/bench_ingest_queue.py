@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark — fila durável de ingestão (DurableIngestionExecutor + SqliteJobStore)
+=================================================================================
+
+Enfileira BENCH_JOBS arquivos num sqlite descartável e simula:
+  1. crash: um processo filho faz claim de jobs e morre com os leases na mão
+     (os._exit) — como um container reiniciado no meio da ingestão
+  2. duas réplicas (dois executores, cada um com a sua conexão ao mesmo
+     arquivo) drenam a fila; os jobs do processo morto voltam quando o lease
+     (BENCH_LEASE_SECONDS) expira
+  3. BENCH_POISON arquivos sempre falham: são re-tentados com backoff e vão
+     para 'dead' depois de INGEST_MAX_ATTEMPTS tentativas
+
+Confere que todo arquivo bom foi concluído exatamente uma vez e mostra a
+divisão do trabalho entre as réplicas e o tempo total.
+
+Uso:
+  python scripts/bench_ingest_queue.py
+  BENCH_JOBS=500 BENCH_WORKERS=4 python scripts/bench_ingest_queue.py
+"""
+import collections
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+JOBS = int(os.environ.get('BENCH_JOBS', '120'))
+POISON = int(os.environ.get('BENCH_POISON', '3'))
+WORKERS = int(os.environ.get('BENCH_WORKERS', '2'))
+JOB_MS = float(os.environ.get('BENCH_JOB_MS', '20'))
+LEASE_SECONDS = int(os.environ.get('BENCH_LEASE_SECONDS', '2'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def crashing_child(db_path):
+    """Claim WORKERS jobs, then die without settling them."""
+    srv = load_server()
+    claimed = threading.Barrier(WORKERS + 1)
+
+    def run(arquivo_id):
+        claimed.wait()
+        time.sleep(60)
+
+    executor = srv.DurableIngestionExecutor(srv.SqliteJobStore(db_path), workers=WORKERS, run=run,
+                                            lease_seconds=LEASE_SECONDS, poll_seconds=0.1)
+    executor.start()
+    claimed.wait()
+    os._exit(1)
+
+
+def main():
+    srv = load_server()
+    srv.INGEST_RETRY_BASE_SECONDS = 0.2
+    srv.log_error = lambda *a, **k: None
+    db_path = os.path.join(tempfile.mkdtemp(prefix='ingest-bench-'), 'queue.sqlite3')
+    store = srv.SqliteJobStore(db_path)
+    good = [f'arquivo-{i}' for i in range(JOBS)]
+    poison = [f'poison-{i}' for i in range(POISON)]
+    for i, aid in enumerate(good + poison):
+        store.enqueue(aid, f'mentorado:{i % 7}', queue_limit=0)
+    dup = store.enqueue(good[0], 'mentorado:0', queue_limit=0)
+    print(f'[bench] {JOBS} jobs + {POISON} poison, {WORKERS} workers/replica, lease {LEASE_SECONDS}s, '
+          f'max attempts {srv.INGEST_MAX_ATTEMPTS}; re-enqueue of a queued file -> {dup}')
+
+    t0 = time.perf_counter()
+    child = subprocess.run([sys.executable, __file__, '--crash-child', db_path])
+    crashed = [r[0] for r in store._db.execute("SELECT arquivo_id FROM ingest_jobs WHERE state = 'leased'")]
+    print(f'  crash:    child exited {child.returncode} holding leases on {crashed}')
+
+    lock = threading.Lock()
+    completions = collections.Counter()
+    by_replica = collections.Counter()
+
+    def make_run(replica):
+        def run(arquivo_id):
+            time.sleep(JOB_MS / 1000)
+            if arquivo_id.startswith('poison'):
+                raise ValueError('corrupt file')
+            with lock:
+                completions[arquivo_id] += 1
+                by_replica[replica] += 1
+            return 'concluido'
+        return run
+
+    replicas = [srv.DurableIngestionExecutor(srv.SqliteJobStore(db_path), workers=WORKERS, run=make_run(name),
+                                             lease_seconds=LEASE_SECONDS, poll_seconds=0.1)
+                for name in ('A', 'B')]
+    for executor in replicas:
+        executor.start()
+    while True:
+        counts, _ = store.snapshot(limit=0)
+        if not counts.get('queued') and not counts.get('leased'):
+            break
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - t0
+
+    counts, lists = store.snapshot(limit=POISON + 10)
+    dead = {r['arquivo_id']: r['attempts'] for r in lists['failed'] if r['state'] == 'dead'}
+    exactly_once = all(completions[aid] == 1 for aid in good)
+    resumed = all(completions[aid] == 1 for aid in crashed)
+    print(f'  drained:  {elapsed:5.1f} s  by state {counts}')
+    print(f'  replicas: {dict(by_replica)}  stats A={replicas[0].counters()["done"]} done, '
+          f'B={replicas[1].counters()["done"]} done, retried={sum(r.counters()["retried"] for r in replicas)}')
+    print(f'  exactly once: {exactly_once}  crashed jobs resumed: {resumed}  dead-lettered: {dead}')
+    ok = exactly_once and resumed and crashed and sorted(dead) == sorted(poison) \
+        and all(n == srv.INGEST_MAX_ATTEMPTS for n in dead.values())
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--crash-child':
+        crashing_child(sys.argv[2])
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark — reprocessamento em massa: thread por arquivo vs IngestionExecutor
+=============================================================================
+
+Roda o process_file_pipeline real contra um PostgREST falso local
+(BENCH_LATENCY_MS por request), com download do Storage e embeddings falsos:
+o provedor de embedding aceita no máximo BENCH_EMBED_QUOTA chamadas
+simultâneas (acima disso responde 429, como Voyage/OpenAI sob rate limit) e
+leva BENCH_EMBED_MS por lote. Compara, para BENCH_FILES arquivos de texto:
+  - threads:  uma threading.Thread por arquivo + sleep(1) a cada 5 (antes)
+  - executor: IngestionExecutor com BENCH_WORKERS workers      (depois)
+
+No executor, BENCH_FILES arquivos são de um mentorado e BENCH_LATE_FILES de
+outro, enfileirados depois: com a fila justa eles não esperam o lote inteiro.
+Mede arquivos concluídos por minuto, falhas e pico de threads.
+
+Uso:
+  python scripts/bench_ingestion.py
+  BENCH_FILES=200 BENCH_WORKERS=4 BENCH_EMBED_QUOTA=4 python scripts/bench_ingestion.py
+"""
+import http.client
+import http.server
+import importlib.util
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+FILES = int(os.environ.get('BENCH_FILES', '60'))
+LATE_FILES = int(os.environ.get('BENCH_LATE_FILES', '5'))
+WORKERS = int(os.environ.get('BENCH_WORKERS', '4'))
+LATENCY_MS = float(os.environ.get('BENCH_LATENCY_MS', '10'))
+DOWNLOAD_MS = float(os.environ.get('BENCH_DOWNLOAD_MS', '50'))
+EMBED_MS = float(os.environ.get('BENCH_EMBED_MS', '150'))
+EMBED_QUOTA = int(os.environ.get('BENCH_EMBED_QUOTA', '4'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+TEXT = ('O mentorado apresentou a nova oferta high ticket para o funil de lançamento. ' * 400).encode()
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    status = {}
+    ids = itertools.count(1)
+
+    def _reply(self, out, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def _body(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        return json.loads(raw) if raw else None
+
+    def do_GET(self):
+        time.sleep(LATENCY_MS / 1000)
+        if '/sp_arquivos' in self.path:
+            aid = self.path.split('id=eq.', 1)[1].split('&', 1)[0]
+            owner = 'late' if aid.startswith('late') else 'bulk'
+            row = {'id': aid, 'mime_type': 'text/plain', 'extensao': 'txt', 'storage_path': f'mentorado/{owner}/{aid}.txt',
+                   'nome_original': f'{aid}.txt', 'entidade_tipo': 'mentorado', 'entidade_id': owner}
+            return self._reply(json.dumps([row]).encode())
+        self._reply(b'[{"id": 1, "nome": "Mentorado"}]')
+
+    def do_POST(self):
+        self._body()
+        time.sleep(LATENCY_MS / 1000)
+        if '/sp_conteudo_extraido' in self.path:
+            return self._reply(json.dumps([{'id': next(FakePostgREST.ids)}]).encode(), 201)
+        self._reply(b'', 201)
+
+    def do_PATCH(self):
+        body = self._body() or {}
+        time.sleep(LATENCY_MS / 1000)
+        if 'status_processamento' in body:
+            FakePostgREST.status[self.path.split('id=eq.', 1)[1]] = body['status_processamento']
+        self._reply(b'[]')
+
+    def do_DELETE(self):
+        time.sleep(LATENCY_MS / 1000)
+        self._reply(b'[]')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEmbeddings:
+    """Provider with a concurrency quota: calls beyond it get a 429."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.throttled = 0
+
+    def __call__(self, texts):
+        with self.lock:
+            if self.inflight >= EMBED_QUOTA:
+                self.throttled += 1
+                raise ValueError('Voyage API error 429: rate limit exceeded')
+            self.inflight += 1
+        try:
+            time.sleep(EMBED_MS / 1000)
+            return [[0.001 * i] * 8 for i in range(len(texts))]
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+def fake_download(storage_path, max_bytes=None):
+    time.sleep(DOWNLOAD_MS / 1000)
+    return io.BytesIO(TEXT)
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def summarize(label, ids, elapsed, peak_threads, embeddings, extra=''):
+    done = sum(1 for aid in ids if FakePostgREST.status.get(aid) == 'concluido')
+    failed = sum(1 for aid in ids if FakePostgREST.status.get(aid) == 'erro')
+    print(f'  {label:<9} {elapsed:6.1f} s  concluidos={done:3d}  erro={failed:3d}  '
+          f'{done / elapsed * 60:6.1f} arquivos/min  429s={embeddings.throttled:4d}  pico threads={peak_threads}{extra}')
+    return done
+
+
+def watch_threads(stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        time.sleep(0.01)
+
+
+def run_threads(srv, ids):
+    """Old _handle_storage_reprocess: a bare thread per file, sleep(1) every 5."""
+    threads = []
+    for count, aid in enumerate(ids, 1):
+        def _bg(aid=aid):
+            try:
+                srv.process_file_pipeline(aid)
+            except Exception:
+                pass
+        t = threading.Thread(target=_bg, daemon=True)
+        t.start()
+        threads.append(t)
+        if count % 5 == 0:
+            time.sleep(1)
+    for t in threads:
+        t.join()
+
+
+def run_executor(srv, ids, late_ids, finished_at):
+    executor = srv.IngestionExecutor(workers=WORKERS, queue_limit=len(ids) + len(late_ids))
+    for aid in ids:
+        executor.submit(aid, 'mentorado:bulk')
+    for aid in late_ids:
+        executor.submit(aid, 'mentorado:late')
+    pending = set(late_ids)
+    while True:
+        snap = executor.snapshot(limit=0)
+        pending -= {aid for aid in pending if FakePostgREST.status.get(aid) in ('concluido', 'erro')}
+        if not pending and 'late' not in finished_at:
+            finished_at['late'] = time.perf_counter()
+        if snap['queued'] == 0 and snap['running'] == 0:
+            return snap
+        time.sleep(0.02)
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    srv.SUPABASE_SINGLEFLIGHT = False
+    srv.log_info = lambda *a, **k: None
+    srv.log_error = lambda *a, **k: None
+    srv._download_from_supabase_storage = fake_download
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', 16, port=upstream.server_address[1],
+                                            connection_class=http.client.HTTPConnection)
+    print(f'[bench] {FILES} files (+{LATE_FILES} late), upstream {LATENCY_MS:.0f}ms, download {DOWNLOAD_MS:.0f}ms, '
+          f'embedding {EMBED_MS:.0f}ms/batch with quota {EMBED_QUOTA}, executor workers {WORKERS}')
+
+    results = {}
+    for label in ('threads', 'executor'):
+        srv.embed_texts = embeddings = FakeEmbeddings()
+        ids = [f'{label}-{i}' for i in range(FILES)]
+        late_ids = [f'late-{label}-{i}' for i in range(LATE_FILES)]
+        stop, peak, finished_at = threading.Event(), [threading.active_count()], {}
+        threading.Thread(target=watch_threads, args=(stop, peak), daemon=True).start()
+        t0 = time.perf_counter()
+        if label == 'threads':
+            run_threads(srv, ids + late_ids)
+            extra = ''
+        else:
+            snap = run_executor(srv, ids, late_ids, finished_at)
+            extra = (f'  late mentorado done at {finished_at["late"] - t0:.1f} s'
+                     f'  (done={snap["done"]} failed={snap["failed"]})')
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        results[label] = summarize(label, ids + late_ids, elapsed, peak[0], embeddings, extra)
+    upstream.shutdown()
+    return 0 if results['executor'] == FILES + LATE_FILES else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark — codec JSON (antes/depois) em payloads realistas
+===========================================================
+
+Compara, por payload:
+  - encode: json.dumps(..., ensure_ascii=False, default=str).encode()  vs  json_dumps()
+  - decode + wrap do supabase_request: json.loads + classes SList/SDict
+    definidas a cada chamada + .text decodificado sempre  vs
+    _wrap_supabase_payload() (json_loads + classes de módulo + .text lazy)
+
+O codec ativo é o do servidor (orjson → msgspec → stdlib; JSON_CODEC força).
+
+Uso:
+  python scripts/bench_json_codec.py
+  JSON_CODEC=stdlib python scripts/bench_json_codec.py
+"""
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '200'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+random.seed(11)
+
+
+def payload_tasks(n=500):
+    now = datetime.now(timezone.utc)
+    return [{
+        'id': f'{random.getrandbits(128):032x}', 'titulo': f'Revisar dossiê de oferta #{i}',
+        'descricao': 'Checar tese central, pilares e ROI; alinhar com a mentora antes de sexta.',
+        'status': random.choice(['pendente', 'em_andamento', 'concluida']),
+        'prioridade': random.choice(['alta', 'normal', 'baixa']), 'responsavel': 'kaique',
+        'depends_on': [f'{random.getrandbits(64):x}'] if i % 5 == 0 else [],
+        'updated_at': now, 'data_fim': now.date(), 'pontos': random.randint(1, 8),
+    } for i in range(n)]
+
+
+def payload_inbox(n=180):
+    return [{
+        'mentorado_id': i, 'nome': f'Mentorado {i}', 'nao_lidas': random.randint(0, 12),
+        'horas_sem_resposta_equipe': round(random.random() * 72, 2),
+        'ultima_mensagem': 'Oi equipe, consegui finalizar o roteiro do reels, podem revisar? 🙏',
+    } for i in range(n)]
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def old_wrap(resp_body, status=200):
+    """supabase_request before the codec change."""
+    parsed = json.loads(resp_body) if resp_body else {}
+    if isinstance(parsed, list):
+        class SList(list):
+            status_code = status
+            text = resp_body.decode() if resp_body else ''
+            def json(self): return list(self)
+        return SList(parsed)
+    class SDict(dict):
+        status_code = status
+        text = resp_body.decode() if resp_body else ''
+        def json(self): return dict(self)
+    return SDict(parsed)
+
+
+def per_sec(fn, size):
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    dt = time.perf_counter() - t0
+    return ROUNDS / dt, ROUNDS * size / dt / 1e6
+
+
+def main():
+    srv = load_server()
+    print(f'[bench] codec={srv.JSON_CODEC}, {ROUNDS} rounds')
+    for name, data in (('god_tasks x500', payload_tasks()), ('wa inbox x180', payload_inbox())):
+        wire = json.dumps(data, ensure_ascii=False, default=str).encode()
+        print(f'\n{name} ({len(wire) / 1024:.1f} KB)')
+        rows = [
+            ('encode  before', lambda: json.dumps(data, ensure_ascii=False, default=str).encode()),
+            ('encode  after ', lambda: srv.json_dumps(data)),
+            ('decode  before', lambda: old_wrap(wire)),
+            ('decode  after ', lambda: srv._wrap_supabase_payload(wire, 200)),
+        ]
+        for label, fn in rows:
+            ops, mbs = per_sec(fn, len(wire))
+            print(f'  {label} {ops:9.0f} ops/s  {mbs:7.1f} MB/s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark — page load com e sem keep-alive
+==========================================
+
+Simula o carregamento do dashboard: cada "page load" dispara BENCH_PARALLEL
+chamadas de API em paralelo (como o Alpine.js faz). Compara:
+  - close:      conexão nova por chamada (comportamento HTTP/1.0 antigo)
+  - keep-alive: cada "aba" reaproveita suas conexões entre page loads
+
+Sem BENCH_URL sobe o ProxyHandler local em modo pool (rota sintética de 5ms).
+Com BENCH_URL aponta para um deploy real (https inclui o custo do TLS).
+
+Uso:
+  python scripts/bench_keepalive.py
+  BENCH_URL=https://web-production-2cde5.up.railway.app BENCH_PATH=/api/health \
+  python scripts/bench_keepalive.py
+"""
+import http.client
+import importlib.util
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+PAGE_LOADS = int(os.environ.get('BENCH_PAGE_LOADS', '30'))
+PARALLEL = int(os.environ.get('BENCH_PARALLEL', '10'))
+BENCH_URL = os.environ.get('BENCH_URL', '')
+BENCH_PATH = os.environ.get('BENCH_PATH', '/api/mentees')
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+
+def start_local_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    srv = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(srv)
+
+    class BenchHandler(srv.ProxyHandler):
+        def do_GET(self):
+            time.sleep(0.005)
+            self._send_json([{'id': i, 'nome': f'Mentorado {i}'} for i in range(50)])
+
+        def log_message(self, format, *args):
+            pass
+
+    server = srv.PoolHTTPServer(('127.0.0.1', 0), BenchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def connect(parsed):
+    cls = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+    return cls(parsed.hostname, parsed.port, timeout=30)
+
+
+def call(parsed, conns, slot, keep_alive):
+    t0 = time.perf_counter()
+    conn = conns.get(slot) if keep_alive else None
+    if conn is None:
+        conn = connect(parsed)
+    headers = {} if keep_alive else {'Connection': 'close'}
+    try:
+        conn.request('GET', BENCH_PATH, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        if keep_alive and not resp.will_close:
+            conns[slot] = conn
+        else:
+            conn.close()
+            conns.pop(slot, None)
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        conns.pop(slot, None)
+    return (time.perf_counter() - t0) * 1000
+
+
+def run(parsed, keep_alive):
+    conns = {}
+    page_ms = []
+    with ThreadPoolExecutor(max_workers=PARALLEL) as pool:
+        for _ in range(PAGE_LOADS):
+            t0 = time.perf_counter()
+            list(pool.map(lambda i: call(parsed, conns, i, keep_alive), range(PARALLEL)))
+            page_ms.append((time.perf_counter() - t0) * 1000)
+    for conn in conns.values():
+        conn.close()
+    page_ms.sort()
+    return {
+        'mode': 'keep-alive' if keep_alive else 'close',
+        'page_p50_ms': round(statistics.median(page_ms), 1),
+        'page_p95_ms': round(page_ms[int(0.95 * (len(page_ms) - 1))], 1),
+    }
+
+
+def main():
+    base = BENCH_URL or start_local_server()
+    parsed = urllib.parse.urlparse(base)
+    print(f'[bench] {base}{BENCH_PATH} — {PAGE_LOADS} page loads x {PARALLEL} parallel calls')
+    for keep_alive in (False, True):
+        print(run(parsed, keep_alive))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
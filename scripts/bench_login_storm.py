@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark — latência de leitura do dashboard durante um login storm
+====================================================================
+
+Sobe o ProxyHandler real (PoolHTTPServer) com um PostgREST falso local:
+auth_users devolve um hash bcrypt de verdade (custo 12) e vw_wa_mentee_inbox
+devolve linhas de inbox. Enquanto BENCH_STORM_THREADS threads disparam logins
+com senha errada (credential stuffing, e-mails variados, BENCH_STORM_IPS IPs
+via X-Forwarded-For), um leitor faz GET /api/wa/inbox com X-API-Key a cada
+50 ms e mede a latência. Modos:
+  - baseline:  sem storm
+  - inline:    bcrypt no thread da request, sem limite nem throttle (antes)
+  - pool:      pool de bcrypt + fila limitada (é o limite da rota de login:
+               quem passa de PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT leva 503)
+  - throttled: pool + throttle por conta/IP, com limite por IP reduzido para
+               BENCH_THROTTLE_IP_ATTEMPTS (o padrão, 30 em 5 min, levaria minutos
+               para disparar num run de poucos segundos)
+
+Uso:
+  python scripts/bench_login_storm.py
+  BENCH_SECONDS=10 BENCH_STORM_THREADS=32 python scripts/bench_login_storm.py
+"""
+import http.client
+import http.server
+import importlib.util
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+import bcrypt
+
+SECONDS = float(os.environ.get('BENCH_SECONDS', '6'))
+STORM_THREADS = int(os.environ.get('BENCH_STORM_THREADS', '24'))
+STORM_IPS = int(os.environ.get('BENCH_STORM_IPS', '4'))
+THROTTLE_IP_ATTEMPTS = int(os.environ.get('BENCH_THROTTLE_IP_ATTEMPTS', '1'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+USER_ROW = json.dumps([{'id': 1, 'email': 'alvo@case.com', 'full_name': 'Alvo', 'role': 'equipe',
+                        'password_hash': bcrypt.hashpw(b'senha-certa', bcrypt.gensalt(12)).decode()}]).encode()
+INBOX = json.dumps([{'mentorado_id': i, 'nome': f'Mentorado {i}', 'horas_sem_resposta_equipe': i % 48}
+                    for i in range(180)]).encode()
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        out = USER_ROW if '/auth_users' in self.path else INBOX
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def start_server(srv, route_caps):
+    class BenchHandler(srv.ProxyHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = srv.PoolHTTPServer(('127.0.0.1', 0), BenchHandler, route_caps=route_caps)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def storm(port, stop, outcomes, seq):
+    while not stop.is_set():
+        n = next(seq)
+        body = json.dumps({'email': f'vitima{n % 500}@case.com', 'password': f'chute-{n}'})
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            conn.request('POST', '/api/auth/login', body=body, headers={
+                'Content-Type': 'application/json', 'X-Forwarded-For': f'203.0.113.{n % STORM_IPS + 1}'})
+            status = conn.getresponse().status
+        except OSError:
+            status = 'error'
+        finally:
+            conn.close()
+        outcomes[status] = outcomes.get(status, 0) + 1
+
+
+def read_dashboard(port, stop):
+    samples = []
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.request('GET', '/api/wa/inbox', headers={'X-API-Key': 'bench-key'})
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status == 200:
+            samples.append((time.perf_counter() - t0) * 1000)
+        if resp.will_close:
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        time.sleep(0.05)
+    conn.close()
+    return samples
+
+
+def run(srv, label, storm_threads, pool_workers, throttle):
+    srv._password_pool = srv.PasswordPool(workers=pool_workers)
+    srv._login_throttle = srv.LoginThrottle()
+    srv.LOGIN_ACCOUNT_MAX_FAILURES = 5 if throttle else 10 ** 9
+    srv.LOGIN_IP_MAX_ATTEMPTS = THROTTLE_IP_ATTEMPTS if throttle else 10 ** 9
+    server = start_server(srv, srv.ROUTE_CONCURRENCY_CAPS)
+    port = server.server_address[1]
+    stop, outcomes, seq = threading.Event(), {}, itertools.count()
+    stormers = [threading.Thread(target=storm, args=(port, stop, outcomes, seq), daemon=True)
+                for _ in range(storm_threads)]
+    for t in stormers:
+        t.start()
+    result = {}
+    reader = threading.Thread(target=lambda: result.setdefault('ms', read_dashboard(port, stop)))
+    reader.start()
+    time.sleep(SECONDS)
+    stop.set()
+    reader.join()
+    for t in stormers:
+        t.join(timeout=30)
+    server.shutdown()
+    server.server_close()
+    ms = sorted(result['ms'])
+    print(f'  {label:<10} reads={len(ms):4d}  p50 {statistics.median(ms):7.1f} ms  '
+          f'p95 {ms[int(len(ms) * 0.95) - 1]:7.1f} ms  max {ms[-1]:7.1f} ms  logins={dict(sorted(outcomes.items(), key=str))}')
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    srv.STATIC_API_KEYS['bench-key'] = 'bench'
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', 16, port=upstream.server_address[1],
+                                            connection_class=http.client.HTTPConnection)
+    print(f'[bench] {STORM_THREADS} storm threads from {STORM_IPS} IPs, {SECONDS:.0f}s per mode, '
+          f'{srv.SERVER_WORKERS} server workers, {os.cpu_count()} CPUs')
+    run(srv, 'baseline', 0, srv.PASSWORD_WORKERS, True)
+    run(srv, 'inline', STORM_THREADS, 0, False)
+    run(srv, 'pool', STORM_THREADS, srv.PASSWORD_WORKERS, False)
+    run(srv, 'throttled', STORM_THREADS, srv.PASSWORD_WORKERS, True)
+    upstream.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark — custo de dispatch: cadeia elif vs ROUTER pré-compilado
+===================================================================
+
+Gera um path de exemplo para cada rota de ROUTES e mede, por rota, o custo
+de resolver o handler de duas formas:
+  - linear: replica a cadeia elif antiga (==, startswith, re.match repetido)
+  - router: ROUTER.match (dict exato → regex combinada → trie de prefixos)
+
+Também confere que as duas formas resolvem o mesmo handler.
+
+Uso:
+  python scripts/bench_route_dispatch.py
+  BENCH_ITERATIONS=20000 python scripts/bench_route_dispatch.py
+"""
+import importlib.util
+import os
+import re
+import sys
+import timeit
+
+ITERATIONS = int(os.environ.get('BENCH_ITERATIONS', '5000'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+SAMPLES = {
+    r'(\d+)': '123',
+    r'([^/]+)': 'a1b2c3',
+    r'([0-9a-f-]+)': '0f8e2a4c-1b2d-4e5f-9a8b-7c6d5e4f3a2b',
+    r'(.+)': 'task-abc',
+}
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def sample_path(route):
+    if route.kind == 'exact':
+        return route.pattern
+    if route.kind == 'prefix':
+        return route.pattern[:-1] + ('x' if route.pattern.endswith('/*') else '?x=1')
+    path = route.pattern[1:-1]
+    for group, value in SAMPLES.items():
+        path = path.replace(group, value)
+    return path
+
+
+def linear_match(routes, method, path):
+    """Old elif semantics: declaration order, each regex evaluated twice on a hit."""
+    for route in routes:
+        if route.method != method:
+            continue
+        if route.kind == 'exact':
+            if path == route.pattern:
+                return route, ()
+        elif route.kind == 'prefix':
+            if path.startswith(route.pattern[:-1]):
+                return route, ()
+        elif re.match(route.pattern, path):
+            m = re.match(route.pattern, path)
+            return route, m.groups()
+    return None
+
+
+def main():
+    srv = load_server()
+    routes, router = srv.ROUTES, srv.ROUTER
+    # exact routes first, mirroring the router's precedence for the linear baseline
+    ordered = [r for r in routes if r.kind == 'exact'] + [r for r in routes if r.kind != 'exact']
+
+    mismatches = []
+    total_linear = total_router = 0.0
+    worst = (0.0, None)
+    for route in routes:
+        path = sample_path(route)
+        expected = linear_match(ordered, route.method, path)
+        got = router.match(route.method, path)
+        if (expected and expected[0].handler, expected and tuple(expected[1])) != \
+                (got and got[0].handler, got and tuple(got[1])):
+            mismatches.append((route.method, path, expected, got))
+        t_lin = timeit.timeit(lambda: linear_match(ordered, route.method, path), number=ITERATIONS) / ITERATIONS
+        t_rt = timeit.timeit(lambda: router.match(route.method, path), number=ITERATIONS) / ITERATIONS
+        total_linear += t_lin
+        total_router += t_rt
+        if t_lin > worst[0]:
+            worst = (t_lin, f'{route.method} {path}')
+
+    n = len(routes)
+    print(f'[bench] {n} routes, {ITERATIONS} iterations each')
+    print(f'  linear elif  mean {total_linear / n * 1e6:7.2f} µs/dispatch  (worst {worst[0] * 1e6:.2f} µs: {worst[1]})')
+    print(f'  ROUTER.match mean {total_router / n * 1e6:7.2f} µs/dispatch')
+    print(f'  speedup      {total_linear / total_router:5.1f}x')
+    if mismatches:
+        print(f'[bench] {len(mismatches)} MISMATCHES:')
+        for m in mismatches:
+            print('  ', m)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark — single-threaded vs worker-pool HTTP server
+=======================================================
+
+Sobe o ProxyHandler real em porta local, troca os handlers de rota por
+respostas sintéticas (rota lenta simula /api/fabric/run, rota rápida simula
+/api/mentees) e dispara tráfego misto. Reporta p50/p99 das leituras rápidas
+e quantas chamadas lentas foram recusadas pelo cap de rota.
+
+Uso:
+  python scripts/bench_server_pool.py
+  BENCH_CLIENTS=48 BENCH_REQUESTS=600 BENCH_SLOW_RATIO=0.2 BENCH_SLOW_MS=800 \
+  python scripts/bench_server_pool.py
+"""
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+CLIENTS = int(os.environ.get('BENCH_CLIENTS', '32'))
+REQUESTS = int(os.environ.get('BENCH_REQUESTS', '400'))
+SLOW_RATIO = float(os.environ.get('BENCH_SLOW_RATIO', '0.15'))
+SLOW_MS = int(os.environ.get('BENCH_SLOW_MS', '500'))
+FAST_MS = int(os.environ.get('BENCH_FAST_MS', '5'))
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def make_handler(srv):
+    class BenchHandler(srv.ProxyHandler):
+        def do_GET(self):
+            if self.path.startswith('/api/fabric/run'):
+                time.sleep(SLOW_MS / 1000)
+                self._send_json({'output': 'slow'})
+            else:
+                time.sleep(FAST_MS / 1000)
+                self._send_json([{'id': i} for i in range(20)])
+
+        def log_message(self, format, *args):
+            pass
+
+    return BenchHandler
+
+
+def fire(port, path):
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=60) as resp:
+            resp.read()
+            code = resp.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except Exception:
+        code = 0
+    return path, code, (time.perf_counter() - t0) * 1000
+
+
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def run(srv, mode):
+    handler = make_handler(srv)
+    if mode == 'single':
+        server = srv.ReuseAddrHTTPServer(('127.0.0.1', 0), handler)
+    else:
+        server = srv.PoolHTTPServer(('127.0.0.1', 0), handler)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    slow_every = max(1, int(round(1 / SLOW_RATIO))) if SLOW_RATIO > 0 else 0
+    paths = ['/api/fabric/run' if slow_every and i % slow_every == 0 else '/api/mentees' for i in range(REQUESTS)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        results = list(pool.map(lambda p: fire(port, p), paths))
+    wall = time.perf_counter() - t0
+    server.shutdown()
+    server.server_close()
+
+    fast = [ms for path, code, ms in results if path == '/api/mentees' and code == 200]
+    slow_ok = sum(1 for path, code, _ in results if path == '/api/fabric/run' and code == 200)
+    rejected = sum(1 for _, code, _ in results if code == 503)
+    errors = sum(1 for _, code, _ in results if code not in (200, 503))
+    return {
+        'mode': mode,
+        'fast_p50_ms': round(pct(fast, 50), 1),
+        'fast_p99_ms': round(pct(fast, 99), 1),
+        'slow_ok': slow_ok,
+        'rejected_503': rejected,
+        'errors': errors,
+        'throughput_rps': round(len(results) / wall, 1),
+    }
+
+
+def main():
+    srv = load_server()
+    print(f'[bench] {REQUESTS} requests, {CLIENTS} clients, slow={SLOW_RATIO:.0%} @ {SLOW_MS}ms, '
+          f'pool={srv.SERVER_WORKERS} workers / queue {srv.SERVER_QUEUE_DEPTH}, '
+          f'fabric cap={srv.ROUTE_CONCURRENCY_CAPS.get("/api/fabric/run")}')
+    rows = [run(srv, mode) for mode in ('single', 'pool')]
+    for row in rows:
+        print(json.dumps(row))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
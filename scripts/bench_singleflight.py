@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark — singleflight de GETs idênticos no supabase_request
+===============================================================
+
+Simula BENCH_DASHBOARDS consultores abrindo o dashboard ao mesmo tempo:
+cada um dispara as mesmas queries de views pesadas (vw_wa_mentee_inbox,
+vw_wa_topic_board, vw_agent_metrics) contra um PostgREST falso local com
+BENCH_LATENCY_MS de latência. Compara singleflight desligado/ligado:
+requests que chegaram ao upstream, latência por dashboard e os contadores
+de coalescência. Confere também que cada chamador recebe uma cópia própria.
+
+Uso:
+  python scripts/bench_singleflight.py
+  BENCH_DASHBOARDS=30 BENCH_ROUNDS=10 python scripts/bench_singleflight.py
+"""
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DASHBOARDS = int(os.environ.get('BENCH_DASHBOARDS', '12'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '5'))
+LATENCY_MS = int(os.environ.get('BENCH_LATENCY_MS', '150'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+VIEWS = ['vw_wa_mentee_inbox?select=*', 'vw_wa_topic_board?select=*', 'vw_agent_metrics?select=*']
+ROWS = json.dumps([{'mentorado_id': i, 'nome': f'Mentorado {i}', 'nao_lidas': i % 7} for i in range(180)]).encode()
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    hits = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with FakePostgREST.lock:
+            FakePostgREST.hits += 1
+        time.sleep(LATENCY_MS / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(ROWS)))
+        self.end_headers()
+        self.wfile.write(ROWS)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def dashboard(srv):
+    t0 = time.perf_counter()
+    results = [srv.supabase_request('GET', view) for view in VIEWS]
+    for rows in results:
+        rows[0]['nome'] = 'mutated'  # handlers enrich rows in place; must not leak to other callers
+    return (time.perf_counter() - t0) * 1000, results
+
+
+def run(srv, port, enabled):
+    srv.SUPABASE_SINGLEFLIGHT = enabled
+    srv._supa_flight = srv.SingleFlight()
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', 32, port=port, connection_class=http.client.HTTPConnection)
+    FakePostgREST.hits = 0
+    page_ms, copies_ok = [], True
+    with ThreadPoolExecutor(max_workers=DASHBOARDS) as pool:
+        for _ in range(ROUNDS):
+            outcomes = list(pool.map(lambda _: dashboard(srv), range(DASHBOARDS)))
+            page_ms += [ms for ms, _ in outcomes]
+            ids = {id(rows) for _, results in outcomes for rows in results}
+            copies_ok &= len(ids) == DASHBOARDS * len(VIEWS)
+    srv._supa_pool.close()
+    return {
+        'singleflight': enabled,
+        'upstream_requests': FakePostgREST.hits,
+        'calls': DASHBOARDS * ROUNDS * len(VIEWS),
+        'dashboard_p50_ms': round(statistics.median(page_ms), 1),
+        'dashboard_max_ms': round(max(page_ms), 1),
+        'independent_copies': copies_ok,
+        **({'stats': srv._supa_flight.snapshot()} if enabled else {}),
+    }
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    print(f'[bench] {DASHBOARDS} concurrent dashboards x {ROUNDS} rounds, {len(VIEWS)} views each, '
+          f'upstream {LATENCY_MS}ms')
+    rows = [run(srv, upstream.server_address[1], enabled) for enabled in (False, True)]
+    for row in rows:
+        print(json.dumps(row))
+    upstream.shutdown()
+    return 0 if all(r['independent_copies'] for r in rows) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
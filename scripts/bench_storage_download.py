@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark — download do Storage: bytes inteiros vs SpooledTemporaryFile
+=======================================================================
+
+Sobe um Storage falso local que serve um objeto de BENCH_MB MB (em blocos de
+1 MB, sem guardar o arquivo em memória) e baixa o objeto num processo filho
+por modo, medindo o pico de RSS (ru_maxrss) acima do servidor já carregado:
+  - bytes:    resp.read() do objeto inteiro, como o pipeline fazia (antes)
+  - spooled:  _download_from_supabase_storage → SpooledTemporaryFile que vai
+              para disco passado STORAGE_SPOOL_BYTES                 (depois)
+
+Confere que os dois modos entregam o mesmo conteúdo (sha256) e que o limite
+STORAGE_DOWNLOAD_MAX_BYTES recusa o objeto pelo Content-Length, antes de ler
+o corpo, e no meio do stream quando a resposta vem chunked (sem tamanho).
+
+Uso:
+  python scripts/bench_storage_download.py
+  BENCH_MB=500 python scripts/bench_storage_download.py
+"""
+import hashlib
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+MB = int(os.environ.get('BENCH_MB', '200'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+BLOCK = bytes(range(256)) * 4096  # 1 MiB
+
+
+class FakeStorage(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    sent = 0
+
+    def do_GET(self):
+        chunked = '/chunked/' in self.path
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(MB * len(BLOCK)))
+        self.end_headers()
+        try:
+            for _ in range(MB):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(BLOCK), BLOCK) if chunked else BLOCK)
+                FakeStorage.sent += len(BLOCK)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            pass  # the client gave up (size guard)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def child(mode, port):
+    """One download in a fresh process; prints peak RSS growth, time and sha256 as JSON."""
+    srv = load_server()
+    srv._storage_connection = lambda: http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    base = peak_rss_mb()
+    t0 = time.perf_counter()
+    digest = hashlib.sha256()
+    if mode == 'bytes':
+        conn = srv._storage_connection()
+        conn.request('GET', '/storage/v1/object/spalla-arquivos/bench.mp4')
+        data = conn.getresponse().read()
+        conn.close()
+        digest.update(data)
+        size = len(data)
+    else:
+        with srv._download_from_supabase_storage('bench.mp4') as f:
+            size = 0
+            for chunk in iter(lambda: f.read(srv.STORAGE_READ_CHUNK_BYTES), b''):
+                digest.update(chunk)
+                size += len(chunk)
+    print(json.dumps({'rss_mb': peak_rss_mb() - base, 'secs': time.perf_counter() - t0,
+                      'size': size, 'sha': digest.hexdigest()}))
+
+
+def guard(srv, path):
+    """Download with a limit of half the object; returns (raised, MB the server got to send)."""
+    FakeStorage.sent = 0
+    try:
+        srv._download_from_supabase_storage(path, max_bytes=MB * len(BLOCK) // 2).close()
+        raised = None
+    except srv.StorageObjectTooLarge as e:
+        raised = str(e)
+    time.sleep(0.2)
+    return raised, FakeStorage.sent / len(BLOCK)
+
+
+def main():
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeStorage)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    port = upstream.server_address[1]
+    expected = hashlib.sha256()
+    for _ in range(MB):
+        expected.update(BLOCK)
+    srv = load_server()
+    print(f'[bench] {MB} MB object, spool threshold {srv.STORAGE_SPOOL_BYTES // (1024 * 1024)} MB, '
+          f'read chunk {srv.STORAGE_READ_CHUNK_BYTES // 1024} KB')
+
+    same = True
+    for mode in ('bytes', 'spooled'):
+        out = subprocess.run([sys.executable, __file__, '--child', mode, str(port)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        same = same and r['sha'] == expected.hexdigest() and r['size'] == MB * len(BLOCK)
+        print(f'  {mode:<8} peak RSS +{r["rss_mb"]:7.1f} MB  {r["secs"]:5.2f} s  {r["size"] / r["secs"] / 1e6:7.1f} MB/s')
+    print(f'  same content: {same}')
+
+    srv._storage_connection = lambda: http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    by_length, sent_length = guard(srv, 'bench.mp4')
+    by_stream, sent_stream = guard(srv, 'chunked/bench.mp4')
+    print(f'  guard (Content-Length): {by_length!r}  server sent ~{sent_length:.0f} MB')
+    print(f'  guard (chunked):        {by_stream!r}  server sent ~{sent_stream:.0f} MB')
+    upstream.shutdown()
+    return 0 if same and by_length and by_stream else 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark — resposta JSON bufferizada vs streaming (chunked)
+=============================================================
+
+Sobe o ProxyHandler local com uma rota sintética que devolve BENCH_ITEMS
+linhas parecidas com calls_mentoria, e compara:
+  - buffered: _send_json(lista)          (json inteiro + compressão em memória)
+  - stream:   _send_json_stream(lista)   (item a item, Transfer-Encoding: chunked)
+
+Reporta TTFB, tempo total e pico de memória alocada no servidor durante a
+resposta (tracemalloc), com e sem Accept-Encoding: gzip. Também confere que
+os dois modos devolvem o mesmo JSON.
+
+Uso:
+  python scripts/bench_stream_json.py
+  BENCH_ITEMS=20000 BENCH_ROUNDS=5 python scripts/bench_stream_json.py
+"""
+import gzip
+import http.client
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+ITEMS = int(os.environ.get('BENCH_ITEMS', '5000'))
+ROUNDS = int(os.environ.get('BENCH_ROUNDS', '5'))
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+
+def payload(n):
+    return [{
+        'id': i, 'mentorado_id': i % 180, 'mentorado_nome': f'Mentorado {i % 180}',
+        'data_call': '2026-04-07T18:00:00+00:00', 'status_call': 'realizada', 'tipo': 'mentoria_individual',
+        'zoom_link': f'https://us06web.zoom.us/j/{9000000000 + i}', 'duracao_minutos': 60,
+        'observacoes': 'Revisar oferta e funil; mentorado trouxe dúvidas sobre precificação.',
+    } for i in range(n)]
+
+
+def start_server(srv, rows, peaks):
+    class BenchHandler(srv.ProxyHandler):
+        def do_GET(self):
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            if self.path == '/stream':
+                self._send_json_stream(rows)
+            else:
+                self._send_json(rows)
+            if tracing:
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = srv.PoolHTTPServer(('127.0.0.1', 0), BenchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch(port, path, accept, keep=False):
+    """TTFB/total in ms; drains in 64 KB reads so the client doesn't inflate the tracemalloc peak."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    t0 = time.perf_counter()
+    conn.request('GET', path, headers={'Accept-Encoding': accept} if accept else {})
+    resp = conn.getresponse()
+    chunks = [resp.read(1)]
+    ttfb = (time.perf_counter() - t0) * 1000
+    while True:
+        chunk = resp.read1(65536)
+        if not chunk:
+            break
+        if keep:
+            chunks.append(chunk)
+    total = (time.perf_counter() - t0) * 1000
+    body = b''.join(chunks)
+    if keep and resp.getheader('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    conn.close()
+    return ttfb, total, body
+
+
+def main():
+    srv = load_server()
+    rows = payload(ITEMS)
+    peaks = []
+    server = start_server(srv, rows, peaks)
+    port = server.server_address[1]
+    print(f'[bench] {ITEMS} items, {ROUNDS} rounds, flush={srv.JSON_STREAM_FLUSH_BYTES}B')
+    ok = True
+    for accept in ('', 'gzip'):
+        bodies = {}
+        for path in ('/buffered', '/stream'):
+            ttfbs, totals = [], []
+            for _ in range(ROUNDS):
+                ttfb, total, _ = fetch(port, path, accept)
+                ttfbs.append(ttfb)
+                totals.append(total)
+            # tracemalloc slows every allocation, so memory gets its own round
+            peaks.clear()
+            tracemalloc.start()
+            fetch(port, path, accept)
+            while not peaks:  # the handler records its peak after the last byte is sent
+                time.sleep(0.001)
+            tracemalloc.stop()
+            bodies[path] = fetch(port, path, accept, keep=True)[2]
+            print(f'  {path[1:]:<8} accept={accept or "identity":<8} ttfb {statistics.median(ttfbs):7.1f} ms  '
+                  f'total {statistics.median(totals):7.1f} ms  peak {peaks[0] / 1024:8.1f} KB  '
+                  f'({len(bodies[path]) / 1024:.0f} KB json)')
+        same = json.loads(bodies['/buffered']) == json.loads(bodies['/stream'])
+        ok = ok and same
+        print(f'  same payload: {same}')
+    server.shutdown()
+    server.server_close()
+    return 0 if ok else 1
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+if __name__ == '__main__':
+    sys.exit(main())
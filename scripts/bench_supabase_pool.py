@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark — throughput do supabase_request por tamanho de pool
+===============================================================
+
+Sobe um PostgREST falso local (HTTP/1.1 keep-alive, latência fixa de
+BENCH_LATENCY_MS por query) e dispara BENCH_THREADS threads chamando o
+supabase_request real em paralelo — como workers HTTP, crons e pipelines
+de storage fazem em produção. Repete para cada tamanho de pool.
+
+pool=1 reproduz o comportamento antigo (uma conexão global atrás de um lock).
+
+Uso:
+  python scripts/bench_supabase_pool.py
+  BENCH_THREADS=32 BENCH_CALLS=20 BENCH_POOL_SIZES=1,4,16,32 python scripts/bench_supabase_pool.py
+"""
+import http.client
+import http.server
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+THREADS = int(os.environ.get('BENCH_THREADS', '16'))
+CALLS = int(os.environ.get('BENCH_CALLS', '25'))
+LATENCY_MS = int(os.environ.get('BENCH_LATENCY_MS', '20'))
+POOL_SIZES = [int(n) for n in os.environ.get('BENCH_POOL_SIZES', '1,2,4,8,16').split(',')]
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'backend', '14-APP-server.py')
+
+ROWS = json.dumps([{'id': i, 'titulo': f'Tarefa {i}', 'status': 'pendente'} for i in range(50)]).encode()
+
+
+class FakePostgREST(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(LATENCY_MS / 1000)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(ROWS)))
+        self.end_headers()
+        self.wfile.write(ROWS)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_server():
+    spec = importlib.util.spec_from_file_location('spalla_server', SERVER_PATH)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def run(srv, port, size):
+    srv._supa_pool = srv.HTTPConnectionPool('127.0.0.1', size, port=port,
+                                            connection_class=http.client.HTTPConnection)
+
+    def worker(_):
+        ok = 0
+        for _ in range(CALLS):
+            if isinstance(srv.supabase_request('GET', 'god_tasks?select=*'), list):
+                ok += 1
+        return ok
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        ok = sum(pool.map(worker, range(THREADS)))
+    wall = time.perf_counter() - t0
+    stats = srv._supa_pool.snapshot()
+    srv._supa_pool.close()
+    return {
+        'pool': size,
+        'qps': round(ok / wall, 1),
+        'ok': ok,
+        'created': stats['created'],
+        'waited': stats['waited'],
+        'wait_ms_avg': round(stats['wait_ms_total'] / stats['waited'], 1) if stats['waited'] else 0.0,
+        'wait_ms_max': stats['wait_ms_max'],
+    }
+
+
+def main():
+    srv = load_server()
+    srv.SUPABASE_SERVICE_KEY = 'bench'
+    upstream = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePostgREST)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    port = upstream.server_address[1]
+    print(f'[bench] {THREADS} threads x {CALLS} calls, upstream latency {LATENCY_MS}ms '
+          f'(ideal qps at pool>={THREADS}: {THREADS * 1000 / LATENCY_MS:.0f})')
+    for size in POOL_SIZES:
+        print(json.dumps(run(srv, port, size)))
+    upstream.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+-- =============================================================================
+-- Migration: chaves únicas para upsert em lote do sync ClickUp
+-- =============================================================================
+-- O backend agora importa tarefas e subtasks com POST em array +
+-- on_conflict / Prefer: resolution=merge-duplicates. O Postgres só infere
+-- ON CONFLICT de um índice único NÃO parcial, então:
+-- 1. god_tasks.operon_id: troca o índice parcial por um completo
+--    (NULLs continuam distintos — tarefas internas não são afetadas)
+-- 2. god_task_subtasks (task_id, clickup_id): remove duplicatas e cria a chave
+-- =============================================================================
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- 1. god_tasks.operon_id
+-- ─────────────────────────────────────────────────────────────────────────────
+CREATE UNIQUE INDEX IF NOT EXISTS uq_god_tasks_operon_id
+  ON public.god_tasks (operon_id);
+
+DROP INDEX IF EXISTS public.idx_god_tasks_operon_id;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- 2. god_task_subtasks (task_id, clickup_id)
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Mantém a linha atualizada mais recentemente de cada par duplicado
+DELETE FROM public.god_task_subtasks a
+USING public.god_task_subtasks b
+WHERE a.clickup_id IS NOT NULL
+  AND a.task_id = b.task_id
+  AND a.clickup_id = b.clickup_id
+  AND (COALESCE(a.updated_at, '-infinity'::timestamptz), a.id::text)
+    < (COALESCE(b.updated_at, '-infinity'::timestamptz), b.id::text);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_subtasks_task_clickup
+  ON public.god_task_subtasks (task_id, clickup_id);
@@ -0,0 +1,143 @@
+-- =============================================================================
+-- Migration: fila durável de ingestão (sp_ingest_jobs)
+-- =============================================================================
+-- Usada pelo backend com INGEST_QUEUE_BACKEND=supabase. Cada arquivo do
+-- pipeline vira um job com lease: o worker que faz o claim renova o lease
+-- (heartbeat) enquanto processa; se o processo morre, o lease expira e o job
+-- volta para a fila (visibility timeout). Falhas voltam com backoff até
+-- max_attempts e depois ficam como 'dead'. O claim usa FOR UPDATE SKIP LOCKED,
+-- então várias réplicas dividem a fila sem processar o mesmo arquivo duas vezes.
+-- Só o service_role (backend) acessa: RLS ligado, sem policies.
+-- =============================================================================
+
+CREATE TABLE IF NOT EXISTS public.sp_ingest_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  arquivo_id TEXT NOT NULL,
+  grupo TEXT,                                   -- chave de justiça ('mentorado:42', 'task:…')
+  state TEXT NOT NULL DEFAULT 'queued' CHECK (state IN ('queued', 'leased', 'done', 'cancelled', 'dead')),
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 3,
+  lease_owner TEXT,                             -- host:pid:worker
+  lease_expires_at TIMESTAMPTZ,
+  visible_at TIMESTAMPTZ NOT NULL DEFAULT now(),  -- retry com backoff: só pode ser claimed a partir daqui
+  claimed_at TIMESTAMPTZ,
+  cancel_requested BOOLEAN NOT NULL DEFAULT false,
+  last_error TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+
+-- No máximo um job ativo por arquivo
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sp_ingest_jobs_active
+  ON public.sp_ingest_jobs (arquivo_id) WHERE state IN ('queued', 'leased');
+CREATE INDEX IF NOT EXISTS idx_sp_ingest_jobs_state ON public.sp_ingest_jobs (state, visible_at);
+CREATE INDEX IF NOT EXISTS idx_sp_ingest_jobs_grupo ON public.sp_ingest_jobs (grupo, claimed_at);
+
+ALTER TABLE public.sp_ingest_jobs ENABLE ROW LEVEL SECURITY;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Enfileirar (idempotente por arquivo, respeitando o limite da fila)
+-- ─────────────────────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION public.fn_ingest_enqueue(
+  p_arquivo_id TEXT, p_grupo TEXT, p_max_attempts INT, p_queue_limit INT)
+RETURNS TABLE(state TEXT, created BOOLEAN)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+  v_state TEXT;
+BEGIN
+  UPDATE public.sp_ingest_jobs j SET cancel_requested = false
+   WHERE j.arquivo_id = p_arquivo_id AND j.state IN ('queued', 'leased')
+  RETURNING j.state INTO v_state;
+  IF v_state IS NOT NULL THEN
+    RETURN QUERY SELECT v_state, false;
+    RETURN;
+  END IF;
+
+  IF p_queue_limit > 0
+     AND (SELECT count(*) FROM public.sp_ingest_jobs j WHERE j.state = 'queued') >= p_queue_limit THEN
+    RETURN QUERY SELECT 'full'::TEXT, false;
+    RETURN;
+  END IF;
+
+  INSERT INTO public.sp_ingest_jobs (arquivo_id, grupo, max_attempts)
+  VALUES (p_arquivo_id, p_grupo, p_max_attempts)
+  ON CONFLICT (arquivo_id) WHERE state IN ('queued', 'leased') DO NOTHING;
+  RETURN QUERY SELECT 'queued'::TEXT, FOUND;
+END;
+$$;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Claim: devolve leases expirados à fila (ou 'dead') e pega o próximo job do
+-- grupo servido há mais tempo
+-- ─────────────────────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION public.fn_ingest_claim(p_worker TEXT, p_lease_seconds INT)
+RETURNS SETOF public.sp_ingest_jobs
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE public.sp_ingest_jobs
+     SET state = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+         last_error = 'lease expired (' || coalesce(lease_owner, '?') || ')',
+         finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+         lease_owner = NULL, lease_expires_at = NULL, visible_at = now()
+   WHERE state = 'leased' AND lease_expires_at < now();
+
+  DELETE FROM public.sp_ingest_jobs
+   WHERE state IN ('done', 'cancelled') AND finished_at < now() - interval '7 days';
+
+  RETURN QUERY
+  UPDATE public.sp_ingest_jobs j
+     SET state = 'leased', lease_owner = p_worker, attempts = j.attempts + 1, claimed_at = now(),
+         lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+   WHERE j.id = (
+     SELECT q.id
+       FROM public.sp_ingest_jobs q
+       LEFT JOIN (SELECT grupo, max(claimed_at) AS last_claimed
+                    FROM public.sp_ingest_jobs
+                   WHERE claimed_at IS NOT NULL
+                   GROUP BY grupo) s ON s.grupo IS NOT DISTINCT FROM q.grupo
+      WHERE q.state = 'queued' AND q.visible_at <= now()
+      ORDER BY s.last_claimed NULLS FIRST, q.created_at, q.id
+      LIMIT 1
+      FOR UPDATE OF q SKIP LOCKED)
+  RETURNING j.*;
+END;
+$$;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Heartbeat: renova o lease; nenhuma linha = o lease não é mais deste worker
+-- ─────────────────────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION public.fn_ingest_heartbeat(p_id BIGINT, p_worker TEXT, p_lease_seconds INT)
+RETURNS TABLE(cancel_requested BOOLEAN)
+LANGUAGE sql AS $$
+  UPDATE public.sp_ingest_jobs j
+     SET lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+   WHERE j.id = p_id AND j.lease_owner = p_worker AND j.state = 'leased'
+  RETURNING j.cancel_requested;
+$$;
+
+-- ─────────────────────────────────────────────────────────────────────────────
+-- Finish: done | cancelled | dead, ou de volta a 'queued' após p_retry_seconds
+-- ─────────────────────────────────────────────────────────────────────────────
+CREATE OR REPLACE FUNCTION public.fn_ingest_finish(
+  p_id BIGINT, p_worker TEXT, p_state TEXT, p_error TEXT, p_retry_seconds INT)
+RETURNS TABLE(state TEXT)
+LANGUAGE sql AS $$
+  UPDATE public.sp_ingest_jobs j
+     SET state = p_state,
+         last_error = coalesce(p_error, j.last_error),
+         visible_at = now() + make_interval(secs => coalesce(p_retry_seconds, 0)),
+         finished_at = CASE WHEN p_state = 'queued' THEN NULL ELSE now() END,
+         lease_owner = NULL, lease_expires_at = NULL, cancel_requested = false
+   WHERE j.id = p_id AND j.lease_owner = p_worker AND j.state = 'leased'
+  RETURNING j.state;
+$$;
+
+REVOKE ALL ON FUNCTION public.fn_ingest_enqueue(TEXT, TEXT, INT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.fn_ingest_claim(TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.fn_ingest_heartbeat(BIGINT, TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION public.fn_ingest_finish(BIGINT, TEXT, TEXT, TEXT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_enqueue(TEXT, TEXT, INT, INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_claim(TEXT, INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_heartbeat(BIGINT, TEXT, INT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_finish(BIGINT, TEXT, TEXT, TEXT, INT) TO service_role;
@@ -0,0 +1,91 @@
+-- =============================================================================
+-- Migration: sp_ingest_jobs — enqueue em lote e claim mais barato
+-- =============================================================================
+-- fn_ingest_enqueue_many: o reprocessamento em massa enfileira centenas de
+-- arquivos numa chamada só (antes: um RPC por arquivo dentro da request).
+-- Devolve quantos entraram e quantos ficaram de fora pelo limite da fila;
+-- arquivos que já estão na fila/rodando são deduplicados.
+--
+-- fn_ingest_claim: o GROUP BY grupo sobre a tabela inteira rodava a cada poll
+-- (a cada 5 s por worker por réplica). Agora o último claim de cada grupo é um
+-- max() pelo índice (grupo, claimed_at), só para os jobs visíveis na fila. A
+-- limpeza de retenção passa a remover também os 'dead'.
+-- =============================================================================
+
+CREATE OR REPLACE FUNCTION public.fn_ingest_enqueue_many(
+  p_arquivo_ids TEXT[], p_grupos TEXT[], p_max_attempts INT, p_queue_limit INT)
+RETURNS TABLE(created INT, rejected INT)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+DECLARE
+  v_free INT;
+  v_created INT;
+  v_rejected INT;
+BEGIN
+  -- Reenviar um arquivo ativo desfaz um cancelamento pendente (como fn_ingest_enqueue)
+  UPDATE public.sp_ingest_jobs j SET cancel_requested = false
+   WHERE j.arquivo_id = ANY(p_arquivo_ids) AND j.state IN ('queued', 'leased') AND j.cancel_requested;
+
+  IF p_queue_limit > 0 THEN
+    SELECT greatest(0, p_queue_limit - count(*))::INT INTO v_free
+      FROM public.sp_ingest_jobs j WHERE j.state = 'queued';
+  ELSE
+    v_free := coalesce(array_length(p_arquivo_ids, 1), 0);
+  END IF;
+
+  WITH input AS (
+    SELECT a.arquivo_id, a.grupo, a.ord
+      FROM unnest(p_arquivo_ids, p_grupos) WITH ORDINALITY AS a(arquivo_id, grupo, ord)
+  ), fresh AS (
+    SELECT DISTINCT ON (i.arquivo_id) i.arquivo_id, i.grupo, i.ord
+      FROM input i
+     WHERE NOT EXISTS (SELECT 1 FROM public.sp_ingest_jobs j
+                        WHERE j.arquivo_id = i.arquivo_id AND j.state IN ('queued', 'leased'))
+     ORDER BY i.arquivo_id, i.ord
+  ), ranked AS (
+    SELECT f.arquivo_id, f.grupo, row_number() OVER (ORDER BY f.ord) AS n FROM fresh f
+  ), ins AS (
+    INSERT INTO public.sp_ingest_jobs (arquivo_id, grupo, max_attempts)
+    SELECT r.arquivo_id, r.grupo, p_max_attempts FROM ranked r WHERE r.n <= v_free ORDER BY r.n
+    ON CONFLICT (arquivo_id) WHERE state IN ('queued', 'leased') DO NOTHING
+    RETURNING 1
+  )
+  SELECT (SELECT count(*) FROM ins)::INT, (SELECT count(*) FROM ranked r WHERE r.n > v_free)::INT
+    INTO v_created, v_rejected;
+
+  RETURN QUERY SELECT v_created, v_rejected;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.fn_ingest_claim(p_worker TEXT, p_lease_seconds INT)
+RETURNS SETOF public.sp_ingest_jobs
+LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE public.sp_ingest_jobs
+     SET state = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+         last_error = 'lease expired (' || coalesce(lease_owner, '?') || ')',
+         finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+         lease_owner = NULL, lease_expires_at = NULL, visible_at = now()
+   WHERE state = 'leased' AND lease_expires_at < now();
+
+  DELETE FROM public.sp_ingest_jobs
+   WHERE state IN ('done', 'cancelled', 'dead') AND finished_at < now() - interval '7 days';
+
+  RETURN QUERY
+  UPDATE public.sp_ingest_jobs j
+     SET state = 'leased', lease_owner = p_worker, attempts = j.attempts + 1, claimed_at = now(),
+         lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+   WHERE j.id = (
+     SELECT q.id
+       FROM public.sp_ingest_jobs q
+      WHERE q.state = 'queued' AND q.visible_at <= now()
+      ORDER BY (SELECT max(s.claimed_at) FROM public.sp_ingest_jobs s WHERE s.grupo = q.grupo) NULLS FIRST,
+               q.created_at, q.id
+      LIMIT 1
+      FOR UPDATE OF q SKIP LOCKED)
+  RETURNING j.*;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.fn_ingest_enqueue_many(TEXT[], TEXT[], INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.fn_ingest_enqueue_many(TEXT[], TEXT[], INT, INT) TO service_role;